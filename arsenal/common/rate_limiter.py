@@ -72,6 +72,13 @@ class RateLimiter(object):
     def clear(self):
         self.items = []
 
+    def remaining(self):
+        """Returns how many more items can be withdrawn in the current
+        limiting period.
+        """
+        self._update_limit_period()
+        return max(0, self.limit - self.current_count)
+
     def add_items(self, iterable):
         """Adds items to the queue."""
         self.items.extend(iterable)
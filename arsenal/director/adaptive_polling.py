@@ -0,0 +1,120 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import numpy as np
+from oslo_log import log
+
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+
+class AdaptiveInterval(object):
+    """A polling interval which follows how much the polled data changes.
+
+    After a poll which saw no changes, the interval grows by backoff_factor.
+    After a poll which saw changes, it is divided by one more than the number
+    of changes seen, so a burst of activity brings it down to the minimum
+    at once. The interval always stays within its bounds.
+    """
+
+    def __init__(self, minimum, maximum, backoff_factor=2.0):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.backoff_factor = backoff_factor
+        self.interval = minimum
+        self.last_polled = {}
+
+    def due(self, source, now):
+        """Whether source should be polled again at now."""
+        last_polled = self.last_polled.get(source)
+        return last_polled is None or now - last_polled >= self.interval
+
+    def polled(self, source, now):
+        self.last_polled[source] = now
+
+    def update(self, changes):
+        """Adjust the interval after a poll which saw changes changes."""
+        if changes:
+            interval = self.interval / (1.0 + changes)
+        else:
+            interval = self.interval * self.backoff_factor
+        self.interval = min(self.maximum, max(self.minimum, interval))
+        LOG.debug("Saw %(changes)d change(s), polling every %(interval).1f "
+                  "second(s).",
+                  {'changes': changes, 'interval': self.interval})
+        return self.interval
+
+
+class NodeStates(object):
+    """The UUIDs, provisioned and cached flags and cached images of nodes,
+    as of one poll.
+    """
+
+    def __init__(self, nodes):
+        table = sb.NodeTable.from_nodes(nodes)
+        self.node_uuids = list(table.node_uuids)
+        self.provisioned = table.provisioned.copy()
+        self.cached = table.cached.copy()
+        # NO_IMAGE codes index the trailing None.
+        image_uuids = np.array(list(table.image_uuids) + [None],
+                               dtype=object)
+        self.images = image_uuids[table.images]
+
+    def as_dict(self):
+        return dict(zip(self.node_uuids,
+                        zip(self.provisioned, self.cached, self.images)))
+
+    def count_changes(self, previous):
+        """Count the nodes added, removed or changed since previous."""
+        if previous.node_uuids == self.node_uuids:
+            return int(np.count_nonzero(
+                (previous.provisioned != self.provisioned) |
+                (previous.cached != self.cached) |
+                (previous.images != self.images)))
+        before = previous.as_dict()
+        after = self.as_dict()
+        changes = len(set(before).symmetric_difference(after))
+        for node_uuid, state in after.iteritems():
+            if node_uuid in before and before[node_uuid] != state:
+                changes += 1
+        return changes
+
+
+def flavor_states(flavors):
+    return set(flavor.name for flavor in flavors)
+
+
+def image_states(images):
+    return set((image.uuid, image.checksum) for image in images)
+
+
+# Source names, as in scheduler.POLL_SOURCES, to how to capture the state of
+# the data polled from them.
+STATE_FUNCS = {
+    'nodes': NodeStates,
+    'flavors': flavor_states,
+    'images': image_states,
+}
+
+
+def count_changes(previous, current):
+    """Count the changes between two states captured from the same source.
+    """
+    if isinstance(current, NodeStates):
+        return current.count_changes(previous)
+    return len(previous.symmetric_difference(current))
@@ -26,8 +26,7 @@ LOG = log.getLogger(__name__)
 CONF = cfg.CONF
 
 
-def is_baremetal_image(glance_image):
-    return glance_image.name == 'cirros-0.3.2-x86_64-disk'
+is_baremetal_image = onmetal.ImageFilter(name='cirros-0.3.2-x86_64-disk')
 
 
 def is_baremetal_flavor(flavor):
@@ -48,9 +47,7 @@ class DevstackScout(onmetal.OnMetalScout):
         """Get information about images to pass to a CachingStrategy object.
 
         """
-        self.glance_data = filter(is_baremetal_image,
-                                  self.glance_client.call("images.list"))
-        return map(onmetal.convert_glance_image, self.glance_data)
+        return self.update_image_catalog(is_baremetal_image)
 
     def retrieve_flavor_data(self):
         """Get information about flavors to pass to a CachingStrategy object.
@@ -58,16 +55,4 @@ class DevstackScout(onmetal.OnMetalScout):
         """
         flavor_list = filter(is_baremetal_flavor,
                              self.nova_client.call("flavors.list"))
-        unknown_flavors = filter(lambda f: (onmetal.KNOWN_FLAVORS.get(f.id)
-                                            is None),
-                                 flavor_list)
-        for flavor in unknown_flavors:
-            onmetal.KNOWN_FLAVORS[flavor.id] = lambda node: (
-                node.properties['memory_mb'] == flavor.ram)
-            LOG.warning("Detected an unknown flavor of id "
-                        "%(flavor_id)s. Adding to known flavor list, and "
-                        "identifying by amount of memory reported, which is "
-                        "%(memory)s",
-                        {'flavor_id': flavor.id,
-                         'memory': flavor.ram})
-        return map(onmetal.convert_nova_flavor, flavor_list)
+        return self.update_flavor_classifier(flavor_list)
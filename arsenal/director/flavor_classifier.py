@@ -0,0 +1,96 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_log import log
+
+LOG = log.getLogger(__name__)
+
+
+def node_key(ironic_node):
+    """The hashable property tuple of an Ironic node.
+
+    Properties missing from the node are None. The resource class is only
+    reported from Ironic API version 1.21 on.
+    """
+    properties = ironic_node.properties or {}
+    return (properties.get('memory_mb'),
+            properties.get('cpus'),
+            properties.get('local_gb'),
+            getattr(ironic_node, 'resource_class', None))
+
+
+class FlavorClassifier(object):
+    """Identifies the flavors of Ironic nodes with hash lookups.
+
+    Flavors are indexed by the full (RAM, vCPUs, disk, resource class) tuple
+    of the nodes they describe, and by RAM alone. A node whose properties
+    match a flavor exactly gets that flavor. Otherwise it falls back to the
+    flavor with the same amount of RAM, which is how Arsenal has always told
+    flavors apart. Either way the lookup costs the same however many flavors
+    there are.
+
+    Classifiers are not changed once built; scouts build a new one each time
+    they poll flavors and swap it in, so nodes may be classified from another
+    thread at the same time.
+    """
+
+    def __init__(self):
+        self.by_key = {}
+        self.by_ram = {}
+
+    def __len__(self):
+        return len(set(self.by_ram.values()) | set(self.by_key.values()))
+
+    def add(self, name, ram, vcpus=None, disk=None, resource_class=None):
+        """Index a flavor. When two flavors share a key, the first added
+        keeps it.
+        """
+        for index, key in ((self.by_ram, ram),
+                           (self.by_key, (ram, vcpus, disk,
+                                          resource_class))):
+            existing = index.setdefault(key, name)
+            if existing != name:
+                LOG.warning("Flavors '%(existing)s' and '%(flavor)s' both "
+                            "match nodes with properties %(key)s. Using "
+                            "'%(existing)s'.",
+                            {'existing': existing, 'flavor': name,
+                             'key': key})
+
+    def _lookup(self, key):
+        name = self.by_key.get(key)
+        if name is None:
+            name = self.by_ram.get(key[0])
+        return name
+
+    def classify_node(self, ironic_node):
+        """Return the flavor name of an Ironic node, or None if unknown."""
+        return self._lookup(node_key(ironic_node))
+
+    def classify(self, ironic_nodes):
+        """Return the flavor names of a batch of Ironic nodes, in order.
+
+        Nodes sharing a property tuple are looked up once.
+        """
+        keys = [node_key(ironic_node) for ironic_node in ironic_nodes]
+        names = dict((key, self._lookup(key)) for key in set(keys))
+        return [names[key] for key in keys]
+
+    def matcher(self, name):
+        """Return a function telling whether an Ironic node is of a flavor,
+        for FlavorInput.
+        """
+        return lambda ironic_node: self.classify_node(ironic_node) == name
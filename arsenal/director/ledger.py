@@ -0,0 +1,175 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from oslo_log import log
+
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+
+# Wrapper function for time.time() to make it mockable.
+def now():
+    return time.time()
+
+
+class _LedgerEntry(object):
+    __slots__ = ('directive', 'expires_at')
+
+    def __init__(self, directive, expires_at):
+        self.directive = directive
+        self.expires_at = expires_at
+
+
+def is_settled(directive, node):
+    """Whether node, as last seen by a Scout, shows directive as done.
+
+    A cache directive is done once the node reports the image as cached, and
+    an eject directive once the node reports nothing cached. Either is moot
+    once the node has been provisioned.
+    """
+    if node.provisioned:
+        return True
+    if isinstance(directive, sb.CacheNode):
+        return (node.cached and
+                node.cached_image_uuid == directive.image_uuid)
+    return not node.cached
+
+
+class DirectiveLedger(object):
+    """Remembers the directives issued to nodes until Ironic catches up.
+
+    Issued directives take a while to show up in a node's driver_info. Until
+    they do, or until their time to live passes, the ledger presents the
+    nodes to the strategy as if the directives had already taken effect, so
+    the same node is not handed the same work again.
+    """
+
+    def __init__(self, ttl):
+        """:param ttl: Seconds an issued directive stays outstanding when the
+            node never reflects it, such as when caching fails.
+        """
+        self.ttl = ttl
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, node_uuid):
+        return node_uuid in self.entries
+
+    def record(self, directive, timestamp=None):
+        """Record a directive which has just been issued."""
+        if timestamp is None:
+            timestamp = now()
+        self.entries[directive.node_uuid] = _LedgerEntry(
+            directive, timestamp + self.ttl)
+
+    def export(self):
+        """Return the outstanding directives as (directive, expires_at)
+        tuples, for restore.
+        """
+        return [(entry.directive, entry.expires_at)
+                for entry in self.entries.values()]
+
+    def restore(self, entries):
+        """Add (directive, expires_at) tuples returned by export."""
+        for directive, expires_at in entries:
+            self.entries[directive.node_uuid] = _LedgerEntry(directive,
+                                                             expires_at)
+
+    def is_outstanding(self, directive):
+        """Whether the same directive is already outstanding for its node."""
+        entry = self.entries.get(directive.node_uuid)
+        if entry is None or type(entry.directive) is not type(directive):
+            return False
+        if isinstance(directive, sb.CacheNode):
+            return entry.directive.image_uuid == directive.image_uuid
+        return True
+
+    def suppress_duplicates(self, directives):
+        """Drop directives which are already outstanding."""
+        if not self.entries:
+            return directives
+        remaining = [directive for directive in directives
+                     if not self.is_outstanding(directive)]
+        if len(remaining) < len(directives):
+            LOG.info("Suppressed %(num)d directive(s) already in flight.",
+                     {'num': len(directives) - len(remaining)})
+        return remaining
+
+    def reconcile(self, nodes, timestamp=None):
+        """Settle entries against fresh node data from a Scout.
+
+        Entries whose nodes show the directive as done, have disappeared, or
+        have outlived the time to live are dropped.
+
+        :param nodes: A NodeTable, or an iterable of NodeInput objects.
+        """
+        if not self.entries:
+            return
+        if timestamp is None:
+            timestamp = now()
+        table = sb.NodeTable.from_nodes(nodes)
+        outstanding = {}
+        settled = 0
+        for index, node_uuid in enumerate(table.node_uuids):
+            entry = self.entries.get(node_uuid)
+            if entry is None:
+                continue
+            if is_settled(entry.directive, table[index]):
+                settled += 1
+            elif entry.expires_at <= timestamp:
+                LOG.warning("%(directive)s was not reflected by Ironic "
+                            "within %(ttl)d second(s), forgetting it.",
+                            {'directive': str(entry.directive),
+                             'ttl': self.ttl})
+            else:
+                outstanding[node_uuid] = entry
+        LOG.debug("Directive ledger: %(settled)d settled, %(dropped)d "
+                  "expired or vanished, %(outstanding)d outstanding.",
+                  {'settled': settled,
+                   'dropped': len(self.entries) - settled - len(outstanding),
+                   'outstanding': len(outstanding)})
+        self.entries = outstanding
+
+    def apply(self, nodes):
+        """Present nodes with outstanding directives as busy.
+
+        Nodes being cached are marked as cached with the directive's image,
+        and nodes being ejected are marked as provisioned, like the nodes a
+        strategy ejects itself within a cycle. The nodes passed in are left as
+        the Scout reported them.
+
+        :param nodes: A NodeTable, or an iterable of NodeInput objects.
+        :returns: A new NodeTable, or nodes unchanged if nothing is
+            outstanding.
+        """
+        if not self.entries:
+            return nodes
+        table = sb.NodeTable.from_nodes(nodes).copy()
+        for index, node_uuid in enumerate(table.node_uuids):
+            entry = self.entries.get(node_uuid)
+            if entry is None:
+                continue
+            if isinstance(entry.directive, sb.CacheNode):
+                table.mark_cached([index], entry.directive.image_uuid)
+            else:
+                table.mark_provisioned([index])
+        return table
@@ -15,15 +15,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
+import time
+
 from oslo_config import cfg
 from oslo_log import log
 
 from arsenal.common import exception as exc
+from arsenal.director import flavor_classifier
 from arsenal.director import scout
 import arsenal.external.glance_client_wrapper as gcw
 import arsenal.external.ironic_client_wrapper as icw
 import arsenal.external.nova_client_wrapper as ncw
 from arsenal.strategy import base as sb
+from arsenal.strategy import image_catalog
 
 
 LOG = log.getLogger(__name__)
@@ -58,6 +63,18 @@ def is_node_provisioned(ironic_node):
     return provision_state != 'available' or ironic_node.maintenance
 
 
+# Provision states of a node being deployed or deployed to a tenant.
+DEPLOYED_STATES = frozenset(['deploying', 'wait call-back', 'deploy failed',
+                             'deploy complete', 'active'])
+
+
+def is_node_deployed(ironic_node):
+    # Unlike is_node_provisioned, nodes being cleaned, managed or held in
+    # maintenance, as ejected nodes are, do not count.
+    return (ironic_node.provision_state in DEPLOYED_STATES and
+            not ironic_node.maintenance)
+
+
 def is_node_cached(ironic_node):
     cache_status = ironic_node.driver_info.get('cache_status')
     if cache_status is None or cache_status == 'failed':
@@ -66,56 +83,271 @@ def is_node_cached(ironic_node):
         return True
 
 
+def is_node_caching(ironic_node):
+    # The image is still being pulled onto the node.
+    return ironic_node.driver_info.get('cache_status') == 'caching'
+
+
 def get_node_cached_image_uuid(ironic_node):
     return ironic_node.driver_info.get('cache_image_id') or ''
 
 
+def get_node_domain(ironic_node):
+    """Return the node's topology domain, as named by the topology_key
+    option, looking in the node's properties and then its extra field.
+    """
+    topology_key = CONF.strategy.topology_key
+    if not topology_key:
+        return None
+    for field in (ironic_node.properties, ironic_node.extra):
+        domain = (field or {}).get(topology_key)
+        if domain is not None:
+            return domain
+    return None
+
+
+# The only node fields Arsenal reads. Listings are limited to them when the
+# Ironic API allows it.
+NODE_FIELDS = ['uuid', 'provision_state', 'maintenance', 'driver_info',
+               'properties', 'extra', 'created_at', 'updated_at']
+
+
+# Flavor names to the memory_mb of their nodes. Flavors found in Nova but
+# not listed here are identified by the RAM Nova reports for them.
 KNOWN_FLAVORS = {
-    'onmetal-compute1': lambda node: node.properties['memory_mb'] == 32768,
-    'onmetal-io1': lambda node: node.properties['memory_mb'] == 131072,
-    'onmetal-memory1': lambda node: node.properties['memory_mb'] == 524288,
+    'onmetal-compute1': 32768,
+    'onmetal-io1': 131072,
+    'onmetal-memory1': 524288,
 }
 
 
-def convert_ironic_node(ironic_node):
-    flavor_name = None
+def build_flavor_classifier(nova_flavors=()):
+    """Build a FlavorClassifier from KNOWN_FLAVORS and a Nova flavor listing.
+    """
+    classifier = flavor_classifier.FlavorClassifier()
+    for name, ram in sorted(KNOWN_FLAVORS.iteritems()):
+        classifier.add(name, ram)
+    for flavor in nova_flavors:
+        ram = KNOWN_FLAVORS.get(flavor.id)
+        if ram is None:
+            ram = flavor.ram
+            LOG.warning("Detected an unknown flavor of id "
+                        "%(flavor_id)s. Identifying it by amount of memory "
+                        "reported, which is %(memory)s",
+                        {'flavor_id': flavor.id,
+                         'memory': flavor.ram})
+        classifier.add(flavor.id, ram, getattr(flavor, 'vcpus', None),
+                       getattr(flavor, 'disk', None))
+    return classifier
 
-    for flavor, ident_func in KNOWN_FLAVORS.iteritems():
-        if ident_func(ironic_node):
-            flavor_name = flavor
-            break
 
+def log_unknown_flavor(ironic_node):
+    LOG.error("Unable to identify flavor of node '%(node)s'",
+              {'node': ironic_node.uuid})
+
+
+def get_node_flavor(ironic_node, classifier):
+    flavor_name = classifier.classify_node(ironic_node)
+    if flavor_name is None:
+        log_unknown_flavor(ironic_node)
+    return flavor_name
+
+
+def convert_ironic_node(ironic_node, classifier):
+    flavor_name = get_node_flavor(ironic_node, classifier)
     if flavor_name is None:
-        LOG.error("Unable to identify flavor of node '%(node)s'",
-                  {'node': ironic_node.uuid})
         return None
 
     return sb.NodeInput(ironic_node.uuid,
                         flavor_name,
                         is_node_provisioned(ironic_node),
                         is_node_cached(ironic_node),
-                        get_node_cached_image_uuid(ironic_node))
+                        get_node_cached_image_uuid(ironic_node),
+                        get_node_domain(ironic_node),
+                        is_node_deployed(ironic_node),
+                        is_node_caching(ironic_node))
+
+
+def ironic_node_row(ironic_node, flavor_name):
+    """Return the NodeTable.append arguments for an Ironic node after its
+    UUID, or None if its flavor is unidentified.
+    """
+    if flavor_name is None:
+        log_unknown_flavor(ironic_node)
+        return None
+    return (flavor_name,
+            is_node_provisioned(ironic_node),
+            is_node_cached(ironic_node),
+            get_node_cached_image_uuid(ironic_node),
+            get_node_domain(ironic_node),
+            is_node_deployed(ironic_node),
+            is_node_caching(ironic_node))
+
+
+def append_ironic_nodes(node_table, ironic_nodes, classifier):
+    """Add Ironic nodes to a NodeTable, skipping unidentified flavors."""
+    ironic_nodes = list(ironic_nodes)
+    for ironic_node, flavor_name in zip(ironic_nodes,
+                                        classifier.classify(ironic_nodes)):
+        row = ironic_node_row(ironic_node, flavor_name)
+        if row is not None:
+            node_table.append(ironic_node.uuid, *row)
+
+
+def get_node_timestamp(ironic_node):
+    """When a node last changed. Ironic leaves updated_at unset on nodes
+    never updated since they were created, so created_at stands in for it.
+    """
+    return ironic_node.updated_at or ironic_node.created_at
+
+
+class IronicNodeCache(object):
+    """The Ironic nodes a Scout has seen, so that later polls only need the
+    nodes updated since.
+
+    Rows are kept as NodeTable.append arguments rather than NodeInput
+    objects, so every table built from the cache is independent of the
+    cache and of earlier tables.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        # The newest node timestamp seen. Ironic reports ISO 8601 timestamps in
+        # a single format, so they order correctly as strings.
+        self.watermark = None
+        self.last_full_sync = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def needs_full_sync(self, now, interval):
+        return (self.last_full_sync is None or
+                now - self.last_full_sync >= interval)
+
+    def _raise_watermark(self, timestamp):
+        if timestamp is not None and (self.watermark is None or
+                                      timestamp > self.watermark):
+            self.watermark = timestamp
+
+    def full_sync(self, ironic_nodes, now, classifier):
+        """Replace the cache with a complete listing of Ironic nodes.
+
+        :returns: The number of nodes removed since the last full sync.
+        """
+        previous = self.rows
+        self.rows = {}
+        self.watermark = None
+        for ironic_node in ironic_nodes:
+            self.rows[ironic_node.uuid] = ironic_node_row(
+                ironic_node, classifier.classify_node(ironic_node))
+            self._raise_watermark(get_node_timestamp(ironic_node))
+        self.last_full_sync = now
+        return len(set(previous) - set(self.rows))
+
+    def merge(self, ironic_nodes, classifier):
+        """Merge nodes listed newest updated_at first into the cache.
+
+        Reading stops at the first node older than the watermark, so the
+        rest of the listing is never fetched. Nodes updated at exactly the
+        watermark are read again, since more may have been updated within
+        the same second. Nodes never updated are judged by when they were
+        created, and a node with neither timestamp is merged without ever
+        stopping the read. Where such nodes sort after the watermark, the
+        next full sync picks them up.
+
+        :returns: The number of nodes added or changed.
+        """
+        watermark = self.watermark
+        changed = 0
+        for ironic_node in ironic_nodes:
+            timestamp = get_node_timestamp(ironic_node)
+            if (watermark is not None and timestamp is not None and
+                    timestamp < watermark):
+                break
+            row = ironic_node_row(ironic_node,
+                                  classifier.classify_node(ironic_node))
+            if self.rows.get(ironic_node.uuid, False) != row:
+                self.rows[ironic_node.uuid] = row
+                changed += 1
+            self._raise_watermark(timestamp)
+        return changed
+
+    def node_table(self):
+        """Build a NodeTable of the cached nodes with identified flavors."""
+        node_table = sb.NodeTable(capacity=len(self.rows))
+        for node_uuid, row in self.rows.iteritems():
+            if row is not None:
+                node_table.append(node_uuid, *row)
+        return node_table
+
+
+class ImageFilter(object):
+    """Selects Glance images whose properties all equal the given values.
+
+    Being declarative, the same filter is both sent to Glance as query
+    parameters, and checked against each image listed.
+    """
 
+    def __init__(self, **properties):
+        self.properties = properties
 
-def is_onmetal_image(glance_image):
-    return (glance_image.get('flavor_classes') == 'onmetal' and
-            glance_image.get('vm_mode') == 'metal' and
-            glance_image.get('visibility') == 'public')
+    def __call__(self, glance_image):
+        return all(glance_image.get(key) == value
+                   for key, value in self.properties.iteritems())
+
+    def query_filters(self):
+        """The filters to pass to Glance v2's images.list."""
+        return dict(self.properties)
+
+
+is_onmetal_image = ImageFilter(flavor_classes='onmetal',
+                               vm_mode='metal',
+                               visibility='public')
 
 
 def convert_glance_image(glance_image):
     return sb.ImageInput(glance_image.get('name'),
                          glance_image.get('id'),
-                         glance_image.get('checksum'))
+                         glance_image.get('checksum'),
+                         glance_image.get('size'))
+
+
+class GlanceImageRecord(object):
+    """The parts of a Glance image needed to cache it onto a node."""
+    __slots__ = ('id', 'file', 'checksum', 'size')
+
+    def __init__(self, id, file, checksum, size):
+        self.id = id
+        self.file = file
+        self.checksum = checksum
+        self.size = size
+
+    @classmethod
+    def from_glance_image(cls, glance_image):
+        return cls(glance_image.get('id'),
+                   glance_image.get('file'),
+                   glance_image.get('checksum'),
+                   glance_image.get('size'))
+
+
+def index_glance_images(glance_images):
+    """Map image IDs to GlanceImageRecords. Where IDs repeat, the first
+    image listed wins.
+    """
+    index = {}
+    for glance_image in glance_images:
+        if glance_image.get('id') not in index:
+            record = GlanceImageRecord.from_glance_image(glance_image)
+            index[record.id] = record
+    return index
 
 
 def is_onmetal_flavor(flavor):
     return len(flavor.id) > 8 and flavor.id[0:8] == 'onmetal-'
 
 
-def convert_nova_flavor(nova_flavor):
-    return sb.FlavorInput(nova_flavor.id,
-                          KNOWN_FLAVORS.get(nova_flavor.id))
+def convert_nova_flavor(nova_flavor, classifier):
+    return sb.FlavorInput(nova_flavor.id, classifier.matcher(nova_flavor.id))
 
 
 class OnMetalScout(scout.Scout):
@@ -126,15 +358,67 @@ class OnMetalScout(scout.Scout):
         self.ironic_client = icw.IronicClientWrapper()
         self.nova_client = ncw.NovaClientWrapper()
         self.glance_client = gcw.GlanceClientWrapper(get_pyrax_token)
-        self.glance_data = []
+        # Image IDs to GlanceImageRecords, rebuilt with the image catalog.
+        self.glance_images = {}
+        self.image_catalog = image_catalog.ImageCatalog()
+        self.node_count = 0
+        self.node_cache = IronicNodeCache()
+        # Replaced, never modified, on every flavor poll.
+        self.flavor_classifier = build_flavor_classifier()
 
     def retrieve_node_data(self):
         """Get information about nodes to pass to a CachingStrategy object.
 
         """
-        node_list = self.ironic_client.call("node.list", limit=0, detail=True)
-        return filter(lambda n: n is not None,
-                      map(convert_ironic_node, node_list))
+        if CONF.ironic.node_delta_polling:
+            return self.poll_node_changes()
+
+        sb.clear_interned_identifiers()
+        # The last fleet size is a good guess at how large the table will
+        # grow, as pages do not say how many nodes are left.
+        node_table = sb.NodeTable(capacity=self.node_count)
+        classifier = self.flavor_classifier
+        for page in self.iter_ironic_node_pages():
+            append_ironic_nodes(node_table, page, classifier)
+        self.node_count = len(node_table)
+        return node_table
+
+    def iter_ironic_node_pages(self, **kwargs):
+        """Yield the Ironic node listing, a page at a time."""
+        page_size = CONF.ironic.node_page_size
+        if page_size <= 0:
+            yield self.ironic_client.call("node.list", limit=0,
+                                          fields=NODE_FIELDS, **kwargs)
+            return
+        for page in self.ironic_client.iter_pages("node.list", page_size,
+                                                  fields=NODE_FIELDS,
+                                                  **kwargs):
+            yield page
+
+    def poll_node_changes(self):
+        """Refresh the node cache from Ironic, and return it as a NodeTable.
+
+        Between full resyncs, only the nodes updated since the last poll are
+        read, newest first. Removed nodes are noticed at the next resync.
+        """
+        now = time.time()
+        cache = self.node_cache
+        classifier = self.flavor_classifier
+        if cache.needs_full_sync(now, CONF.ironic.node_full_resync_interval):
+            sb.clear_interned_identifiers()
+            removed = cache.full_sync(
+                itertools.chain.from_iterable(self.iter_ironic_node_pages()),
+                now, classifier)
+            LOG.info("Resynced %(num)d node(s) from Ironic, %(removed)d "
+                     "removed.", {'num': len(cache), 'removed': removed})
+        else:
+            watermark = cache.watermark
+            changed = cache.merge(itertools.chain.from_iterable(
+                self.iter_ironic_node_pages(sort_key='updated_at',
+                                            sort_dir='desc')), classifier)
+            LOG.debug("%(num)d node(s) changed since %(watermark)s.",
+                      {'num': changed, 'watermark': watermark})
+        return cache.node_table()
 
     def retrieve_flavor_data(self):
         """Get information about flavors to pass to a CachingStrategy object.
@@ -142,26 +426,51 @@ class OnMetalScout(scout.Scout):
         """
         flavor_list = filter(is_onmetal_flavor,
                              self.nova_client.call("flavors.list"))
-        unknown_flavors = filter(lambda f: KNOWN_FLAVORS.get(f.id) is None,
-                                 flavor_list)
-        for flavor in unknown_flavors:
-            KNOWN_FLAVORS[flavor.id] = lambda node: (
-                node.properties['memory_mb'] == flavor.ram)
-            LOG.warning("Detected an unknown flavor of id "
-                        "%(flavor_id)s. Adding to known flavor list, and "
-                        "identifying by amount of memory reported, which is "
-                        "%(memory)s",
-                        {'flavor_id': flavor.id,
-                         'memory': flavor.ram})
-        return map(convert_nova_flavor, flavor_list)
+        return self.update_flavor_classifier(flavor_list)
+
+    def update_flavor_classifier(self, flavor_list):
+        """Rebuild the flavor classifier from a Nova flavor listing, and
+        return the flavors as FlavorInputs.
+        """
+        classifier = build_flavor_classifier(flavor_list)
+        self.flavor_classifier = classifier
+        return [convert_nova_flavor(flavor, classifier)
+                for flavor in flavor_list]
 
     def retrieve_image_data(self):
         """Get information about images to pass to a CachingStrategy object.
 
         """
-        self.glance_data = filter(is_onmetal_image,
-                                  self.glance_client.call("images.list"))
-        return map(convert_glance_image, self.glance_data)
+        return self.update_image_catalog(is_onmetal_image)
+
+    def list_glance_images(self, image_filter):
+        """Yield the Glance images matching an ImageFilter.
+
+        Glance filters the listing itself where configured, and pages of
+        images are only requested as the listing is read.
+        """
+        kwargs = {}
+        if CONF.glance.server_side_image_filters:
+            kwargs['filters'] = image_filter.query_filters()
+        pages = self.glance_client.iter_pages(
+            "images.list", CONF.glance.image_page_size, marker_attr='id',
+            **kwargs)
+        return itertools.ifilter(image_filter,
+                                 itertools.chain.from_iterable(pages))
+
+    def update_image_catalog(self, image_filter):
+        """Refresh the image catalog from Glance.
+
+        Conversion is skipped entirely when the matching images are identical
+        to the ones the catalog was last updated from.
+        """
+        glance_images = list(self.list_glance_images(image_filter))
+        fingerprint = image_catalog.listing_fingerprint(glance_images)
+        if fingerprint != self.image_catalog.fingerprint:
+            self.image_catalog.update(
+                map(convert_glance_image, glance_images), fingerprint)
+            self.glance_images = index_glance_images(glance_images)
+        return self.image_catalog
 
     def issue_action(self, action):
         # TODO(ClifHouck) I know type-testing is generally not a good pattern,
@@ -180,25 +489,21 @@ class OnMetalScout(scout.Scout):
                   "in order to handle this action. Doing nothing for now.")
 
     def _find_glance_image(self, cache_node_action):
-        # TODO(ClifHouck): O(n) search...
-        for image in self.glance_data:
-            if image.get('id') == cache_node_action.image_uuid:
-                return image
-        return None
+        return self.glance_images.get(cache_node_action.image_uuid)
 
     def issue_cache_node(self, cache_node_action):
         LOG.info("Issuing cache node operation on node %(node)s with "
                  "image %(image)s", {'node': cache_node_action.node_uuid,
                                      'image': cache_node_action.image_uuid})
-        glance_image_data = self._find_glance_image(cache_node_action)
+        glance_image = self._find_glance_image(cache_node_action)
 
-        if glance_image_data is None:
+        if glance_image is None:
             LOG.error("Could not find glance data for the image "
                       "'%(image_id)s'! Doing nothing.",
                       {'image_id': cache_node_action.node_uuid})
             return
 
-        image_url = glance_image_data.get('file')
+        image_url = glance_image.file
 
         args = {
             'image_info': {
@@ -15,12 +15,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from multiprocessing import pool as mp_pool
+import time
+
 from oslo_config import cfg
 from oslo_log import log
 from oslo_service import periodic_task
 
 from arsenal.common import rate_limiter
 from arsenal.common import util
+from arsenal.director import adaptive_polling
+from arsenal.director import ledger
+from arsenal.director import snapshot
 from arsenal.strategy import base as sb
 
 LOG = log.getLogger(__name__)
@@ -40,6 +46,27 @@ opts = [
                default=120,
                help='How long to wait, in seconds, between issuing new '
                     'directives from the configured strategy object.'),
+    cfg.BoolOpt('adaptive_polling',
+                default=False,
+                help='When true, poll_spacing and directive_spacing are '
+                     'ignored. Instead, the director polls between every '
+                     'min_poll_spacing and max_poll_spacing seconds, backing '
+                     'off while nodes, flavors and images do not change, '
+                     'and polling more often the more they change.'),
+    cfg.IntOpt('min_poll_spacing',
+               default=30,
+               help='With adaptive_polling, the shortest time, in seconds, '
+                    'to wait between polls.'),
+    cfg.IntOpt('max_poll_spacing',
+               default=600,
+               help='With adaptive_polling, the longest time, in seconds, '
+                    'to wait between polls.'),
+    cfg.BoolOpt('concurrent_polling',
+                default=False,
+                help='When true, nodes, flavors and images are all polled '
+                     'at the same time, in separate threads, each time '
+                     'directives are issued, instead of polling flavors and '
+                     'images on their own schedule.'),
     cfg.BoolOpt('dry_run',
                 default=False,
                 help='When true, prevents Arsenal from issuing directives. '
@@ -66,6 +93,19 @@ opts = [
                default=300,
                help='Determines the amount of time needed to pass before a '
                     'new rate-limit period for ejection directives begins.'),
+    cfg.IntOpt('directive_ttl',
+               default=900,
+               help='How long, in seconds, to remember an issued directive '
+                    'while waiting for Ironic to reflect it. Until then, the '
+                    'node is treated as busy and the same directive is not '
+                    'issued again. 0 disables the directive ledger.'),
+    cfg.StrOpt('snapshot_path',
+               help='File to save the last polled nodes, images, flavors '
+                    'and outstanding directives to at the end of every '
+                    'cycle. On startup they are loaded from it, so the '
+                    'strategy can plan straight away, but no directives are '
+                    'issued until every source has been polled again. '
+                    'Unset disables snapshots.'),
     cfg.BoolOpt('log_statistics',
                 default=True,
                 help='When True, Arsenal will log detailed information about '
@@ -117,6 +157,95 @@ def get_configured_cache_rate_limiter():
         CONF.director.cache_directive_limiting_period)
 
 
+# Names of the data sources a Scout is polled for, and the methods to call.
+POLL_SOURCES = (
+    ('nodes', 'retrieve_node_data'),
+    ('flavors', 'retrieve_flavor_data'),
+    ('images', 'retrieve_image_data'),
+)
+
+# The order sources are polled in when polling concurrently. Sources in the
+# same stage are polled at once. Scouts classify nodes by the flavors they
+# last polled, so flavors are polled first, and nodes are classified against
+# the flavors of the same cycle.
+POLL_STAGES = (
+    ('flavors',),
+    ('nodes', 'images'),
+)
+
+
+def _timed_call(func):
+    start = time.time()
+    result = func()
+    return result, time.time() - start
+
+
+def poll_concurrently(scout):
+    """Poll every source of a Scout, one thread per source, in the stages of
+    POLL_STAGES.
+
+    Each source is fetched through its own client wrapper, so the calls
+    within a stage are independent. Returns once all of them finish, or
+    raises the first failure.
+
+    :returns: A tuple of dictionaries of source names to the data polled,
+        and to the seconds each poll took.
+    """
+    methods = dict(POLL_SOURCES)
+    pool = mp_pool.ThreadPool(max(len(stage) for stage in POLL_STAGES))
+    try:
+        data = {}
+        timings = {}
+        for stage in POLL_STAGES:
+            pending = [(name, pool.apply_async(
+                _timed_call, (getattr(scout, methods[name]),)))
+                for name in stage]
+            for name, result in pending:
+                data[name], timings[name] = result.get()
+    finally:
+        pool.close()
+        pool.join()
+    return data, timings
+
+
+def task_spacing(spacing):
+    """The spacing of a polling periodic task.
+
+    With adaptive polling, tasks run every min_poll_spacing seconds and
+    decide for themselves whether a poll is due.
+    """
+    if CONF.director.adaptive_polling:
+        return CONF.director.min_poll_spacing
+    return spacing
+
+
+def get_configured_poll_interval():
+    if not CONF.director.adaptive_polling:
+        return None
+    LOG.info("Polling every %(min)d to %(max)d second(s), depending on how "
+             "much changes.",
+             {'min': CONF.director.min_poll_spacing,
+              'max': CONF.director.max_poll_spacing})
+    return adaptive_polling.AdaptiveInterval(CONF.director.min_poll_spacing,
+                                             CONF.director.max_poll_spacing)
+
+
+def get_configured_ledger():
+    if CONF.director.directive_ttl <= 0:
+        LOG.info("Issued directives will not be tracked during this run.")
+        return None
+    return ledger.DirectiveLedger(CONF.director.directive_ttl)
+
+
+def remaining_directives(rate_limiter):
+    """How many more directives rate_limiter lets through in its current
+    period, or None if there is no limit.
+    """
+    if rate_limiter is None:
+        return None
+    return rate_limiter.remaining()
+
+
 def rate_limit_directives(rate_limiter, directives, name, identity_func):
         if rate_limiter is not None:
             filtered_directives = filter(identity_func, directives)
@@ -145,23 +274,127 @@ class DirectorScheduler(periodic_task.PeriodicTasks):
         self.node_data = []
         self.image_data = []
         self.flavor_data = []
+        self.node_statistics = None
         self.strat = sb.get_configured_strategy()
         self.scout = get_configured_scout()
         self.cache_rate_limiter = get_configured_cache_rate_limiter()
         self.eject_rate_limiter = get_configured_ejection_rate_limiter()
+        self.ledger = get_configured_ledger()
+        self.poll_timings = {}
+        # Sources, named as in POLL_SOURCES, whose data was loaded from a
+        # snapshot and has not been polled since.
+        self.stale_sources = set()
+        self.poll_interval = get_configured_poll_interval()
+        # With adaptive polling, the state of the data last polled from each
+        # source, and the changes seen since the interval was last updated.
+        self.poll_states = {}
+        self.pending_changes = 0
+        self.load_snapshot()
 
     def periodic_tasks(self, context, raise_on_error=False):
         return self.run_periodic_tasks(context, raise_on_error)
 
-    @periodic_task.periodic_task(run_immediately=True,
-                                 spacing=CONF.director.poll_spacing)
+    def poll_not_due(self, source):
+        """With adaptive polling, whether it is too early to poll source
+        again. Otherwise, always False.
+        """
+        if self.poll_interval is None:
+            return False
+        now = time.time()
+        if not self.poll_interval.due(source, now):
+            return True
+        self.poll_interval.polled(source, now)
+        return False
+
+    def record_changes(self, source, data):
+        """With adaptive polling, count the changes in newly polled data."""
+        if self.poll_interval is None:
+            return
+        states = adaptive_polling.STATE_FUNCS[source](data)
+        previous = self.poll_states.get(source)
+        self.poll_states[source] = states
+        if previous is not None:
+            self.pending_changes += adaptive_polling.count_changes(previous,
+                                                                   states)
+
+    @periodic_task.periodic_task(
+        run_immediately=True,
+        spacing=task_spacing(CONF.director.poll_spacing))
     def poll_for_flavor_data(self, context):
+        if CONF.director.concurrent_polling or self.poll_not_due('flavors'):
+            return
         self.flavor_data = self.scout.retrieve_flavor_data()
+        self.stale_sources.discard('flavors')
+        self.record_changes('flavors', self.flavor_data)
 
-    @periodic_task.periodic_task(run_immediately=True,
-                                 spacing=CONF.director.poll_spacing)
+    @periodic_task.periodic_task(
+        run_immediately=True,
+        spacing=task_spacing(CONF.director.poll_spacing))
     def poll_for_image_data(self, context):
+        if CONF.director.concurrent_polling or self.poll_not_due('images'):
+            return
         self.image_data = self.scout.retrieve_image_data()
+        self.stale_sources.discard('images')
+        self.record_changes('images', self.image_data)
+
+    def poll_all_data(self):
+        """Poll flavors, then nodes and images concurrently.
+
+        The new data replaces the old only once every poll has succeeded, so
+        the strategy always sees a snapshot taken at the same time.
+        """
+        data, self.poll_timings = poll_concurrently(self.scout)
+        self.node_data = data['nodes']
+        self.flavor_data = data['flavors']
+        self.image_data = data['images']
+        self.stale_sources.clear()
+        for name, method in POLL_SOURCES:
+            self.record_changes(name, data[name])
+        LOG.info("Polled nodes in %(nodes).3f, flavors in %(flavors).3f and "
+                 "images in %(images).3f second(s).", self.poll_timings)
+
+    def load_snapshot(self):
+        """Start from the data saved at the end of the last cycle, if any.
+
+        The data is handed to the strategy at once, but is marked stale so
+        no directives are issued until it has been polled again.
+        """
+        if not CONF.director.snapshot_path:
+            return
+        saved = snapshot.load(CONF.director.snapshot_path)
+        if saved is None:
+            return
+        self.node_data = saved.nodes
+        self.image_data = saved.images
+        self.flavor_data = saved.flavors
+        if self.ledger is not None:
+            self.ledger.restore(saved.ledger_entries)
+        self.stale_sources = set(name for name, method in POLL_SOURCES)
+        self.strat.update_current_state(self.node_data, self.image_data,
+                                        self.flavor_data)
+        LOG.info("Loaded %(nodes)d node(s), %(images)d image(s) and "
+                 "%(flavors)d flavor(s) saved %(age)d second(s) ago. They "
+                 "will not be acted on until polled again.",
+                 {'nodes': len(self.node_data),
+                  'images': len(self.image_data),
+                  'flavors': len(self.flavor_data),
+                  'age': time.time() - saved.timestamp})
+
+    def save_snapshot(self, nodes):
+        """Save the data of this cycle, for load_snapshot."""
+        if not CONF.director.snapshot_path:
+            return
+        ledger_entries = []
+        if self.ledger is not None:
+            ledger_entries = self.ledger.export()
+        try:
+            snapshot.save(CONF.director.snapshot_path,
+                          snapshot.Snapshot(nodes, list(self.image_data),
+                                            self.flavor_data, ledger_entries,
+                                            time.time()))
+        except (IOError, OSError) as e:
+            LOG.warning("Unable to save a snapshot to %(path)s: %(error)s",
+                        {'path': CONF.director.snapshot_path, 'error': e})
 
     def rate_limit_cache_directives(self, directives):
         def is_cache_directive(directive):
@@ -181,22 +414,54 @@ class DirectorScheduler(periodic_task.PeriodicTasks):
                                      'eject',
                                      is_eject_directive)
 
-    @periodic_task.periodic_task(spacing=CONF.director.directive_spacing)
+    @periodic_task.periodic_task(
+        spacing=task_spacing(CONF.director.directive_spacing))
     def issue_directives(self, context):
+        if self.poll_not_due('nodes'):
+            return
         # NOTE(ClifHouck): It's really important to have node state be as
         # current as possible. So instead of polling for it, I'm leaving it
         # tied to updating the state of the strategy.
-        self.node_data = self.scout.retrieve_node_data()
+        if CONF.director.concurrent_polling:
+            self.poll_all_data()
+        else:
+            self.node_data = self.scout.retrieve_node_data()
+            self.stale_sources.discard('nodes')
+            self.record_changes('nodes', self.node_data)
+        if self.poll_interval is not None:
+            self.poll_interval.update(self.pending_changes)
+            self.pending_changes = 0
+        polled_nodes = None
+        if CONF.director.snapshot_path:
+            # The ledger and the strategy mark nodes as they work, so keep
+            # the nodes as polled for the snapshot.
+            polled_nodes = sb.NodeTable.from_nodes(self.node_data).copy()
+        if self.ledger is not None:
+            self.ledger.reconcile(self.node_data)
+            self.node_data = self.ledger.apply(self.node_data)
 
         self.strat.update_current_state(self.node_data, self.image_data,
                                         self.flavor_data)
 
         if CONF.director.log_statistics:
-            sb.log_overall_node_statistics(self.node_data,
-                                           self.flavor_data,
-                                           self.image_data)
+            self.node_statistics = sb.log_overall_node_statistics(
+                self.node_data, self.flavor_data, self.image_data)
+
+        if self.stale_sources:
+            LOG.info("Not issuing directives until %(sources)s have been "
+                     "polled since restarting.",
+                     {'sources': ', '.join(sorted(self.stale_sources))})
+            self.save_snapshot(polled_nodes)
+            return
 
+        # Let the strategy plan only what the rate limiters will let
+        # through, rather than work they would cut short.
+        self.strat.set_directive_budget(
+            cache=remaining_directives(self.cache_rate_limiter),
+            eject=remaining_directives(self.eject_rate_limiter))
         directives = self.strat.directives()
+        if self.ledger is not None:
+            directives = self.ledger.suppress_duplicates(directives)
 
         directives = self.rate_limit_cache_directives(directives)
         directives = self.rate_limit_eject_directives(directives)
@@ -208,7 +473,11 @@ class DirectorScheduler(periodic_task.PeriodicTasks):
                      {'num': len(directives)})
             for directive in directives:
                 LOG.info(str(directive))
-            return
         else:
             LOG.info("Issuing all directives through configured scout.")
-            map(self.scout.issue_action, directives)
+            for directive in directives:
+                self.scout.issue_action(directive)
+                if self.ledger is not None:
+                    self.ledger.record(directive)
+
+        self.save_snapshot(polled_nodes)
@@ -30,7 +30,8 @@ class Scout(object):
     def retrieve_node_data(self):
         """Get information about nodes to pass to a CachingStrategy object.
 
-        :returns: A list of arsenal.strategy.base.NodeInput objects.
+        :returns: An arsenal.strategy.base.NodeTable, or a list of
+            arsenal.strategy.base.NodeInput objects.
         """
         pass
 
@@ -0,0 +1,179 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Persists the last data polled by a Scout, so the director can restart
+warm instead of waiting for every source to be polled again.
+"""
+
+import os
+import zlib
+
+import numpy as np
+from oslo_log import log
+from six.moves import cPickle as pickle
+
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+# Bumped whenever the layout below changes. Snapshots of another version are
+# ignored.
+SNAPSHOT_VERSION = 3
+
+
+class Snapshot(object):
+    """Nodes, images, flavors and outstanding directives, as last polled."""
+
+    def __init__(self, nodes, images, flavors, ledger_entries=(),
+                 timestamp=None):
+        """:param nodes: A NodeTable.
+        :param images: A list of ImageInput objects.
+        :param flavors: A list of FlavorInput objects.
+        :param ledger_entries: A list of (directive, expires_at) tuples.
+        """
+        self.nodes = nodes
+        self.images = images
+        self.flavors = flavors
+        self.ledger_entries = ledger_entries
+        self.timestamp = timestamp
+
+
+def flavor_name_matcher(name):
+    """Identify nodes by the flavor name they were recorded with.
+
+    Flavor identity functions belong to the Scout and are not persisted.
+    """
+    return lambda node: node.flavor == name
+
+
+def _dump_nodes(nodes):
+    table = sb.NodeTable.from_nodes(nodes)
+    return {
+        'node_uuids': list(table.node_uuids),
+        'flavor_names': list(table.flavor_names),
+        'image_uuids': list(table.image_uuids),
+        'domain_names': list(table.domain_names),
+        'flavors': table.flavors.tobytes(),
+        'provisioned': table.provisioned.tobytes(),
+        'cached': table.cached.tobytes(),
+        'images': table.images.tobytes(),
+        'domains': table.domains.tobytes(),
+        'deployed': table.deployed.tobytes(),
+        'caching': table.caching.tobytes(),
+    }
+
+
+def _load_nodes(columns):
+    codes = {}
+    for name, dtype in (('flavors', np.int32), ('provisioned', np.bool_),
+                        ('cached', np.bool_), ('images', np.int32),
+                        ('domains', np.int32), ('deployed', np.bool_),
+                        ('caching', np.bool_)):
+        codes[name] = np.frombuffer(columns[name], dtype=dtype)
+
+    table = sb.NodeTable(capacity=len(columns['node_uuids']))
+    for index, node_uuid in enumerate(columns['node_uuids']):
+        image_code = codes['images'][index]
+        domain_code = codes['domains'][index]
+        table.append(node_uuid,
+                     columns['flavor_names'][codes['flavors'][index]],
+                     codes['provisioned'][index],
+                     codes['cached'][index],
+                     (columns['image_uuids'][image_code]
+                      if image_code != sb.NO_IMAGE else None),
+                     (columns['domain_names'][domain_code]
+                      if domain_code != sb.NO_DOMAIN else None),
+                     codes['deployed'][index],
+                     codes['caching'][index])
+    return table
+
+
+def _dump_directive(directive):
+    if isinstance(directive, sb.CacheNode):
+        return ('cache', directive.node_uuid, directive.image_uuid,
+                directive.image_checksum)
+    return ('eject', directive.node_uuid)
+
+
+def _load_directive(record):
+    if record[0] == 'cache':
+        return sb.CacheNode(*record[1:])
+    return sb.EjectNode(*record[1:])
+
+
+def dumps(snapshot):
+    """Serialize a Snapshot to compressed bytes."""
+    state = {
+        'version': SNAPSHOT_VERSION,
+        'timestamp': snapshot.timestamp,
+        'nodes': _dump_nodes(snapshot.nodes),
+        'images': [(image.name, image.uuid, image.checksum, image.size)
+                   for image in snapshot.images],
+        'flavors': [flavor.name for flavor in snapshot.flavors],
+        'ledger': [(_dump_directive(directive), expires_at)
+                   for directive, expires_at in snapshot.ledger_entries],
+    }
+    return zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+
+def loads(data):
+    """Deserialize a Snapshot from bytes written by dumps.
+
+    :returns: A Snapshot, or None if it was written by another version.
+    """
+    state = pickle.loads(zlib.decompress(data))
+    if state.get('version') != SNAPSHOT_VERSION:
+        LOG.warning("Ignoring snapshot of version %(version)s, expected "
+                    "version %(expected)s.",
+                    {'version': state.get('version'),
+                     'expected': SNAPSHOT_VERSION})
+        return None
+    return Snapshot(
+        _load_nodes(state['nodes']),
+        [sb.ImageInput(*image) for image in state['images']],
+        [sb.FlavorInput(name, flavor_name_matcher(name))
+         for name in state['flavors']],
+        [(_load_directive(record), expires_at)
+         for record, expires_at in state['ledger']],
+        state['timestamp'])
+
+
+def save(path, snapshot):
+    """Write a Snapshot to path, replacing any previous one atomically."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(dumps(snapshot))
+    os.rename(temp_path, path)
+
+
+def load(path):
+    """Read the Snapshot at path.
+
+    :returns: A Snapshot, or None if there is none or it cannot be read.
+    """
+    try:
+        with open(path, 'rb') as snapshot_file:
+            data = snapshot_file.read()
+    except IOError:
+        LOG.info("No snapshot to restart from at %(path)s.", {'path': path})
+        return None
+    try:
+        return loads(data)
+    except Exception:
+        LOG.exception("Unable to read the snapshot at %(path)s, ignoring "
+                      "it.", {'path': path})
+        return None
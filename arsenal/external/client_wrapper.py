@@ -134,6 +134,45 @@ class OpenstackClientWrapper(object):
             obj = getattr(obj, attribute)
         return obj
 
+    def iter_pages(self, method_name, page_size, marker_attr='uuid',
+                   **kwargs):
+        """Page through a marker-paginated listing.
+
+        Each page is requested with call(), so retries and reauthorization
+        apply to that page alone rather than restarting the whole listing.
+        Pages are yielded as they arrive, so callers can process and discard
+        them instead of holding the entire listing in memory.
+
+        :param method_name: Name of the client listing method as a string.
+        :param page_size: The number of items to request per page.
+        :param marker_attr: The attribute, or key for dictionaries, of the
+            last item in a page which marks where the next page starts.
+        :param kwargs: Client method keyword arguments.
+        """
+        marker = None
+        while True:
+            page = self.call(method_name,
+                             **self._page_kwargs(marker, page_size, kwargs))
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            marker = (last[marker_attr] if isinstance(last, dict)
+                      else getattr(last, marker_attr))
+            # Let go of this page before fetching the next one.
+            del page, last
+
+    def _page_kwargs(self, marker, page_size, kwargs):
+        """Return the keyword arguments requesting one page of a listing.
+
+        Clients which take the marker or page size in another form override
+        this.
+        """
+        page_kwargs = dict(kwargs)
+        page_kwargs.update(marker=marker, limit=page_size)
+        return page_kwargs
+
     def call(self, method_name, *args, **kwargs):
         """Call the specified client method and retry on errors.
 
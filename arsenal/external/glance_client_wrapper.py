@@ -53,6 +53,17 @@ opts = [
                help='Glance keystone tenant id.'),
     cfg.StrOpt('region_name',
                help='Glance region name.'),
+    cfg.IntOpt('image_page_size',
+               default=200,
+               help='How many images to request from Glance per page when '
+                    'listing images. Pages are requested as the listing is '
+                    'read.'),
+    cfg.BoolOpt('server_side_image_filters',
+                default=True,
+                help='When true, Scouts ask Glance to filter image listings '
+                     'down to the images they cache. Images are still '
+                     'checked against the filter as they arrive, so '
+                     'filters Glance ignores do no harm.'),
 ]
 
 glance_group = cfg.OptGroup(name='glance',
@@ -77,6 +88,18 @@ class GlanceClientWrapper(client_wrapper.OpenstackClientWrapper):
             name="Glance")
         self.get_token_fun = get_token_fun
 
+    def _page_kwargs(self, marker, page_size, kwargs):
+        # glanceclient pages through the whole listing itself, with the
+        # marker as a filter. Limiting the listing to a single page makes
+        # each call fetch that page alone.
+        page_kwargs = dict(kwargs)
+        filters = dict(page_kwargs.get('filters') or {})
+        if marker is not None:
+            filters['marker'] = marker
+        page_kwargs.update(filters=filters, page_size=page_size,
+                           limit=page_size)
+        return page_kwargs
+
     def _get_new_client(self):
         auth_token = first_not_none([CONF.glance.admin_auth_token,
                                      CONF.client_wrapper.os_auth_token])
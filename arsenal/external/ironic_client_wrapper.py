@@ -19,7 +19,10 @@
 # https://github.com/openstack/nova/ in ./nova/virt/ironic/client_wrapper.py
 # and slightly adapted for Arsenal
 
+import inspect
+
 import ironicclient
+from ironicclient.v1 import node as ironic_node
 from oslo_config import cfg
 from oslo_log import log as logging
 
@@ -34,6 +37,13 @@ opts = [
     cfg.IntOpt('api_version',
                default=1,
                help='Version of Ironic API service endpoint.'),
+    cfg.StrOpt('api_microversion',
+               default='1.8',
+               help='The Ironic API microversion to request. 1.8 or later '
+                    'lets Scouts list only the node fields Arsenal reads. '
+                    'If the server or client does not support it, node '
+                    'listings fall back to full node details. Leave empty '
+                    'to use the server default.'),
     cfg.StrOpt('api_endpoint',
                help='URL for Ironic API endpoint.'),
     cfg.StrOpt('admin_username',
@@ -59,6 +69,21 @@ opts = [
                default=2,
                help='How often to retry in seconds when a request '
                     'does conflict'),
+    cfg.IntOpt('node_page_size',
+               default=1000,
+               help='How many nodes to request from Ironic per page when '
+                    'listing nodes. Each page is converted as it arrives. '
+                    '0 requests every node in a single listing.'),
+    cfg.BoolOpt('node_delta_polling',
+                default=False,
+                help='When true, Scouts keep the nodes they have seen and '
+                     'only read the nodes Ironic updated since their last '
+                     'poll, resyncing every node periodically.'),
+    cfg.IntOpt('node_full_resync_interval',
+               default=3600,
+               help='With node_delta_polling, how often, in seconds, to list '
+                    'every node again. This is how removed nodes are '
+                    'noticed.'),
     ]
 
 ironic_group = cfg.OptGroup(name='ironic',
@@ -70,6 +95,66 @@ CONF.register_opts(opts, ironic_group)
 
 first_not_none = client_wrapper.first_not_none
 
+# The first Ironic API microversion accepting fields= in listings.
+FIELDS_MICROVERSION = (1, 8)
+
+# Raised when the server cannot honour a field-projected listing.
+FIELDS_UNSUPPORTED_EXCEPTIONS = (ironicclient.exc.NotAcceptable,
+                                 ironicclient.exc.UnsupportedVersion,
+                                 ironicclient.exc.BadRequest)
+
+_client_supports_fields = None
+_logged_fields_disabled = False
+
+
+def client_supports_fields():
+    """Whether the installed ironicclient can list selected node fields.
+
+    Older clients, such as 0.7.0, have no fields argument to node.list.
+    """
+    global _client_supports_fields
+    if _client_supports_fields is None:
+        _client_supports_fields = 'fields' in inspect.getargspec(
+            ironic_node.NodeManager.list).args
+    return _client_supports_fields
+
+
+def log_fields_disabled(api_microversion):
+    """Warn, once per process, if node listings cannot be limited to the
+    fields Arsenal reads with the configured microversion and the installed
+    ironicclient.
+    """
+    global _logged_fields_disabled
+    if _logged_fields_disabled or api_microversion is None:
+        return
+    if parse_microversion(api_microversion) < FIELDS_MICROVERSION:
+        reason = ("API microversion %s is older than %s" %
+                  (api_microversion,
+                   '.'.join(str(part) for part in FIELDS_MICROVERSION)))
+    elif not client_supports_fields():
+        reason = ("the installed python-ironicclient has no fields argument "
+                  "to node.list")
+    else:
+        return
+    _logged_fields_disabled = True
+    LOG.warning("Node listings will include full details, since %(reason)s. "
+                "Upgrade python-ironicclient and request API microversion "
+                "1.8 or later to list only the fields Arsenal reads.",
+                {'reason': reason})
+
+
+def parse_microversion(version):
+    """Parse a microversion string such as '1.8' into a tuple of ints."""
+    return tuple(int(part) for part in version.split('.'))
+
+
+def without_fields(kwargs):
+    """Turn field-projected listing arguments into a full detail listing."""
+    kwargs = dict(kwargs)
+    del kwargs['fields']
+    kwargs['detail'] = True
+    return kwargs
+
 
 class IronicClientWrapper(client_wrapper.OpenstackClientWrapper):
     """Ironic client wrapper class that encapsulates retry logic."""
@@ -82,6 +167,41 @@ class IronicClientWrapper(client_wrapper.OpenstackClientWrapper):
                               ironicclient.exc.Conflict),
             auth_exceptions=(ironicclient.exc.Unauthorized),
             name="Ironic")
+        self.api_microversion = CONF.ironic.api_microversion or None
+        log_fields_disabled(self.api_microversion)
+
+    @property
+    def supports_fields(self):
+        """Whether listings may be limited to certain fields."""
+        return (self.api_microversion is not None and
+                parse_microversion(self.api_microversion) >=
+                FIELDS_MICROVERSION and
+                client_supports_fields())
+
+    def call(self, method_name, *args, **kwargs):
+        """Call the specified client method and retry on errors.
+
+        A listing limited with fields= is turned into a full detail listing
+        when the negotiated microversion or the installed client does not
+        support it. If the server rejects it, the wrapper stops requesting
+        the microversion and retries the call with full details.
+        """
+        if 'fields' in kwargs and not self.supports_fields:
+            kwargs = without_fields(kwargs)
+        try:
+            return super(IronicClientWrapper, self).call(method_name, *args,
+                                                         **kwargs)
+        except FIELDS_UNSUPPORTED_EXCEPTIONS as e:
+            if 'fields' not in kwargs:
+                raise
+            LOG.warning("Ironic rejected a listing of selected fields at API "
+                        "version %(version)s: %(error)s. Falling back to "
+                        "full node details.",
+                        {'version': self.api_microversion, 'error': e})
+            self.api_microversion = None
+            self._invalidate_cached_client()
+            return super(IronicClientWrapper, self).call(
+                method_name, *args, **without_fields(kwargs))
 
     def _get_new_client(self):
         auth_token = first_not_none([CONF.ironic.admin_auth_token,
@@ -108,6 +228,9 @@ class IronicClientWrapper(client_wrapper.OpenstackClientWrapper):
             kwargs = {'os_auth_token': auth_token,
                       'ironic_url': CONF.client_wrapper.os_api_url}
 
+        if self.api_microversion is not None:
+            kwargs['os_ironic_api_version'] = self.api_microversion
+
         try:
             cli = ironicclient.client.get_client(CONF.ironic.api_version,
                                                  **kwargs)
@@ -0,0 +1,245 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import division
+
+import heapq
+
+import numpy as np
+from oslo_config import cfg
+from oslo_log import log
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import simple_proportional_strategy as sps
+
+LOG = log.getLogger(__name__)
+
+CONF = cfg.CONF
+
+opts = [
+    cfg.IntOpt('byte_budget',
+               default=100 * 1024 ** 3,
+               help='The number of image bytes the strategy may ask to be '
+               'cached each time directives are issued. 0 means no '
+               'limit.'),
+    cfg.IntOpt('default_image_size',
+               default=4 * 1024 ** 3,
+               help='Size in bytes assumed for images whose size Glance '
+               'does not report.'),
+]
+
+bandwidth_group = cfg.OptGroup(name='bandwidth_aware_strategy',
+                               title='Bandwidth Aware Strategy Options')
+
+CONF.register_group(bandwidth_group)
+CONF.register_opts(opts, bandwidth_group)
+
+
+class FlavorDemand(object):
+    """How many nodes of a flavor should be cached, and what is cached now.
+
+    image_distribution maps image UUIDs to the number of cached,
+    unprovisioned nodes of the flavor holding them. available_nodes is a
+    sequence of the UUIDs of the nodes which could be cached.
+    """
+    __slots__ = ('flavor_name', 'num_needed', 'image_distribution',
+                 'num_cached', 'available_nodes')
+
+    def __init__(self, flavor_name, num_needed, image_distribution,
+                 num_cached, available_nodes):
+        self.flavor_name = flavor_name
+        self.num_needed = num_needed
+        self.image_distribution = image_distribution
+        self.num_cached = num_cached
+        self.available_nodes = available_nodes
+
+
+def image_size(image, default_size):
+    if image.size is None:
+        return default_size
+    return image.size
+
+
+def plan_cache_directives(demands, images, byte_budget, default_size,
+                          seed=None):
+    """Choose nodes and images to cache without exceeding byte_budget.
+
+    Each flavor's shortfall of every image, measured against its weighted
+    share, is a candidate. Candidates are taken greedily by shortfall per
+    byte, across all flavors, each taken copy lowering that shortfall by one,
+    until the budget or the shortfalls run out. Candidates too large for
+    what is left of the budget are skipped, so smaller images can still use
+    it.
+
+    A byte_budget of 0 means no limit. Returns the CacheNode directives, and
+    the flavor names whose demand could not be met in full.
+    """
+    unlimited = byte_budget <= 0
+    remaining_budget = byte_budget
+    images = list(images)
+
+    heap = []
+    slots = {}
+    chosen = {}
+    for flavor_index, demand in enumerate(demands):
+        slots[flavor_index] = min(demand.num_needed,
+                                  len(demand.available_nodes))
+        chosen[flavor_index] = []
+        if slots[flavor_index] <= 0:
+            continue
+        differences = sb._get_caching_difference(
+            demand.num_needed, images, demand.image_distribution,
+            demand.num_cached)
+        for position, (image, difference) in enumerate(differences):
+            if difference <= 0:
+                continue
+            size = max(image_size(image, default_size), 1)
+            heap.append((-difference / size, flavor_index, position,
+                         difference, size, image))
+    heapq.heapify(heap)
+
+    while heap:
+        (priority, flavor_index, position, difference, size,
+         image) = heapq.heappop(heap)
+        if slots[flavor_index] <= 0:
+            continue
+        if not unlimited and size > remaining_budget:
+            continue
+        chosen[flavor_index].append(image)
+        slots[flavor_index] -= 1
+        if not unlimited:
+            remaining_budget -= size
+        difference -= 1
+        if difference > 0:
+            heapq.heappush(heap, (-difference / size, flavor_index, position,
+                                  difference, size, image))
+
+    directives = []
+    unmet = set()
+    for flavor_index, demand in enumerate(demands):
+        chosen_images = chosen[flavor_index]
+        if len(chosen_images) < demand.num_needed:
+            unmet.add(demand.flavor_name)
+        if not chosen_images:
+            continue
+        rng = sps.flavor_random(seed, demand.flavor_name)
+        for node_uuid, image in zip(sb.sample_nodes(demand.available_nodes,
+                                                    len(chosen_images), rng),
+                                    chosen_images):
+            directives.append(sb.CacheNode(node_uuid, image.uuid,
+                                           image.checksum))
+
+    if not unlimited:
+        LOG.debug("Planned %(num)d cache directive(s) using %(used)d of "
+                  "%(budget)d byte(s).",
+                  {'num': len(directives),
+                   'used': byte_budget - remaining_budget,
+                   'budget': byte_budget})
+    if unmet:
+        LOG.info("Caching for flavor(s) %(flavors)s deferred by the byte "
+                 "budget or a lack of available nodes.",
+                 {'flavors': ', '.join(sorted(unmet))})
+    return directives, unmet
+
+
+class BandwidthAwareStrategy(sps.SimpleProportionalStrategy):
+    """Caches the same proportion of nodes as SimpleProportionalStrategy, but
+    limits the image bytes it asks to be cached each cycle.
+
+    Within the byte budget, images are chosen to close the largest gaps to
+    the weighted distribution per byte transferred, so smaller images are
+    favoured when they are needed about as much as larger ones. Demand left
+    over when the budget runs out is picked up in later cycles.
+    """
+
+    def __init__(self):
+        super(BandwidthAwareStrategy, self).__init__()
+        self.byte_budget = CONF.bandwidth_aware_strategy.byte_budget
+        self.default_image_size = (
+            CONF.bandwidth_aware_strategy.default_image_size)
+        LOG.info("Limiting image caching to %(budget)d byte(s) per cycle.",
+                 {'budget': self.byte_budget})
+
+    def _plan(self, demands):
+        return plan_cache_directives(
+            demands, self.current_images, self.byte_budget,
+            self.default_image_size,
+            CONF.simple_proportional_strategy.random_seed)
+
+    def _full_directives(self):
+        todo = sps.eject_nodes(
+            self.current_nodes,
+            [image.uuid for image in self.current_images])
+        self.rebalance_budget.spend(ejections=len(todo))
+
+        demands = []
+        ejections, nodes_by_flavor, nodes_needed = self._rebalance_tables()
+        todo.extend(ejections)
+        for flavor_name in sorted(nodes_by_flavor):
+            flavor_nodes = nodes_by_flavor[flavor_name]
+            num_needed = nodes_needed[flavor_name]
+            if num_needed == 0:
+                continue
+            demands.append(FlavorDemand(
+                flavor_name, num_needed, flavor_nodes.image_distribution(),
+                int(np.count_nonzero(flavor_nodes.cached_mask())),
+                [flavor_nodes.node_uuids[index] for index in
+                 np.flatnonzero(flavor_nodes.available_mask())]))
+
+        directives, unmet = self._plan(demands)
+        todo.extend(directives)
+        return todo
+
+    def _incremental_directives(self):
+        todo = []
+        demands = []
+        unmet = set()
+        flavor_names = sb.build_attribute_set(self.current_flavors, 'name')
+        for flavor_name in sorted(self.dirty_flavors):
+            state = self.node_states.get(flavor_name)
+            if state is None:
+                continue
+            retired, deferred = self._eject_retired_images(state)
+            todo.extend(retired)
+            if deferred:
+                unmet.add(flavor_name)
+            if flavor_name not in flavor_names:
+                continue
+            ejections, num_needed, deferred = self._rebalance_state(
+                flavor_name, state, sps.flavor_random(
+                    CONF.simple_proportional_strategy.random_seed,
+                    flavor_name))
+            todo.extend(ejections)
+            if deferred:
+                unmet.add(flavor_name)
+            if num_needed == 0:
+                continue
+            demands.append(FlavorDemand(
+                flavor_name, num_needed, state.image_distribution(),
+                state.cached, state.available))
+
+        directives, unplanned = self._plan(demands)
+        unmet.update(unplanned)
+        for directive in directives:
+            self._replace_node_state(directive.node_uuid, False, True,
+                                     directive.image_uuid, caching=True)
+        todo.extend(directives)
+
+        # Flavors the budget cut short are revisited next cycle even if none
+        # of their nodes change.
+        self.dirty_flavors = unmet
+        return todo
@@ -19,17 +19,30 @@ from __future__ import division
 
 import abc
 import collections
-import copy
+import heapq
+import itertools
 import math
+import random
 
+import numpy as np
 from oslo_config import cfg
 from oslo_log import log
 import six
 
 from arsenal.common import util
+from arsenal.strategy import image_catalog
 
 LOG = log.getLogger(__name__)
 
+APPORTIONMENT_METHODS = ('incremental', 'hamilton', 'dhondt', 'sainte-lague')
+
+# The offset added to the number of seats already allocated to form each
+# divisor method's divisor.
+DIVISOR_OFFSETS = {
+    'dhondt': 1.0,
+    'sainte-lague': 0.5,
+}
+
 opts = [
     cfg.StrOpt('module_class',
                default=('simple_proportional_strategy.'
@@ -46,7 +59,35 @@ opts = [
     cfg.IntOpt('default_image_weight',
                default=1,
                help='The integral weight to use if a given image has '
-                    'no corresponding entry in image_weights. Default is 1.')
+                    'no corresponding entry in image_weights. Default is 1.'),
+    cfg.StrOpt('apportionment_method',
+               default='incremental',
+               choices=APPORTIONMENT_METHODS,
+               help='How to divide the nodes to cache between images. '
+                    '"incremental" picks the most needed image one node at '
+                    'a time. "hamilton" uses the largest remainder method, '
+                    'while "dhondt" and "sainte-lague" use the respective '
+                    'divisor methods. All but "incremental" compute '
+                    'per-image counts directly, at a cost that depends only '
+                    'on the number of images.'),
+    cfg.StrOpt('topology_key',
+               help='Name of the Ironic node property (or, failing that, '
+                    'extra field) holding the node\'s topology domain, such '
+                    'as its rack or top of rack switch. When set, cached '
+                    'copies of each image are spread across domains.'),
+    cfg.IntOpt('rebalance_ejections_per_cycle',
+               default=0,
+               help='When image weights change, eject up to this many nodes '
+                    'of each flavor per cycle that hold over-cached images, '
+                    'so that the cache moves toward the new weights instead '
+                    'of waiting for nodes to be provisioned. 0 disables '
+                    'rebalancing.'),
+    cfg.IntOpt('max_caching_per_domain',
+               default=0,
+               help='The most nodes in one topology domain which may be '
+                    'caching images at once, across all flavors, counting '
+                    'caching still in progress from earlier cycles. 0 means '
+                    'no limit. Nodes without a domain are never limited.'),
 ]
 
 strategy_group = cfg.OptGroup(name='strategy',
@@ -63,25 +104,65 @@ def get_configured_strategy():
     return loader.loaded_class()
 
 
+# Cleared by clear_interned_identifiers. Strings cannot be weakly referenced
+# in Python 2, so entries are never dropped on their own.
+_interned_identifiers = {}
+
+
+def intern_identifier(value):
+    """Return a shared instance of a flavor name or image identifier.
+
+    Many nodes report the same flavor name and cached image UUID, so sharing
+    one string object per distinct value keeps large fleets compact. Unlike
+    the intern builtin, this also accepts unicode strings and None.
+    """
+    return _interned_identifiers.setdefault(value, value)
+
+
+def clear_interned_identifiers():
+    """Forget every identifier shared so far.
+
+    Scouts call this before reading a full node listing, so flavors, images
+    and domains which have gone away are not kept alive forever. Inputs
+    already built keep their strings; only later ones stop sharing them.
+    """
+    _interned_identifiers.clear()
+
+
 class StrategyInput(object):
     """Base class for information destined for CachingStrategy objects."""
-    def __init__(self):
-        pass
+    __slots__ = ()
 
 
 class NodeInput(StrategyInput):
+    __slots__ = ('node_uuid', 'flavor', 'provisioned', 'cached',
+                 'cached_image_uuid', 'domain', 'deployed', 'caching')
+
     def __init__(self,
                  node_uuid,
                  flavor,
                  is_provisioned=False,
                  is_cached=False,
-                 image_uuid='', ):
-        super(NodeInput, self).__init__()
+                 image_uuid='',
+                 domain=None,
+                 is_deployed=None,
+                 is_caching=False):
         self.node_uuid = node_uuid
-        self.flavor = flavor
+        self.flavor = intern_identifier(flavor)
         self.provisioned = is_provisioned
         self.cached = is_cached
-        self.cached_image_uuid = image_uuid
+        self.cached_image_uuid = intern_identifier(image_uuid)
+        # The topology domain (rack, switch, ...) the node belongs to, if
+        # known. See the topology_key option.
+        self.domain = intern_identifier(domain)
+        # Whether the node is deployed to a tenant, as opposed to being
+        # unavailable for other reasons such as maintenance or cleaning.
+        # Scouts which cannot tell count every provisioned node.
+        self.deployed = (is_provisioned if is_deployed is None
+                         else is_deployed)
+        # Whether an image is still being pulled onto the node. Such nodes
+        # also count as cached.
+        self.caching = is_caching
 
     def can_cache(self):
         # If the node is not provisioned and not already caching an image,
@@ -97,10 +178,299 @@ class NodeInput(StrategyInput):
             self.cached_image_uuid)
 
 
+NO_IMAGE = -1
+NO_DOMAIN = -1
+
+
+class NodeTable(object):
+    """Columnar storage for the node state handed to CachingStrategy objects.
+
+    Flavor names, cached image UUIDs and topology domains are interned into
+    integer codes, and the per-node flags are kept in NumPy arrays, so that
+    counting, grouping and image distributions can be computed with vectorized
+    operations rather than by walking lists of NodeInput objects. Scouts can
+    fill a NodeTable directly with append().
+
+    Indexing or iterating over a NodeTable yields NodeInput rows. Rows are
+    created lazily and kept, so later calls to mark_provisioned are reflected
+    in them. When a table is built from existing NodeInput objects, those
+    objects are used as the rows.
+    """
+
+    _INITIAL_CAPACITY = 64
+
+    def __init__(self, capacity=None):
+        capacity = max(capacity or 0, self._INITIAL_CAPACITY)
+        self.node_uuids = []
+        self.flavor_names = []
+        self.image_uuids = []
+        self.domain_names = []
+        self._flavor_codes = {}
+        self._image_codes = {}
+        self._domain_codes = {}
+        self._rows = []
+        self._size = 0
+        self._flavors = np.empty(capacity, dtype=np.int32)
+        self._provisioned = np.empty(capacity, dtype=np.bool_)
+        self._cached = np.empty(capacity, dtype=np.bool_)
+        self._images = np.empty(capacity, dtype=np.int32)
+        self._domains = np.empty(capacity, dtype=np.int32)
+        self._deployed = np.empty(capacity, dtype=np.bool_)
+        self._caching = np.empty(capacity, dtype=np.bool_)
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """Build a NodeTable from an iterable of NodeInput objects.
+
+        If nodes is already a NodeTable, it is returned unchanged.
+        """
+        if isinstance(nodes, NodeTable):
+            return nodes
+        nodes = list(nodes)
+        table = cls(capacity=len(nodes))
+        for node in nodes:
+            table.append_node(node)
+        return table
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for index in six.moves.range(self._size):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if index < 0 or index >= self._size:
+            raise IndexError("NodeTable index out of range")
+        row = self._rows[index]
+        if row is None:
+            image_code = self._images[index]
+            domain_code = self._domains[index]
+            row = NodeInput(self.node_uuids[index],
+                            self.flavor_names[self._flavors[index]],
+                            bool(self._provisioned[index]),
+                            bool(self._cached[index]),
+                            (self.image_uuids[image_code]
+                             if image_code != NO_IMAGE else None),
+                            (self.domain_names[domain_code]
+                             if domain_code != NO_DOMAIN else None),
+                            bool(self._deployed[index]),
+                            bool(self._caching[index]))
+            self._rows[index] = row
+        return row
+
+    @property
+    def flavors(self):
+        return self._flavors[:self._size]
+
+    @property
+    def provisioned(self):
+        return self._provisioned[:self._size]
+
+    @property
+    def cached(self):
+        return self._cached[:self._size]
+
+    @property
+    def images(self):
+        return self._images[:self._size]
+
+    @property
+    def domains(self):
+        return self._domains[:self._size]
+
+    @property
+    def deployed(self):
+        return self._deployed[:self._size]
+
+    @property
+    def caching(self):
+        return self._caching[:self._size]
+
+    def _reserve(self, count):
+        needed = self._size + count
+        capacity = len(self._flavors)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for attr in ('_flavors', '_provisioned', '_cached', '_images',
+                     '_domains', '_deployed', '_caching'):
+            old = getattr(self, attr)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, attr, new)
+
+    @staticmethod
+    def _intern(value, codes, values):
+        code = codes.get(value)
+        if code is None:
+            code = len(values)
+            codes[value] = code
+            values.append(intern_identifier(value))
+        return code
+
+    def append(self, node_uuid, flavor, is_provisioned=False,
+               is_cached=False, image_uuid='', domain=None, is_deployed=None,
+               is_caching=False, _row=None):
+        """Append a single node to the table.
+
+        is_deployed defaults to is_provisioned, as for NodeInput.
+        """
+        self._reserve(1)
+        index = self._size
+        self.node_uuids.append(node_uuid)
+        self._rows.append(_row)
+        self._flavors[index] = self._intern(flavor, self._flavor_codes,
+                                            self.flavor_names)
+        self._provisioned[index] = bool(is_provisioned)
+        self._cached[index] = bool(is_cached)
+        if image_uuid is None:
+            self._images[index] = NO_IMAGE
+        else:
+            self._images[index] = self._intern(image_uuid, self._image_codes,
+                                               self.image_uuids)
+        if domain is None:
+            self._domains[index] = NO_DOMAIN
+        else:
+            self._domains[index] = self._intern(domain, self._domain_codes,
+                                                self.domain_names)
+        self._deployed[index] = bool(is_provisioned if is_deployed is None
+                                     else is_deployed)
+        self._caching[index] = bool(is_caching)
+        self._size += 1
+
+    def append_node(self, node):
+        """Append a NodeInput to the table, using it as the row view."""
+        self.append(node.node_uuid, node.flavor, node.provisioned,
+                    node.cached, node.cached_image_uuid, node.domain,
+                    node.deployed, node.caching, _row=node)
+
+    def _indices(self, index):
+        index = np.asarray(index)
+        if index.dtype == np.bool_:
+            return np.flatnonzero(index)
+        return index.astype(np.intp)
+
+    def select(self, index):
+        """Return a new NodeTable holding a subset of this table's nodes.
+
+        :param index: A boolean mask or an array of row indices.
+        """
+        indices = self._indices(index)
+        subset = NodeTable(capacity=len(indices))
+        # Interned values are shared so codes stay comparable across tables.
+        subset.flavor_names = self.flavor_names
+        subset.image_uuids = self.image_uuids
+        subset.domain_names = self.domain_names
+        subset._flavor_codes = self._flavor_codes
+        subset._image_codes = self._image_codes
+        subset._domain_codes = self._domain_codes
+        subset._size = len(indices)
+        subset._flavors[:subset._size] = self.flavors[indices]
+        subset._provisioned[:subset._size] = self.provisioned[indices]
+        subset._cached[:subset._size] = self.cached[indices]
+        subset._images[:subset._size] = self.images[indices]
+        subset._domains[:subset._size] = self.domains[indices]
+        subset._deployed[:subset._size] = self.deployed[indices]
+        subset._caching[:subset._size] = self.caching[indices]
+        subset.node_uuids = [self.node_uuids[i] for i in indices]
+        subset._rows = [self._rows[i] for i in indices]
+        return subset
+
+    def copy(self):
+        """Return a NodeTable with the same nodes which shares no state with
+        this one, so marking either leaves the other unchanged.
+        """
+        duplicate = self.select(np.arange(self._size))
+        duplicate.flavor_names = list(self.flavor_names)
+        duplicate.image_uuids = list(self.image_uuids)
+        duplicate.domain_names = list(self.domain_names)
+        duplicate._flavor_codes = dict(self._flavor_codes)
+        duplicate._image_codes = dict(self._image_codes)
+        duplicate._domain_codes = dict(self._domain_codes)
+        # Rows are rebuilt from the copied columns when first needed.
+        duplicate._rows = [None] * self._size
+        return duplicate
+
+    def mark_provisioned(self, index):
+        """Mark the selected nodes as provisioned, including their rows."""
+        indices = self._indices(index)
+        self.provisioned[indices] = True
+        for i in indices:
+            row = self._rows[i]
+            if row is not None:
+                row.provisioned = True
+
+    def mark_cached(self, index, image_uuid):
+        """Mark the selected nodes as caching image_uuid, including their
+        rows.
+        """
+        indices = self._indices(index)
+        self.cached[indices] = True
+        self.caching[indices] = True
+        self.images[indices] = self._intern(image_uuid, self._image_codes,
+                                            self.image_uuids)
+        for i in indices:
+            row = self._rows[i]
+            if row is not None:
+                row.cached = True
+                row.caching = True
+                row.cached_image_uuid = image_uuid
+
+    def flavor_code(self, flavor_name):
+        return self._flavor_codes.get(flavor_name)
+
+    def image_code(self, image_uuid):
+        return self._image_codes.get(image_uuid)
+
+    def domain_name(self, index):
+        """The topology domain of the node at index, or None."""
+        domain_code = self._domains[index]
+        if domain_code == NO_DOMAIN:
+            return None
+        return self.domain_names[domain_code]
+
+    def unprovisioned_mask(self):
+        return ~self.provisioned
+
+    def cached_mask(self):
+        """Nodes which are cached (or caching) and not provisioned."""
+        return self.cached & ~self.provisioned
+
+    def available_mask(self):
+        """Nodes which are available for caching."""
+        return ~(self.cached | self.provisioned)
+
+    def image_counts(self):
+        """Count cached, unprovisioned nodes by image code."""
+        images = self.images[self.cached_mask()]
+        return np.bincount(images[images != NO_IMAGE],
+                           minlength=len(self.image_uuids))
+
+    def image_distribution(self):
+        """Return a dict of image UUID to the number of cached nodes."""
+        counts = self.image_counts()
+        return {self.image_uuids[code]: int(counts[code])
+                for code in np.flatnonzero(counts)}
+
+    def group_by_flavor(self):
+        """Return a dict of flavor name to an array of row indices."""
+        flavors = self.flavors
+        order = np.argsort(flavors, kind='mergesort')
+        counts = np.bincount(flavors, minlength=len(self.flavor_names))
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        return {self.flavor_names[code]: groups[code]
+                for code in np.flatnonzero(counts)}
+
+
 class FlavorInput(StrategyInput):
+    __slots__ = ('name', 'is_flavor_node')
+
     def __init__(self, name, identity_func):
-        super(FlavorInput, self).__init__()
-        self.name = name
+        self.name = intern_identifier(name)
         self.is_flavor_node = identity_func
 
     def __str__(self):
@@ -108,11 +478,14 @@ class FlavorInput(StrategyInput):
 
 
 class ImageInput(StrategyInput):
-    def __init__(self, name, uuid, checksum):
-        super(ImageInput, self).__init__()
-        self.name = name
-        self.uuid = uuid
+    __slots__ = ('name', 'uuid', 'checksum', 'size')
+
+    def __init__(self, name, uuid, checksum, size=None):
+        self.name = intern_identifier(name)
+        self.uuid = intern_identifier(uuid)
         self.checksum = checksum
+        # Size of the image in bytes, if known.
+        self.size = size
 
     def __str__(self):
         return "[ImageInput]: %s, %s, %s" % (self.name,
@@ -121,11 +494,19 @@ class ImageInput(StrategyInput):
 
 
 class StrategyAction(object):
-    """Base class for actions a CachingStratgy object may take."""
-    def __init__(self, format_string="{0}", format_attrs=['name']):
-        self.name = self.__class__.__name__
-        self.format_string = format_string
-        self.format_attrs = format_attrs
+    """Base class for actions a CachingStratgy object may take.
+
+    Subclasses describe how they are rendered by str() with the class-level
+    format_string and format_attrs attributes.
+    """
+    __slots__ = ()
+
+    format_string = "{0}"
+    format_attrs = ('name',)
+
+    @property
+    def name(self):
+        return self.__class__.__name__
 
     def __str__(self):
         format_list = []
@@ -138,21 +519,24 @@ class CacheNode(StrategyAction):
     """Contains all the information necessary to cache a specific
     image on a specific node.
     """
+    __slots__ = ('node_uuid', 'image_uuid', 'image_checksum')
+
+    format_string = "{0}: Cache image '{1}' on node '{2}'."
+    format_attrs = ('name', 'image_uuid', 'node_uuid')
 
     def __init__(self, node_uuid, image_uuid, image_checksum):
-        super(CacheNode, self).__init__(
-            format_string="{0}: Cache image '{1}' on node '{2}'.",
-            format_attrs=['name', 'image_uuid', 'node_uuid'])
         self.node_uuid = node_uuid
-        self.image_uuid = image_uuid
+        self.image_uuid = intern_identifier(image_uuid)
         self.image_checksum = image_checksum
 
 
 class EjectNode(StrategyAction):
+    __slots__ = ('node_uuid',)
+
+    format_string = "{0}: Eject node '{1}' from cache."
+    format_attrs = ('name', 'node_uuid')
+
     def __init__(self, node_uuid):
-        super(EjectNode, self).__init__(
-            format_string="{0}: Eject node '{1}' from cache.",
-            format_attrs=['name', 'node_uuid'])
         self.node_uuid = node_uuid
 
 
@@ -178,33 +562,157 @@ class CachingStrategy(object):
         """
         pass
 
+    # Directives which may be issued this cycle, see set_directive_budget.
+    cache_budget = None
+    eject_budget = None
 
-def build_node_statistics(nodes, images):
-    """Build a dictionary of cache statistics about a group of nodes."""
-    # Generic statistics applicable to all groups of nodes.
-    node_statistics = {
-        'provisioned': len(filter(lambda n: n.provisioned, nodes)),
-        'not provisioned': len(filter(lambda n: not n.provisioned, nodes)),
-        'available (not cached)': len(filter(lambda n: n.can_cache(), nodes)),
-        'cached (includes \'caching\')':
-            len(filter(lambda n: n.cached and not n.provisioned, nodes)),
-        'total': len(nodes),
-        'images': collections.defaultdict(lambda: 0)
-    }
+    def set_directive_budget(self, cache=None, eject=None):
+        """Tell the strategy how many cache and eject directives can still be
+        issued, such as under the director's rate limits. None means no
+        limit. Strategies may use this to plan only work that can be carried
+        out.
+        """
+        self.cache_budget = cache
+        self.eject_budget = eject
+
+    def apply_node_changes(self, added=(), changed=(), removed=()):
+        """Incrementally update the strategy's view of nodes.
+
+        An alternative to passing every node to update_current_state when
+        only a few nodes have changed since the last update. Strategies
+        which can do better override this; by default the changes are
+        merged into the nodes, images and flavors last passed to
+        update_current_state, which are expected in the current_nodes,
+        current_images and current_flavors attributes, and
+        update_current_state is called again with the result.
+
+        :param added: NodeInput objects for nodes not seen before.
+        :param changed: NodeInput objects with the new state of known nodes.
+        :param removed: UUIDs of nodes which no longer exist.
+        """
+        nodes = collections.OrderedDict(
+            (node.node_uuid, node) for node in self.current_nodes)
+        for node_uuid in removed:
+            nodes.pop(node_uuid, None)
+        for node in itertools.chain(changed, added):
+            nodes[node.node_uuid] = node
+        self.update_current_state(list(nodes.values()), self.current_images,
+                                  self.current_flavors)
+
+
+class NodeStatistics(object):
+    """Cache statistics about a group of nodes.
+
+    images maps image names (or UUIDs, for unknown images) to the number of
+    cached, unprovisioned nodes holding them. Images with a count of zero
+    are omitted.
+    """
+    __slots__ = ('total', 'provisioned', 'available', 'cached', 'images')
+
+    def __init__(self, total=0, provisioned=0, available=0, cached=0,
+                 images=None):
+        self.total = total
+        self.provisioned = provisioned
+        self.available = available
+        self.cached = cached
+        self.images = images or {}
+
+    @property
+    def not_provisioned(self):
+        return self.total - self.provisioned
+
+    def as_dict(self):
+        """Return the statistics in the format of build_node_statistics."""
+        image_counts = collections.defaultdict(lambda: 0)
+        image_counts.update(self.images)
+        return {
+            'provisioned': self.provisioned,
+            'not provisioned': self.not_provisioned,
+            'available (not cached)': self.available,
+            'cached (includes \'caching\')': self.cached,
+            'total': self.total,
+            'images': image_counts
+        }
+
+
+class FleetStatistics(object):
+    """Overall and per-flavor NodeStatistics, see build_fleet_statistics."""
+    __slots__ = ('overall', 'by_flavor')
+
+    def __init__(self, overall, by_flavor):
+        self.overall = overall
+        self.by_flavor = by_flavor
+
+
+def build_fleet_statistics(nodes, flavors, images):
+    """Build overall and per-flavor cache statistics in a single pass.
+
+    Every node is bucketed by its flavor code (and by flavor and image code
+    for cached nodes) with bincount, and the overall statistics are the sums
+    of the per-flavor buckets.
+
+    Returns a FleetStatistics object. by_flavor has an entry for every
+    flavor in flavors, even those without nodes. Nodes of other flavors
+    only count towards the overall statistics.
+    """
+    table = NodeTable.from_nodes(nodes)
+    num_flavors = len(table.flavor_names)
+    num_images = len(table.image_uuids)
+    flavor_codes = table.flavors
+
+    def count_by_flavor(mask):
+        return np.bincount(flavor_codes[mask], minlength=num_flavors)
+
+    totals = np.bincount(flavor_codes, minlength=num_flavors)
+    provisioned = count_by_flavor(table.provisioned)
+    available = count_by_flavor(table.available_mask())
+    cached_mask = table.cached_mask()
+    cached = count_by_flavor(cached_mask)
+
+    image_codes = table.images
+    cached_with_image = cached_mask & (image_codes != NO_IMAGE)
+    image_counts = np.bincount(
+        flavor_codes[cached_with_image] * num_images +
+        image_codes[cached_with_image],
+        minlength=num_flavors * num_images).reshape(num_flavors, num_images)
 
     image_names_by_uuid = {image.uuid: image.name for image in images}
+    # If we don't know the name of the image, just use the UUID.
+    image_labels = [image_names_by_uuid.get(image_uuid, image_uuid)
+                    for image_uuid in table.image_uuids]
+
+    def image_breakdown(counts):
+        breakdown = {}
+        for code in np.flatnonzero(counts):
+            label = image_labels[code]
+            breakdown[label] = breakdown.get(label, 0) + int(counts[code])
+        return breakdown
+
+    overall = NodeStatistics(total=len(table),
+                             provisioned=int(provisioned.sum()),
+                             available=int(available.sum()),
+                             cached=int(cached.sum()),
+                             images=image_breakdown(image_counts.sum(axis=0)))
+
+    by_flavor = {}
+    for flavor in flavors:
+        code = table.flavor_code(flavor.name)
+        if code is None:
+            by_flavor[flavor.name] = NodeStatistics()
+            continue
+        by_flavor[flavor.name] = NodeStatistics(
+            total=int(totals[code]),
+            provisioned=int(provisioned[code]),
+            available=int(available[code]),
+            cached=int(cached[code]),
+            images=image_breakdown(image_counts[code]))
+
+    return FleetStatistics(overall, by_flavor)
 
-    # Build statistics around which images are cached.
-    for node in nodes:
-        if (node.cached and
-                not node.provisioned and
-                node.cached_image_uuid is not None):
-            # If we don't know the name of the image, just return the UUID.
-            image_name = image_names_by_uuid.get(node.cached_image_uuid,
-                                                 node.cached_image_uuid)
-            node_statistics['images'][image_name] += 1
 
-    return node_statistics
+def build_node_statistics(nodes, images):
+    """Build a dictionary of cache statistics about a group of nodes."""
+    return build_fleet_statistics(nodes, [], images).overall.as_dict()
 
 
 def log_node_statisitics(built_statistics):
@@ -222,20 +730,22 @@ def log_node_statisitics(built_statistics):
 
 
 def log_overall_node_statistics(nodes, flavors, images):
-    """Build & Log statistics about nodes, both overall and by flavor."""
+    """Build & Log statistics about nodes, both overall and by flavor.
+
+    Returns the FleetStatistics that were logged, so callers can reuse them.
+    """
+    statistics = build_fleet_statistics(nodes, flavors, images)
+
     # We want stats about the all nodes.
-    overall_statistics = build_node_statistics(nodes, images)
     LOG.info("Overall node statistics.")
-    log_node_statisitics(overall_statistics)
+    log_node_statisitics(statistics.overall.as_dict())
 
     # As well as those divided by flavor.
-    flavor_stats = {}
     for flavor in flavors:
-        flavor_nodes = filter(lambda n: n.flavor == flavor.name, nodes)
-        flavor_stats[flavor.name] = build_node_statistics(flavor_nodes,
-                                                          images)
         LOG.info("Statistics for '%(name)s' flavor.", {'name': flavor.name})
-        log_node_statisitics(flavor_stats[flavor.name])
+        log_node_statisitics(statistics.by_flavor[flavor.name].as_dict())
+
+    return statistics
 
 
 def find_image_differences(current_image_list, new_image_list):
@@ -345,107 +855,196 @@ def build_attribute_dict(items, attr_name):
 
 def get_image_weights(image_names):
     """Return a dictionary of requested image names to weights."""
+    image_weights = CONF.strategy.image_weights
     default_weight = CONF.strategy.default_image_weight
     weights_by_name = {}
     for name in image_names:
-        weight = CONF.strategy.image_weights.get(name)
+        weight = image_weights.get(name)
         if weight is None:
             weight = default_weight
         weights_by_name[name] = weight
     return weights_by_name
 
 
+class ImageWeightTable(object):
+    """The configured weights of a list of images, looked up once.
+
+    Used through get_image_weight_table, which rebuilds the table only when
+    the images or the weight options change. weights holds one weight per
+    image, in the order of images, and
+    normalized holds the same weights divided by their sum (all zeros if the
+    sum is zero).
+    """
+
+    def __init__(self, images, image_weights, default_weight):
+        self.images = list(images)
+        self._catalog = None
+        self._catalog_version = None
+        if isinstance(images, image_catalog.ImageCatalog):
+            self._catalog = images
+            self._catalog_version = images.version
+        self.image_weights = dict(image_weights)
+        self.default_weight = default_weight
+        self.weights_by_name = {}
+        for image in self.images:
+            weight = self.image_weights.get(image.name)
+            if weight is None:
+                weight = default_weight
+            self.weights_by_name[image.name] = weight
+        self.weights = np.array(
+            [self.weights_by_name[image.name] for image in self.images],
+            dtype=np.float64)
+        self.weight_sum = sum(self.weights_by_name[image.name]
+                              for image in self.images)
+        if self.weight_sum != 0:
+            self.normalized = self.weights / self.weight_sum
+        else:
+            self.normalized = np.zeros(len(self.images))
+
+    def matches(self, images, image_weights, default_weight):
+        """Whether the table is still valid for these images and options."""
+        if (default_weight != self.default_weight or
+                image_weights != self.image_weights):
+            return False
+        if isinstance(images, image_catalog.ImageCatalog):
+            return (images is self._catalog and
+                    images.version == self._catalog_version)
+        if len(images) != len(self.images):
+            return False
+        return all(image.name == current.name
+                   for image, current in zip(images, self.images))
+
+    def scale_factor(self, total_desired_cached):
+        """The factor that scales the weights to total_desired_cached."""
+        if self.weight_sum != 0:
+            return total_desired_cached / self.weight_sum
+        return 1
+
+    def scaled_weights(self, total_desired_cached):
+        """Weights scaled to sum to total_desired_cached, in image order."""
+        return self.weights * self.scale_factor(total_desired_cached)
+
+
+_image_weight_table = None
+
+
+def get_image_weight_table(images):
+    """Return an ImageWeightTable for images and the current configuration.
+
+    The table is reused until the images or the weight options change.
+    """
+    global _image_weight_table
+    image_weights = CONF.strategy.image_weights
+    default_weight = CONF.strategy.default_image_weight
+    table = _image_weight_table
+    if table is None or not table.matches(images, image_weights,
+                                          default_weight):
+        table = ImageWeightTable(images, image_weights, default_weight)
+        _image_weight_table = table
+    return table
+
+
 def _determine_image_distribution(nodes):
     """Finds the current distribution of cached images across available nodes.
 
     Returns a dictionary where the keys are image uuids and the values are
     the integral frequency of their occurance.
     """
-    cached_images = [node.cached_image_uuid for node in nodes
-                     if (node.cached_image_uuid is not None and
-                         node.cached and
-                         not node.provisioned)]
     current_image_distribution = collections.defaultdict(lambda: 0)
-    for image_uuid in cached_images:
-        current_image_distribution[image_uuid] += 1
+    current_image_distribution.update(
+        NodeTable.from_nodes(nodes).image_distribution())
     return current_image_distribution
 
 
-def _pick_images(images,
-                 distribution_difference_dict,
-                 num_images,
-                 picker_func,
-                 distribution_mutator_func):
-    """Function to abstract picking images with a distribution differential
+def _pick_images(distribution_difference, num_images, pick_largest=True):
+    """Pick images one at a time based on a distribution differential.
 
-    picker_func should return a selection from distribution_difference_dict.
+    distribution_difference is a list of [image, difference] pairs. When
+    pick_largest is True, the image with the largest difference is picked
+    each time and its difference is decremented by one. Otherwise the image
+    with the smallest difference is picked and its difference is incremented
+    by one. Ties go to the pair appearing first in distribution_difference.
 
-    distribution_mutator_func should mutate either the returned pair or the
-    overall difference dictionary in order to make the next proper
-    selection.
+    The pairs are not modified. Runs in O(k log m) for k picks among m images.
     """
+    step = -1 if pick_largest else 1
+    sign = -1 if pick_largest else 1
 
-    # Avoid side effects propogating outside the function.
-    difference_dict = copy.deepcopy(distribution_difference_dict)
+    # Heap entries are (key, position, difference, image). The position
+    # breaks ties the same way max()/min() over the list would.
+    heap = [(sign * difference, position, difference, image)
+            for position, (image, difference)
+            in enumerate(distribution_difference)]
+    heapq.heapify(heap)
 
     picked_images = []
     for n in range(0, num_images):
-        most_needed_image_pair = picker_func(difference_dict)
-        # Adds the most 'needed' image, based on picker_func's preference.
-        picked_images.append(most_needed_image_pair[0])
+        key, position, difference, image = heap[0]
+        picked_images.append(image)
         # Update the distribution to reflect the selected image being
-        # scheduled to cache onto a node.
-        distribution_mutator_func(most_needed_image_pair, difference_dict)
+        # scheduled, then restore the heap invariant.
+        difference += step
+        heapq.heapreplace(heap, (sign * difference, position, difference,
+                                 image))
 
     return picked_images
 
 
 def _get_scaled_weights(images, scale_factor):
-    # Get weighted image information from the strategy base.
-    weights_by_name = get_image_weights([image.name for image in images])
+    table = get_image_weight_table(images)
 
     # NOTE(ClifHouck): The scaled weights will not be integers, but that's OK.
     # This is more accurate than forcing the scaled weights to integral
     # factors.
-    scaled_weights = {
-        image.name: scale_factor * weights_by_name[image.name]
+    return {
+        image.name: scale_factor * table.weights_by_name[image.name]
         for image in images
     }
 
-    return scaled_weights
+
+def _get_scale_factor(num_images_to_cache, images, num_cached_nodes):
+    # Scale the desired distribution to match the number of nodes to be in
+    # the cache.
+    return get_image_weight_table(images).scale_factor(
+        num_cached_nodes + num_images_to_cache)
 
 
 def _get_scale_factor_for_caching_nodes(num_images_to_cache,
                                         images,
                                         nodes):
-    # Get weighted image information from the strategy base.
-    weights_by_name = get_image_weights([image.name for image in images])
+    num_cached_nodes = int(np.count_nonzero(
+        NodeTable.from_nodes(nodes).cached_mask()))
+    return _get_scale_factor(num_images_to_cache, images, num_cached_nodes)
 
-    # Scale the desired distribution to match the number of nodes to be in
-    # the cache.
-    weight_sum = sum([weights_by_name[image.name] for image in images])
 
-    num_cached_nodes = len([node for node in nodes if
-                            node.cached and not node.provisioned])
-    total_desired_cached = num_cached_nodes + num_images_to_cache
+def _name_image_distribution(images, uuid_distribution):
+    image_uuids_to_names = {image.uuid: image.name for image in images}
 
-    scale_factor = 1
-    if weight_sum != 0:
-        scale_factor = total_desired_cached / weight_sum
+    named_distribution = collections.defaultdict(lambda: 0)
+    for uuid, frequency in uuid_distribution.iteritems():
+        named_distribution[image_uuids_to_names.get(uuid, uuid)] = frequency
 
-    return scale_factor
+    return named_distribution
 
 
 def _get_named_image_distribution(images, nodes):
     # Get the distribution by image uuid and then translate uuids to names.
-    uuid_distribution = _determine_image_distribution(nodes)
-    image_uuids_to_names = {image.uuid: image.name for image in images}
+    return _name_image_distribution(images,
+                                    _determine_image_distribution(nodes))
 
-    named_distribution = collections.defaultdict(lambda: 0)
-    for uuid, frequency in uuid_distribution.iteritems():
-        named_distribution[image_uuids_to_names[uuid]] = frequency
 
-    return named_distribution
+def _get_caching_difference(num_images, images, image_distribution,
+                            num_cached_nodes):
+    """Difference between the desired and current distribution of images,
+    once num_images more nodes are cached, as [image, difference] pairs.
+    """
+    named_distribution = _name_image_distribution(images, image_distribution)
+    table = get_image_weight_table(images)
+    scaled_weights = table.scaled_weights(num_cached_nodes + num_images)
+    return [
+        [image, (scaled_weight - named_distribution[image.name])]
+        for image, scaled_weight in zip(images, scaled_weights.tolist())
+    ]
 
 
 def choose_weighted_images_forced_distribution(num_images, images, nodes):
@@ -462,27 +1061,313 @@ def choose_weighted_images_forced_distribution(num_images, images, nodes):
 
     num_images - the number (integer) of images to choose to cache
     images - a list of to ImageInputs consider for caching
-    nodes - a list of NodeInputs to use for determining which images
-        need to be cached the most
+    nodes - a NodeTable or list of NodeInputs to use for determining which
+        images need to be cached the most
+
+    Unless the apportionment_method option is 'incremental', the images are
+    counted out with the configured apportionment method instead.
+    """
+    nodes = NodeTable.from_nodes(nodes)
+    return choose_weighted_images_for_distribution(
+        num_images, images, nodes.image_distribution(),
+        int(np.count_nonzero(nodes.cached_mask())))
+
+
+def choose_weighted_images_for_distribution(num_images, images,
+                                            image_distribution,
+                                            num_cached_nodes=None):
+    """Like choose_weighted_images_forced_distribution, but works from
+    counts of cached nodes rather than from the nodes themselves.
+
+    image_distribution - a dictionary of image UUIDs to the number of
+        cached, unprovisioned nodes holding them
+    num_cached_nodes - the number of cached, unprovisioned nodes. Defaults to
+        the sum of image_distribution.
     """
-    named_distribution = _get_named_image_distribution(images, nodes)
+    if num_cached_nodes is None:
+        num_cached_nodes = sum(six.itervalues(image_distribution))
 
     # Take the difference of the desired distribution with the current
     # one.
-    scaled_weights = _get_scaled_weights(
-        images, _get_scale_factor_for_caching_nodes(num_images, images, nodes))
-    distribution_difference = [
-        [image, (scaled_weights[image.name] - named_distribution[image.name])]
-        for image in images
-    ]
+    distribution_difference = _get_caching_difference(
+        num_images, images, image_distribution, num_cached_nodes)
+
+    method = CONF.strategy.apportionment_method
+    if method != 'incremental':
+        return list(expand_apportionment(
+            _apportion(distribution_difference, num_images, method)))
+
+    return _pick_images(distribution_difference, num_images,
+                        pick_largest=True)
+
+
+def _largest_remainder_counts(votes, seats):
+    """Hamilton's method: floor each quota, then hand out the remaining
+    seats by largest fractional remainder. Ties go to earlier entries.
+    """
+    quotas = votes * (seats / votes.sum())
+    counts = np.floor(quotas).astype(np.int64)
+    remaining = seats - int(counts.sum())
+    if remaining > 0:
+        remainders = quotas - counts
+        # lexsort uses the last key as the primary one.
+        order = np.lexsort((np.arange(len(votes)), -remainders))
+        counts[order[:remaining]] += 1
+    return counts
+
+
+def _divisor_counts(votes, seats, offset):
+    """Divisor methods (D'Hondt, Sainte-Laguë) with a jump start.
+
+    Seats are first allocated with the standard divisor, which lands within
+    len(votes) seats of the house size. The difference is then settled one
+    seat at a time by priority, so the cost does not depend on seats.
+    """
+    counts = np.floor(votes * (seats / votes.sum()) + (1 - offset))
+    counts = np.where(votes > 0, counts, 0).astype(np.int64)
+
+    allocated = int(counts.sum())
+    if allocated < seats:
+        # Award the next seat to the highest votes / (seats + offset).
+        heap = [(-votes[i] / (counts[i] + offset), i)
+                for i in np.flatnonzero(votes > 0)]
+        heapq.heapify(heap)
+        for n in range(seats - allocated):
+            priority, i = heap[0]
+            counts[i] += 1
+            heapq.heapreplace(heap, (-votes[i] / (counts[i] + offset), i))
+    elif allocated > seats:
+        # Take back the seat with the lowest votes / (seats - 1 + offset).
+        heap = [(votes[i] / (counts[i] - 1 + offset), -i)
+                for i in np.flatnonzero(counts > 0)]
+        heapq.heapify(heap)
+        for n in range(allocated - seats):
+            priority, i = heapq.heappop(heap)
+            i = -i
+            counts[i] -= 1
+            if counts[i] > 0:
+                heapq.heappush(heap,
+                               (votes[i] / (counts[i] - 1 + offset), -i))
+    return counts
+
+
+def _apportion(distribution_difference, num_images, method):
+    """Divide num_images between the [image, difference] pairs.
+
+    Only images below their desired share (a positive difference) receive
+    nodes, in proportion to how far below it they are. If no image is below
+    its share, nodes are divided evenly.
+    """
+    if num_images <= 0 or not distribution_difference:
+        return [(image, 0) for image, difference in distribution_difference]
+
+    votes = np.array([max(difference, 0)
+                      for image, difference in distribution_difference],
+                     dtype=np.float64)
+    if votes.sum() <= 0:
+        votes = np.ones(len(votes))
+
+    if method == 'hamilton':
+        counts = _largest_remainder_counts(votes, num_images)
+    elif method in DIVISOR_OFFSETS:
+        counts = _divisor_counts(votes, num_images, DIVISOR_OFFSETS[method])
+    else:
+        raise ValueError("Unknown apportionment method '%s'." % method)
+
+    return [(image, int(count))
+            for (image, difference), count in zip(distribution_difference,
+                                                  counts)]
+
+
+def apportion_images(num_images, images, nodes, method=None):
+    """Compute how many of num_images nodes each image should be cached to.
+
+    Uses the same target distribution as
+    choose_weighted_images_forced_distribution, but computes every image's
+    count at once instead of picking one image at a time.
+
+    num_images - the number (integer) of nodes to divide between images
+    images - a list of ImageInputs to consider for caching
+    nodes - a NodeTable or list of NodeInputs holding the current cache
+    method - 'hamilton', 'dhondt' or 'sainte-lague'. Defaults to the
+        configured apportionment_method, or 'hamilton' if that is
+        'incremental'.
+
+    Returns a list of (ImageInput, count) pairs in the order of images. Use
+    expand_apportionment to turn it into a sequence of images.
+    """
+    if method is None:
+        method = CONF.strategy.apportionment_method
+        if method == 'incremental':
+            method = 'hamilton'
+
+    nodes = NodeTable.from_nodes(nodes)
+    distribution_difference = _get_caching_difference(
+        num_images, images, nodes.image_distribution(),
+        int(np.count_nonzero(nodes.cached_mask())))
+    return _apportion(distribution_difference, num_images, method)
+
+
+def expand_apportionment(image_counts):
+    """Lazily expand (image, count) pairs into a sequence of images.
+
+    Images are interleaved round-robin, so any prefix of the sequence is
+    spread across images rather than exhausting one image at a time.
+    """
+    remaining = [[image, count] for image, count in image_counts if count > 0]
+    while remaining:
+        for pair in remaining:
+            yield pair[0]
+            pair[1] -= 1
+        remaining = [pair for pair in remaining if pair[1] > 0]
+
+
+def sample_nodes(candidates, k, rng=random, seed=None):
+    """Draw k candidates uniformly at random, without replacement.
+
+    Sized sequences, including NumPy arrays, are sampled with a partial
+    Fisher-Yates shuffle that records only the positions it swaps, so neither
+    the candidates nor a shuffled copy of them are materialized. Any other
+    iterable is consumed as a stream with reservoir sampling (Algorithm L),
+    which draws O(k log(n / k)) random numbers rather than one per
+    candidate. Both use O(k) memory.
+
+    rng - the random generator to draw from.
+    seed - if given, draw from a new generator seeded with it instead, so
+        that results are reproducible.
+
+    Returns a list of min(k, n) candidates, in random order.
+    """
+    if seed is not None:
+        rng = random.Random(seed)
+    if k <= 0:
+        return []
+    if isinstance(candidates, (collections.Sequence, np.ndarray)):
+        return _partial_fisher_yates(candidates, k, rng)
+    return _reservoir_sample(iter(candidates), k, rng)
+
+
+class _PoolDraw(object):
+    """Draws items from a sequence at random without replacement, one at a
+    time, with a partial Fisher-Yates shuffle which records only the
+    positions it swaps.
+    """
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.swapped = {}
+        self.position = 0
+
+    def remaining(self):
+        return len(self.sequence) - self.position
+
+    def draw(self, rng):
+        position = self.position
+        pick = rng.randrange(position, len(self.sequence))
+        node = self.sequence[self.swapped.get(pick, pick)]
+        self.swapped[pick] = self.swapped.get(position, position)
+        self.position += 1
+        return node
+
+
+def _partial_fisher_yates(sequence, k, rng):
+    draw = _PoolDraw(sequence)
+    return [draw.draw(rng) for _ in six.moves.range(min(k, len(sequence)))]
+
+
+_EXHAUSTED = object()
+
+
+def _reservoir_sample(iterator, k, rng):
+    reservoir = list(itertools.islice(iterator, k))
+    if len(reservoir) == k:
+        # Random numbers are taken from (0, 1] to keep log() defined.
+        threshold = math.exp(math.log(1.0 - rng.random()) / k)
+        while True:
+            if threshold < 1.0:
+                skip = int(math.floor(math.log(1.0 - rng.random()) /
+                                      math.log(1.0 - threshold)))
+            else:
+                skip = 0
+            item = next(itertools.islice(iterator, skip, None), _EXHAUSTED)
+            if item is _EXHAUSTED:
+                break
+            reservoir[rng.randrange(k)] = item
+            threshold *= math.exp(math.log(1.0 - rng.random()) / k)
+    # Items which were never replaced are still in stream order.
+    rng.shuffle(reservoir)
+    return reservoir
+
+
+def spread_across_domains(candidates, images, copies=None, max_per_domain=0,
+                          rng=random, in_flight=None):
+    """Assign images to nodes, spreading copies of each image across
+    topology domains.
+
+    candidates - (node UUID, domain) pairs of the nodes available for
+        caching. The domain may be None.
+    images - ImageInputs to cache, one node each.
+    copies - a dictionary of (image UUID, domain) pairs to the number of
+        nodes in the domain already cached with the image
+    max_per_domain - the most nodes which may be caching at once in any one
+        domain, or 0 for no limit. Nodes without a domain are never limited.
+    in_flight - a Counter of domains to the nodes already caching in them,
+        for any flavor. Nodes assigned here are added to it, so it can be
+        shared across the flavors of a cycle.
+
+    Each image goes to the domain holding the fewest copies of it, then to
+    the domain with the fewest nodes assigned so far, with ties broken at
+    random. Returns (node UUID, image) pairs, fewer than len(images) if the
+    per-domain limit leaves no node to use.
+    """
+    pools = collections.OrderedDict()
+    for node_uuid, domain in candidates:
+        pools.setdefault(domain, []).append(node_uuid)
+    return spread_across_domain_pools(pools, images, copies, max_per_domain,
+                                      rng, in_flight)
 
-    def decrement_distribution(distribution_pair, diff_dict):
-        distribution_pair[1] -= 1
 
-    return _pick_images(
-        images, distribution_difference, num_images,
-        picker_func=lambda diff: max(diff, key=lambda pair: pair[1]),
-        distribution_mutator_func=decrement_distribution)
+def spread_across_domain_pools(pools, images, copies=None, max_per_domain=0,
+                               rng=random, in_flight=None):
+    """Like spread_across_domains, but takes the available nodes as a
+    dictionary of domains to sequences of node UUIDs.
+
+    Nodes are drawn from the sequences as they are assigned, without copying
+    them, so the cost follows the number of images and domains rather than
+    the number of nodes.
+    """
+    domain_order = list(pools)
+    rng.shuffle(domain_order)
+    draws = {domain: _PoolDraw(pools[domain]) for domain in domain_order}
+
+    copies = collections.Counter(copies or {})
+    if in_flight is None:
+        in_flight = collections.Counter()
+    assigned = collections.Counter()
+    placements = []
+    for image in images:
+        best_key = None
+        best_domain = None
+        for rank, domain in enumerate(domain_order):
+            if not draws[domain].remaining():
+                continue
+            if (max_per_domain and domain is not None and
+                    in_flight[domain] >= max_per_domain):
+                continue
+            key = (copies[(image.uuid, domain)], assigned[domain], rank)
+            if best_key is None or key < best_key:
+                best_key = key
+                best_domain = domain
+        if best_key is None:
+            LOG.debug("No domain can take another node; %(num)d image(s) "
+                      "left unplaced.",
+                      {'num': len(images) - len(placements)})
+            break
+        placements.append((draws[best_domain].draw(rng), image))
+        copies[(image.uuid, best_domain)] += 1
+        assigned[best_domain] += 1
+        in_flight[best_domain] += 1
+    return placements
 
 
 def image_weight_guided_ejection(images, nodes):
@@ -506,13 +1391,57 @@ def image_weight_guided_ejection(images, nodes):
     Note that this will return the same number of images as the number of
     cached nodes found in 'nodes'.
     """
+    nodes = NodeTable.from_nodes(nodes)
+    return image_weight_guided_ejection_for_distribution(
+        images, nodes.image_distribution(),
+        int(np.count_nonzero(nodes.cached_mask())))
+
+
+def excess_cached_images(images, image_distribution, num_cached_nodes):
+    """Count the cached copies of each image above its weighted share.
+
+    An image's share is its weight scaled to num_cached_nodes, rounded up,
+    so a cache of that size holding the ideal distribution never holds more
+    copies of any image. The excess copies must therefore be ejected by any
+    plan that reaches the distribution, and ejecting just them is the least
+    that will do.
+
+    image_distribution - a dictionary of image UUIDs to the number of
+        cached, unprovisioned nodes holding them
+    Returns a dictionary of image UUIDs to a positive count of excess copies.
+    """
+    scaled_weights = _get_scaled_weights(
+        images, _get_scale_factor(0, images, num_cached_nodes))
+    excess = {}
+    for image in images:
+        # Allow for rounding error in the scaled weights.
+        share = int(math.ceil(scaled_weights[image.name] - 1e-9))
+        count = image_distribution.get(image.uuid, 0) - share
+        if count > 0:
+            excess[image.uuid] = count
+    return excess
+
+
+def image_weight_guided_ejection_for_distribution(images, image_distribution,
+                                                  num_cached_nodes=None):
+    """Like image_weight_guided_ejection, but works from counts of cached
+    nodes rather than from the nodes themselves.
+
+    image_distribution - a dictionary of image UUIDs to the number of
+        cached, unprovisioned nodes holding them
+    num_cached_nodes - the number of cached, unprovisioned nodes. Defaults to
+        the sum of image_distribution.
+    """
+    if num_cached_nodes is None:
+        num_cached_nodes = sum(six.itervalues(image_distribution))
+
     # Determine the current distribution of images across nodes.
-    named_distribution = _get_named_image_distribution(images, nodes)
+    named_distribution = _name_image_distribution(images, image_distribution)
 
     # Find the difference between the ideal distribution in the cache,
     # versus the reality.
     scaled_weights = _get_scaled_weights(
-        images, _get_scale_factor_for_caching_nodes(0, images, nodes))
+        images, _get_scale_factor(0, images, num_cached_nodes))
     distribution_difference = [
         [image, (scaled_weights[image.name] - named_distribution[image.name])]
         for image in images
@@ -530,10 +1459,5 @@ def image_weight_guided_ejection(images, nodes):
     # Pick images to eject based on how far above the distribution they
     # appear in the current cache. In this case, images cached more than they
     # should be will have negative values in the distribution difference.
-    def increment_distribution(distribution_pair, diff_dict):
-        distribution_pair[1] += 1
-
-    return _pick_images(
-        images, images_cached_too_much, max_to_eject,
-        picker_func=lambda diff: min(diff, key=lambda pair: pair[1]),
-        distribution_mutator_func=increment_distribution)
+    return _pick_images(images_cached_too_much, max_to_eject,
+                        pick_largest=False)
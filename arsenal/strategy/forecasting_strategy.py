@@ -0,0 +1,228 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import division
+
+import collections
+import itertools
+import math
+import time
+
+import numpy as np
+from oslo_config import cfg
+from oslo_log import log
+
+from arsenal.strategy import simple_proportional_strategy as sps
+
+LOG = log.getLogger(__name__)
+
+CONF = cfg.CONF
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+opts = [
+    cfg.IntOpt('lead_time',
+               default=3600,
+               help='How far ahead, in seconds, to forecast provisioning '
+               'demand. Each flavor keeps enough nodes cached to cover '
+               'the provisions expected over this period.'),
+    cfg.IntOpt('time_buckets',
+               default=24,
+               help='Number of time of day buckets provisioning rates are '
+               'tracked in, at least 1. 24 tracks a rate for every hour '
+               'of the day (UTC).'),
+    cfg.FloatOpt('rate_decay',
+                 default=0.3,
+                 help='Weight given to the newest observation when updating '
+                 'a provisioning rate, between 0 and 1. Higher values '
+                 'follow changes in demand faster.'),
+]
+
+forecasting_group = cfg.OptGroup(name='forecasting_strategy',
+                                 title='Forecasting Strategy Options')
+
+CONF.register_group(forecasting_group)
+CONF.register_opts(opts, forecasting_group)
+
+
+class ProvisioningRates(object):
+    """Exponentially decayed provisioning rates, per flavor and time of day.
+
+    Rates are in provisions per second. A bucket with no observations yet
+    falls back to the average of the flavor's other buckets.
+    """
+
+    def __init__(self, num_buckets=24, decay=0.3):
+        if num_buckets < 1:
+            raise ValueError("num_buckets must be a positive integer")
+        if not 0.0 <= decay <= 1.0:
+            raise ValueError("decay must be between 0 and 1")
+        self.num_buckets = num_buckets
+        self.bucket_seconds = SECONDS_PER_DAY / num_buckets
+        self.decay = decay
+        self.rates = {}
+
+    def bucket(self, timestamp):
+        return int((timestamp % SECONDS_PER_DAY) //
+                   self.bucket_seconds) % self.num_buckets
+
+    def observe(self, flavor_name, count, start, end):
+        """Record count provisions of a flavor between start and end.
+
+        The observation goes to the bucket holding the middle of the
+        interval.
+        """
+        elapsed = end - start
+        if elapsed <= 0:
+            return
+        observed_rate = count / elapsed
+        buckets = self.rates.setdefault(flavor_name,
+                                        [None] * self.num_buckets)
+        index = self.bucket(start + elapsed / 2)
+        if buckets[index] is None:
+            buckets[index] = observed_rate
+        else:
+            buckets[index] = (self.decay * observed_rate +
+                              (1 - self.decay) * buckets[index])
+
+    def rate(self, flavor_name, timestamp):
+        """The expected provisioning rate of a flavor at timestamp, or None
+        if nothing has been observed for the flavor.
+        """
+        buckets = self.rates.get(flavor_name)
+        if buckets is None:
+            return None
+        rate = buckets[self.bucket(timestamp)]
+        if rate is None:
+            known = [known_rate for known_rate in buckets
+                     if known_rate is not None]
+            rate = sum(known) / len(known)
+        return rate
+
+    def expected_provisions(self, flavor_name, start, duration):
+        """The number of provisions of a flavor expected between start and
+        start + duration, or None if nothing has been observed for it.
+        """
+        if flavor_name not in self.rates:
+            return None
+        expected = 0.0
+        current = start
+        end = start + duration
+        while current < end:
+            bucket_end = ((current // self.bucket_seconds) + 1) * (
+                self.bucket_seconds)
+            step = min(bucket_end, end) - current
+            expected += self.rate(flavor_name, current) * step
+            current += step
+        return expected
+
+
+class ForecastingStrategy(sps.SimpleProportionalStrategy):
+    """Sizes each flavor's cache from its recent provisioning rate.
+
+    Between calls to directives, the strategy counts the nodes of each flavor
+    that were deployed since the last update, and folds those counts into
+    per-flavor ProvisioningRates. Each flavor then keeps enough nodes cached
+    to cover the provisions expected over the configured lead time. Flavors
+    without any observations yet fall back to percentage_to_cache.
+
+    Only nodes becoming deployed are counted, so nodes Arsenal ejects, or
+    which go into cleaning or maintenance, do not read as demand, even though
+    they stop being available just the same.
+    """
+
+    def __init__(self):
+        super(ForecastingStrategy, self).__init__()
+        self.lead_time = CONF.forecasting_strategy.lead_time
+        self.rates = ProvisioningRates(CONF.forecasting_strategy.time_buckets,
+                                       CONF.forecasting_strategy.rate_decay)
+        self.pending_provisions = collections.Counter()
+        self.last_observed = None
+        self.forecast_time = None
+        # UUIDs of nodes which were not deployed to their flavor, as of the
+        # last update of node state.
+        self.previous_undeployed = None
+        LOG.info("Forecasting demand %(lead_time)d second(s) ahead.",
+                 {'lead_time': self.lead_time})
+
+    def update_current_state(self, nodes, images, flavors):
+        super(ForecastingStrategy, self).update_current_state(nodes, images,
+                                                              flavors)
+        table = self.current_nodes
+        if self.previous_undeployed is not None:
+            for index in np.flatnonzero(table.deployed):
+                flavor_name = self.previous_undeployed.get(
+                    table.node_uuids[index])
+                if flavor_name is not None:
+                    self.pending_provisions[flavor_name] += 1
+        self.previous_undeployed = {
+            table.node_uuids[index]: table.flavor_names[table.flavors[index]]
+            for index in np.flatnonzero(~table.deployed)}
+
+    def apply_node_changes(self, added=(), changed=(), removed=()):
+        added = list(added)
+        changed = list(changed)
+        removed = list(removed)
+        if self.previous_undeployed is not None:
+            for node in itertools.chain(added, changed):
+                if not node.deployed:
+                    self.previous_undeployed[node.node_uuid] = node.flavor
+                elif self.previous_undeployed.pop(node.node_uuid,
+                                                  None) is not None:
+                    self.pending_provisions[node.flavor] += 1
+            for node_uuid in removed:
+                self.previous_undeployed.pop(node_uuid, None)
+        super(ForecastingStrategy, self).apply_node_changes(added, changed,
+                                                            removed)
+
+    def observe_provisions(self, now):
+        """Fold the provisions counted since the last call into the rates."""
+        if self.last_observed is not None and now > self.last_observed:
+            flavor_names = set(flavor.name for flavor in self.current_flavors)
+            flavor_names.update(self.pending_provisions)
+            for flavor_name in flavor_names:
+                self.rates.observe(flavor_name,
+                                   self.pending_provisions[flavor_name],
+                                   self.last_observed, now)
+            self.pending_provisions.clear()
+        self.last_observed = now
+
+    def directives(self):
+        now = time.time()
+        self.observe_provisions(now)
+        self.forecast_time = now
+        if self.node_states is not None:
+            # Forecasts move with the time of day, so every flavor's target
+            # may have changed even if none of its nodes did.
+            self.dirty_flavors.update(self.node_states)
+        return super(ForecastingStrategy, self).directives()
+
+    def _num_nodes_needed(self, flavor_name, num_unprovisioned, num_cached):
+        expected = None
+        if self.forecast_time is not None:
+            expected = self.rates.expected_provisions(
+                flavor_name, self.forecast_time, self.lead_time)
+        if expected is None:
+            return super(ForecastingStrategy, self)._num_nodes_needed(
+                flavor_name, num_unprovisioned, num_cached)
+
+        target = min(num_unprovisioned, int(math.ceil(expected)))
+        LOG.debug("Expecting %(expected).2f provision(s) of flavor "
+                  "'%(flavor)s' in the next %(lead_time)d second(s).",
+                  {'expected': expected, 'flavor': flavor_name,
+                   'lead_time': self.lead_time})
+        return max(0, target - num_cached)
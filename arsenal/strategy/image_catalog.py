@@ -0,0 +1,175 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import json
+
+
+def empty_image_differences():
+    return {'new': set(), 'changed': set(), 'retired': set()}
+
+
+def image_content_key(image):
+    """The parts of an ImageInput that matter for caching.
+
+    Compared as is, rather than hashed, so that no two different images can
+    ever look the same.
+    """
+    return (image.uuid, image.checksum)
+
+
+def listing_fingerprint(raw_images):
+    """Fingerprint a raw image listing, such as the one Glance returns.
+
+    Two listings with the same fingerprint hold the same images with the
+    same attributes, so there is nothing to update.
+    """
+    serialized = json.dumps([dict(image) for image in raw_images],
+                            sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+class _CatalogEntry(object):
+    __slots__ = ('image', 'content_key', 'added_version',
+                 'changed_version')
+
+    def __init__(self, image, content_key, version):
+        self.image = image
+        self.content_key = content_key
+        self.added_version = version
+        self.changed_version = version
+
+
+class ImageCatalog(object):
+    """A versioned collection of ImageInput objects, indexed by name, UUID
+    and checksum.
+
+    Scouts update the catalog with each new image listing, and strategies
+    ask it what changed since the version they last saw, instead of diffing
+    plain lists of images. The version only moves forward when the listing
+    actually changes.
+
+    Iterating over the catalog yields its ImageInput objects, so it can be
+    used wherever a list of images is expected.
+    """
+
+    def __init__(self, images=None):
+        self.version = 0
+        self.fingerprint = None
+        self.by_name = {}
+        self.by_uuid = {}
+        self.by_checksum = {}
+        self._entries = {}
+        self._images = []
+        # Names of retired images, and the version they were retired in.
+        self._retired = {}
+        if images is not None:
+            self.update(images)
+
+    def __iter__(self):
+        return iter(self._images)
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, image_uuid):
+        return image_uuid in self.by_uuid
+
+    @property
+    def uuids(self):
+        return self.by_uuid.viewkeys()
+
+    def update(self, images, fingerprint=None):
+        """Replace the catalog's contents with a new image listing.
+
+        :param images: An iterable of ImageInput objects.
+        :param fingerprint: Optional fingerprint of the raw listing the images
+            came from, see listing_fingerprint. When it matches the previous
+            fingerprint, the listing is not examined at all.
+        :returns: A dictionary of 'new', 'changed' and 'retired' image name
+            sets, in the format of find_image_differences. An image is
+            'changed' when its UUID or checksum differs.
+        """
+        if fingerprint is not None and fingerprint == self.fingerprint:
+            return empty_image_differences()
+
+        images = list(images)
+        next_version = self.version + 1
+        differences = empty_image_differences()
+        entries = {}
+        for image in images:
+            content_key = image_content_key(image)
+            entry = self._entries.get(image.name)
+            if entry is None:
+                entry = _CatalogEntry(image, content_key, next_version)
+                self._retired.pop(image.name, None)
+                differences['new'].add(image.name)
+            elif entry.content_key != content_key:
+                entry.image = image
+                entry.content_key = content_key
+                entry.changed_version = next_version
+                differences['changed'].add(image.name)
+            else:
+                entry.image = image
+            entries[image.name] = entry
+
+        for name in self._entries:
+            if name not in entries:
+                self._retired[name] = next_version
+                differences['retired'].add(name)
+
+        self.fingerprint = fingerprint
+        self._entries = entries
+        self._images = images
+        if any(differences.values()):
+            self.version = next_version
+        self._rebuild_indexes()
+        return differences
+
+    def _rebuild_indexes(self):
+        self.by_name = {}
+        self.by_uuid = {}
+        self.by_checksum = {}
+        for image in self._images:
+            self.by_name[image.name] = image
+            self.by_uuid[image.uuid] = image
+            self.by_checksum.setdefault(image.checksum, []).append(image)
+
+    def changes_since(self, version):
+        """Return the images that changed after the given catalog version.
+
+        :param version: A version previously read from this catalog, or None
+            if the caller has never seen the catalog.
+        :returns: A dictionary in the format of find_image_differences.
+        """
+        if version is None:
+            return {'new': set(self._entries), 'changed': set(),
+                    'retired': set()}
+
+        differences = empty_image_differences()
+        if version >= self.version:
+            return differences
+
+        for name, entry in self._entries.iteritems():
+            if entry.added_version > version:
+                differences['new'].add(name)
+            elif entry.changed_version > version:
+                differences['changed'].add(name)
+        for name, retired_version in self._retired.iteritems():
+            if retired_version > version:
+                differences['retired'].add(name)
+        return differences
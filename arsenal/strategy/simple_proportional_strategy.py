@@ -17,14 +17,23 @@
 
 from __future__ import division
 
+import binascii
+import collections
+import hashlib
+import heapq
+import itertools
 import math
+from multiprocessing import pool as mp_pool
+import os
 import random
 
+import numpy as np
 from oslo_config import cfg
 from oslo_log import log
 
 from arsenal.common import exception
 from arsenal.strategy import base as sb
+from arsenal.strategy import image_catalog
 
 LOG = log.getLogger(__name__)
 
@@ -36,7 +45,22 @@ opts = [
                  help='The percentage of unprovisioned nodes in each flavor to'
                  'schedule for image caching. Expressed as a floating '
                  'point number between 0 and 1 inclusive, '
-                 'where 0 is 0%, 1 is 100%, and 0.5 is 50%.')
+                 'where 0 is 0%, 1 is 100%, and 0.5 is 50%.'),
+    cfg.StrOpt('parallel_mode',
+               default='serial',
+               choices=('serial', 'thread', 'process'),
+               help='How to compute caching directives for each flavor. '
+               "'serial' handles one flavor at a time, 'thread' and "
+               "'process' hand flavors to a pool of threads or processes."),
+    cfg.IntOpt('parallel_workers',
+               default=0,
+               help='Number of workers to use when parallel_mode is not '
+               "'serial'. 0 means one per CPU."),
+    cfg.IntOpt('random_seed',
+               help='Seed for choosing which nodes to cache images on. When '
+               'set, each flavor gets its own random generator derived '
+               'from the seed and the flavor name, so directives are '
+               'repeatable whatever the parallel_mode.'),
 ]
 
 sps_group = cfg.OptGroup(name='simple_proportional_strategy',
@@ -48,76 +72,131 @@ CONF.register_opts(opts, sps_group)
 
 
 def nodes_available_for_caching(nodes):
-    return filter(lambda node: node.can_cache(), nodes)
+    table = sb.NodeTable.from_nodes(nodes)
+    return table.select(table.available_mask())
 
 
 def cached_nodes(nodes):
-    return filter(lambda node: not node.provisioned and node.cached, nodes)
+    table = sb.NodeTable.from_nodes(nodes)
+    return table.select(table.cached_mask())
 
 
 def unprovisioned_nodes(nodes):
-    return filter(lambda node: not node.provisioned, nodes)
+    table = sb.NodeTable.from_nodes(nodes)
+    return table.select(table.unprovisioned_mask())
 
 
-def segregate_nodes(nodes, flavors):
-    """Segregate nodes by flavor."""
-    nodes_by_flavor = {}
+def segregate_node_indices(table, flavors):
+    """Segregate the rows of a NodeTable by flavor.
+
+    Returns a dictionary of flavor names to arrays of row indices.
+    """
+    indices_by_flavor = table.group_by_flavor()
+
+    flavor_indices = {}
     for flavor in flavors:
-        nodes_by_flavor[flavor.name] = []
+        flavor_indices[flavor.name] = indices_by_flavor.get(
+            flavor.name, np.empty(0, dtype=np.intp))
+
+    for flavor_name, indices in indices_by_flavor.iteritems():
+        if flavor_name not in flavor_indices:
+            LOG.error("%(count)d node(s) with unrecognized flavor "
+                      "'%(flavor)s' detected.",
+                      {'count': len(indices), 'flavor': flavor_name})
 
-    flavor_names = sb.build_attribute_set(flavors, 'name')
+    return flavor_indices
 
-    for node in nodes:
-        if node.flavor not in flavor_names:
-            LOG.error("Node '%(node)s'with unrecognized flavor '%(flavor)s "
-                      "detected. ", {'node': node.uuid, 'flavor': node.flavor})
-            next
-        nodes_by_flavor[node.flavor].append(node)
 
-    return nodes_by_flavor
+def segregate_nodes(nodes, flavors):
+    """Segregate nodes by flavor.
+
+    Returns a dictionary of flavor names to NodeTables.
+    """
+    table = sb.NodeTable.from_nodes(nodes)
+    return {flavor_name: table.select(indices)
+            for flavor_name, indices
+            in segregate_node_indices(table, flavors).iteritems()}
 
 
 def eject_nodes(nodes, image_uuids):
     """Check for cached nodes that have old or
     retired images. Eject them, and mark them as provisioned internally.
     """
-    ejections = []
-    for node in nodes:
-        if (not node.provisioned and
-                node.cached and
-                node.cached_image_uuid not in image_uuids):
-            ejections.append(sb.EjectNode(node.node_uuid))
-            # This marks the node internally so it can't be considered for
-            # caching immediately.
-            node.provisioned = True
-    return ejections
-
-
-def cache_nodes(nodes, num_nodes_needed, images):
-    available_nodes = nodes_available_for_caching(nodes)
+    table = sb.NodeTable.from_nodes(nodes)
+    valid_image_codes = [table.image_code(image_uuid)
+                         for image_uuid in image_uuids
+                         if table.image_code(image_uuid) is not None]
+    eject_mask = table.cached_mask() & ~np.in1d(table.images,
+                                                valid_image_codes)
+    # This marks the nodes internally so they can't be considered for
+    # caching immediately.
+    table.mark_provisioned(eject_mask)
+    return [sb.EjectNode(table.node_uuids[index])
+            for index in np.flatnonzero(eject_mask)]
+
+
+def cache_nodes(nodes, num_nodes_needed, images, rng=random, in_flight=None):
+    table = sb.NodeTable.from_nodes(nodes)
+    available_indices = np.flatnonzero(table.available_mask())
 
     # Choose the images to cache in advance, based on how many nodes we should
     # use for caching.
     chosen_images = sb.choose_weighted_images_forced_distribution(
-        num_nodes_needed, images, nodes)
+        num_nodes_needed, images, table)
+
+    if table.domain_names:
+        return [sb.CacheNode(node_uuid, image.uuid, image.checksum)
+                for node_uuid, image in _spread_table(table, available_indices,
+                                                      chosen_images, rng,
+                                                      in_flight)]
 
     # If we're not meeting or exceeding our proportion goal,
     # schedule (node, image) pairs to cache until we would meet
     # our proportion goal.
     nodes_to_cache = []
-    random.shuffle(available_nodes)
-    for n in range(0, num_nodes_needed):
-        node = available_nodes.pop()
+    for index in sb.sample_nodes(available_indices, num_nodes_needed, rng):
         image = chosen_images.pop()
-        nodes_to_cache.append(sb.CacheNode(node.node_uuid,
+        nodes_to_cache.append(sb.CacheNode(table.node_uuids[index],
                                            image.uuid,
                                            image.checksum))
     return nodes_to_cache
 
 
+def _spread_table(table, available_indices, chosen_images, rng,
+                  in_flight=None):
+    """Place chosen_images on a NodeTable's nodes with topology domains."""
+    candidates = [(table.node_uuids[index], table.domain_name(index))
+                  for index in available_indices]
+    copies = collections.Counter()
+    images = table.images
+    for index in np.flatnonzero(table.cached_mask()):
+        if images[index] != sb.NO_IMAGE:
+            copies[(table.image_uuids[images[index]],
+                    table.domain_name(index))] += 1
+    return sb.spread_across_domains(
+        candidates, chosen_images, copies,
+        CONF.strategy.max_caching_per_domain, rng, in_flight)
+
+
+def caching_by_domain(nodes):
+    """Count the nodes caching an image in each topology domain.
+
+    Nodes without a domain are left out.
+    """
+    table = sb.NodeTable.from_nodes(nodes)
+    domains = table.domains[table.caching & ~table.provisioned]
+    counts = np.bincount(domains[domains != sb.NO_DOMAIN],
+                         minlength=len(table.domain_names))
+    return collections.Counter({table.domain_names[code]: int(counts[code])
+                                for code in np.flatnonzero(counts)})
+
+
 def how_many_nodes_should_cache(nodes, percentage_to_cache):
-    should_cache = int(math.floor(percentage_to_cache * len(
-        unprovisioned_nodes(nodes)))) - len(cached_nodes(nodes))
+    table = sb.NodeTable.from_nodes(nodes)
+    num_unprovisioned = int(np.count_nonzero(table.unprovisioned_mask()))
+    num_cached = int(np.count_nonzero(table.cached_mask()))
+    should_cache = int(math.floor(
+        percentage_to_cache * num_unprovisioned)) - num_cached
     if should_cache < 0:
         should_cache = 0
     LOG.debug("Should cache %(should_cache)d node(s), based on number "
@@ -125,19 +204,266 @@ def how_many_nodes_should_cache(nodes, percentage_to_cache):
               "nodes %(cached)d, and the percentage of unprovisioned nodes "
               "to cache: %(to_cache_percentage)f",
               {'should_cache': should_cache,
-               'unpro': len(unprovisioned_nodes(nodes)),
-               'cached': len(cached_nodes(nodes)),
+               'unpro': num_unprovisioned,
+               'cached': num_cached,
                'to_cache_percentage': percentage_to_cache})
     return should_cache
 
 
+def rebalance_ejections(images, image_distribution, target_cached,
+                        nodes_by_image, max_ejections, rng=random):
+    """Pick cached nodes to eject so the cache can reach the weighted image
+    distribution once it holds target_cached nodes.
+
+    Only the copies in excess of each image's share are ejected, see
+    excess_cached_images, which is the fewest ejections any plan can make.
+    The missing copies of under-cached images are then cached onto free
+    nodes, one cache operation each, which is also the fewest possible, so
+    the plan as a whole takes the fewest operations. At most max_ejections
+    nodes are picked, always from the image with the most excess copies
+    left, leaving the rest of the rebalance to later cycles.
+
+    nodes_by_image maps image UUIDs to sequences of the cached nodes holding
+    them. Returns the UUIDs of the nodes to eject.
+    """
+    if max_ejections <= 0 or target_cached <= 0:
+        return []
+    excess = sb.excess_cached_images(images, image_distribution,
+                                     target_cached)
+    node_uuids = []
+    for image_uuid in sorted(excess, key=lambda uuid: (-excess[uuid], uuid)):
+        excess[image_uuid] = sb.sample_nodes(
+            nodes_by_image.get(image_uuid, ()), excess[image_uuid], rng)
+    heap = [(-len(nodes), image_uuid)
+            for image_uuid, nodes in excess.iteritems() if nodes]
+    heapq.heapify(heap)
+    while heap and len(node_uuids) < max_ejections:
+        count, image_uuid = heapq.heappop(heap)
+        node_uuids.append(excess[image_uuid].pop())
+        if count < -1:
+            heapq.heappush(heap, (count + 1, image_uuid))
+    return node_uuids
+
+
+class RebalanceBudget(object):
+    """How many more ejections and cache operations rebalancing may plan in
+    a cycle. None means no limit.
+    """
+
+    def __init__(self, ejections=None, caches=None):
+        self.ejections = ejections
+        self.caches = caches
+
+    def ejections_allowed(self, max_ejections, caches_needed):
+        """How many nodes a flavor may eject to rebalance, given the cache
+        operations it needs anyway. Every node ejected needs a cache
+        operation to refill its place, so ejections never outnumber the
+        cache operations left once the flavor's own needs are met.
+        """
+        allowed = max_ejections
+        if self.ejections is not None:
+            allowed = min(allowed, self.ejections)
+        if self.caches is not None:
+            allowed = min(allowed, self.caches - caches_needed)
+        return max(0, allowed)
+
+    def caches_allowed(self, caches_needed):
+        """How many of the cache operations a flavor needs may be planned."""
+        if self.caches is None:
+            return caches_needed
+        return min(caches_needed, self.caches)
+
+    def spend(self, ejections=0, caches=0):
+        if self.ejections is not None:
+            self.ejections = max(0, self.ejections - ejections)
+        if self.caches is not None:
+            self.caches = max(0, self.caches - caches)
+
+
+def flavor_random(seed, flavor_name):
+    """Return a random generator for a flavor, or the random module if no
+    seed was given.
+    """
+    if seed is None:
+        return random
+    digest = hashlib.md5('%s:%s' % (seed, flavor_name)).hexdigest()
+    return random.Random(int(digest, 16))
+
+
+def flavor_directives(flavor_name, flavor_nodes, num_nodes_needed, images,
+                      seed=None, in_flight=None):
+    """Return the caching directives for the nodes of a single flavor.
+
+    in_flight counts the nodes caching in each topology domain, see
+    spread_across_domains.
+    """
+    LOG.debug("Need to cache %(needed)d node(s) for flavor "
+              "'%(flavor)s'.",
+              {'needed': num_nodes_needed, 'flavor': flavor_name})
+    return cache_nodes(flavor_nodes, num_nodes_needed, images,
+                       flavor_random(seed, flavor_name), in_flight)
+
+
+def _flavor_directives_star(args):
+    return flavor_directives(*args)
+
+
+def make_flavor_pool(mode, workers=0):
+    """Create a pool of threads or processes for map_flavor_directives.
+
+    workers - the number of workers, or 0 for one per CPU.
+    """
+    workers = workers or mp_pool.cpu_count()
+    if mode == 'process':
+        return mp_pool.Pool(workers)
+    return mp_pool.ThreadPool(workers)
+
+
+def map_flavor_directives(work, mode='serial', workers=0, pool=None):
+    """Run flavor_directives over a list of argument tuples.
+
+    pool - a pool made by make_flavor_pool for mode, to use instead of
+        creating one for this call.
+
+    Results come back in the order of work, whichever mode is used.
+    """
+    if mode == 'serial' or len(work) < 2:
+        return map(_flavor_directives_star, work)
+    if pool is not None:
+        return pool.map(_flavor_directives_star, work)
+
+    pool = make_flavor_pool(mode, min(workers or mp_pool.cpu_count(),
+                                      len(work)))
+    try:
+        return pool.map(_flavor_directives_star, work)
+    finally:
+        pool.close()
+        pool.join()
+
+
 class InvalidPercentageError(exception.ArsenalException):
     msg_fmt = ("An invalid percentage was specified. Percentages should be "
                "less than or equal to 1, and greater than or equal to 0. "
                "Got '%(percentage)f'.")
 
 
-class SimpleProportionalStrategy(object):
+class IndexedNodeSet(collections.Sequence):
+    """A set of node UUIDs which can also be indexed, so sample_nodes draws
+    from it in O(k).
+
+    Removal swaps the last node into the removed node's place, so order is
+    not preserved, but it only depends on the order of additions and
+    removals, which keeps seeded runs reproducible.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __getitem__(self, index):
+        return self.nodes[index]
+
+    def __contains__(self, node_uuid):
+        return node_uuid in self.positions
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def add(self, node_uuid):
+        if node_uuid not in self.positions:
+            self.positions[node_uuid] = len(self.nodes)
+            self.nodes.append(node_uuid)
+
+    def discard(self, node_uuid):
+        position = self.positions.pop(node_uuid, None)
+        if position is None:
+            return
+        last = self.nodes.pop()
+        if position < len(self.nodes):
+            self.nodes[position] = last
+            self.positions[last] = position
+
+
+class FlavorCacheState(object):
+    """Running counters for the nodes of a single flavor.
+
+    Kept by SimpleProportionalStrategy once it receives incremental node
+    changes, so that directives can be computed without revisiting every node.
+    Nodes are tracked by UUID along with the (provisioned, cached, image UUID,
+    domain) state they were added with. Available and cached nodes are kept
+    in IndexedNodeSets, overall and by topology domain or image, and cached
+    copies of each image are counted per domain, so planning costs follow the
+    number of nodes picked rather than the size of the flavor.
+    """
+
+    def __init__(self):
+        self.node_flags = {}
+        self.unprovisioned = 0
+        self.cached = 0
+        self.available = IndexedNodeSet()
+        self.available_by_domain = {}
+        self.cached_by_image = {}
+        # (image UUID, domain) pairs to the number of nodes cached with the
+        # image in the domain.
+        self.copies = collections.Counter()
+
+    def __len__(self):
+        return len(self.node_flags)
+
+    def add(self, node_uuid, provisioned, cached, image_uuid, domain=None):
+        self.node_flags[node_uuid] = (provisioned, cached, image_uuid, domain)
+        if provisioned:
+            return
+        self.unprovisioned += 1
+        if cached:
+            self.cached += 1
+            image_nodes = self.cached_by_image.get(image_uuid)
+            if image_nodes is None:
+                image_nodes = self.cached_by_image[image_uuid] = (
+                    IndexedNodeSet())
+            image_nodes.add(node_uuid)
+            self.copies[(image_uuid, domain)] += 1
+        else:
+            self.available.add(node_uuid)
+            domain_nodes = self.available_by_domain.get(domain)
+            if domain_nodes is None:
+                domain_nodes = self.available_by_domain[domain] = (
+                    IndexedNodeSet())
+            domain_nodes.add(node_uuid)
+
+    def remove(self, node_uuid):
+        provisioned, cached, image_uuid, domain = self.node_flags.pop(
+            node_uuid)
+        if provisioned:
+            return
+        self.unprovisioned -= 1
+        if cached:
+            self.cached -= 1
+            image_nodes = self.cached_by_image[image_uuid]
+            image_nodes.discard(node_uuid)
+            if not image_nodes:
+                del self.cached_by_image[image_uuid]
+            self.copies[(image_uuid, domain)] -= 1
+            if not self.copies[(image_uuid, domain)]:
+                del self.copies[(image_uuid, domain)]
+        else:
+            self.available.discard(node_uuid)
+            domain_nodes = self.available_by_domain[domain]
+            domain_nodes.discard(node_uuid)
+            if not domain_nodes:
+                del self.available_by_domain[domain]
+
+    def image_distribution(self):
+        """Return a dict of image UUID to the number of cached nodes."""
+        return {image_uuid: len(node_uuids)
+                for image_uuid, node_uuids in self.cached_by_image.iteritems()
+                if image_uuid is not None}
+
+
+class SimpleProportionalStrategy(sb.CachingStrategy):
     def __init__(self):
         percentage_to_cache = (
             CONF.simple_proportional_strategy.percentage_to_cache)
@@ -151,9 +477,25 @@ class SimpleProportionalStrategy(object):
         self.percentage_to_cache = percentage_to_cache
         self.current_flavors = []
         self.current_images = []
+        self.current_image_uuids = set()
+        # Last version seen of a shared ImageCatalog, if images come in one.
+        self.image_catalog_version = None
         self.current_nodes = []
-
-    def update_current_state(self, nodes, images, flavors):
+        # Incremental state, built on the first call to apply_node_changes.
+        self.node_states = None
+        self.node_flavors = None
+        # Topology domains of the nodes which have one.
+        self.node_domains = None
+        # UUIDs of the unprovisioned nodes still pulling an image.
+        self.caching_nodes = None
+        self.dirty_flavors = set()
+        # Pool for parallel_mode, kept across cycles, and the (mode,
+        # workers) it was made for.
+        self.flavor_pool = None
+        self.flavor_pool_config = None
+
+    def update_image_and_flavor_state(self, images, flavors):
+        """Update the images and flavors the strategy works with."""
         # For now, flavors should remain static.
         # In the future we'll handle changing flavor profiles if needed,
         # but it seems unlikely that flavors will change often enough.
@@ -164,23 +506,144 @@ class SimpleProportionalStrategy(object):
 
         # Image differences are important because changed or retired
         # images should be ejected from the cache.
-        self.image_diff = sb.find_image_differences(self.current_images,
-                                                    images)
+        if isinstance(images, image_catalog.ImageCatalog):
+            # The catalog is shared with the scout and updated in place, so
+            # ask it what changed rather than comparing it against itself.
+            self.image_diff = images.changes_since(self.image_catalog_version)
+            self.image_catalog_version = images.version
+            self.current_image_uuids = images.uuids
+        else:
+            self.image_diff = sb.find_image_differences(self.current_images,
+                                                        images)
+            self.image_catalog_version = None
+            self.current_image_uuids = sb.build_attribute_set(images, 'uuid')
         sb.log_image_differences(self.image_diff)
         self.current_images = images
-        self.current_image_uuids = sb.build_attribute_set(images, 'uuid')
+
+        if self.node_states is not None and (
+                any(self.flavor_diff.values()) or
+                any(self.image_diff.values())):
+            self.dirty_flavors.update(self.node_states)
+
+    def update_current_state(self, nodes, images, flavors):
+        self.update_image_and_flavor_state(images, flavors)
 
         # We don't compare old node state versus new, because that would be
         # a relatively large and complicated task. Instead, we only rely on
         # the current state of nodes to inform ourselves whether we're meeting
         # our stated goals or not.
-        self.current_nodes = nodes
+        self.current_nodes = sb.NodeTable.from_nodes(nodes)
+        # A full set of nodes replaces any incremental state.
+        self.node_states = None
+        self.node_flavors = None
+        self.node_domains = None
+        self.caching_nodes = None
+        self.dirty_flavors = set()
+
+    def _add_node_state(self, node_uuid, flavor, provisioned, cached,
+                        image_uuid, domain=None, caching=False):
+        self.node_flavors[node_uuid] = flavor
+        if domain is not None:
+            self.node_domains[node_uuid] = domain
+        if caching and not provisioned:
+            self.caching_nodes.add(node_uuid)
+        state = self.node_states.get(flavor)
+        if state is None:
+            state = self.node_states[flavor] = FlavorCacheState()
+        state.add(node_uuid, provisioned, cached, image_uuid, domain)
+        self.dirty_flavors.add(flavor)
+
+    def _remove_node_state(self, node_uuid):
+        flavor = self.node_flavors.pop(node_uuid, None)
+        if flavor is None:
+            return
+        self.node_domains.pop(node_uuid, None)
+        self.caching_nodes.discard(node_uuid)
+        self.node_states[flavor].remove(node_uuid)
+        self.dirty_flavors.add(flavor)
+
+    def _replace_node_state(self, node_uuid, provisioned, cached, image_uuid,
+                            caching=False):
+        """Change the state of a known node, keeping its flavor and domain.
+        """
+        flavor = self.node_flavors[node_uuid]
+        domain = self.node_domains.get(node_uuid)
+        self._remove_node_state(node_uuid)
+        self._add_node_state(node_uuid, flavor, provisioned, cached,
+                             image_uuid, domain, caching)
+
+    def _build_node_states(self):
+        self.node_states = {}
+        self.node_flavors = {}
+        self.node_domains = {}
+        self.caching_nodes = set()
+        table = sb.NodeTable.from_nodes(self.current_nodes)
+        flavor_codes = table.flavors.tolist()
+        provisioned = table.provisioned.tolist()
+        cached = table.cached.tolist()
+        caching = table.caching.tolist()
+        image_codes = table.images.tolist()
+        domain_codes = table.domains.tolist()
+        for index, node_uuid in enumerate(table.node_uuids):
+            image_code = image_codes[index]
+            domain_code = domain_codes[index]
+            self._add_node_state(
+                node_uuid,
+                table.flavor_names[flavor_codes[index]],
+                provisioned[index],
+                cached[index],
+                (table.image_uuids[image_code]
+                 if image_code != sb.NO_IMAGE else None),
+                (table.domain_names[domain_code]
+                 if domain_code != sb.NO_DOMAIN else None),
+                caching[index])
+
+    def apply_node_changes(self, added=(), changed=(), removed=()):
+        """Incrementally update the strategy's view of nodes.
+
+        The first call builds per-flavor counters from the nodes last passed
+        to update_current_state. After that, directives only recomputes the
+        flavors touched by changes since it was last called, so the cost of a
+        cycle follows the number of changes rather than the fleet size.
+
+        :param added: NodeInput objects for nodes not seen before.
+        :param changed: NodeInput objects with the new state of known nodes.
+        :param removed: UUIDs of nodes which no longer exist.
+        """
+        if self.node_states is None:
+            self._build_node_states()
+
+        for node in itertools.chain(added, changed):
+            self._remove_node_state(node.node_uuid)
+            self._add_node_state(node.node_uuid, node.flavor,
+                                 node.provisioned, node.cached,
+                                 node.cached_image_uuid, node.domain,
+                                 node.caching)
+
+        for node_uuid in removed:
+            self._remove_node_state(node_uuid)
+
+    def _num_nodes_needed(self, flavor_name, num_unprovisioned, num_cached):
+        """How many more nodes of a flavor should be cached."""
+        return max(0, int(math.floor(
+            self.percentage_to_cache * num_unprovisioned)) - num_cached)
+
+    def _flavor_nodes_needed(self, flavor_name, flavor_nodes):
+        return self._num_nodes_needed(
+            flavor_name,
+            int(np.count_nonzero(flavor_nodes.unprovisioned_mask())),
+            int(np.count_nonzero(flavor_nodes.cached_mask())))
+
+    def _num_nodes(self):
+        if self.node_states is not None:
+            return len(self.node_flavors)
+        return len(self.current_nodes)
 
     def directives(self):
         """Return a list actions that should be taken by Arsenal in order to
         fulfill the strategy implemented by this object. Bases
         decision-making on data made available to it by Arsenal through
-        update_current_state.
+        update_current_state and apply_node_changes.
         """
         if len(self.current_images) == 0:
             LOG.warning("No images to cache! Are you sure Arsenal is talking "
@@ -192,11 +655,23 @@ class SimpleProportionalStrategy(object):
                         "to Nova properly? No directives issued.")
             return []
 
-        if len(self.current_nodes) == 0:
+        if self._num_nodes() == 0:
             LOG.warning("No nodes detected! Are you sure Arsenal is talking "
                         "to Ironic properly? No directives issued.")
             return []
 
+        self.rebalance_budget = RebalanceBudget(self.eject_budget,
+                                                self.cache_budget)
+        if self.node_states is not None:
+            todo = self._incremental_directives()
+        else:
+            todo = self._full_directives()
+
+        LOG.debug("Issuing %(num)d directives(s).", {'num': len(todo)})
+
+        return todo
+
+    def _full_directives(self):
         todo = []
 
         # Eject nodes.
@@ -204,21 +679,239 @@ class SimpleProportionalStrategy(object):
             eject_nodes(
                 self.current_nodes,
                 map(lambda image: image.uuid, self.current_images)))
+        self.rebalance_budget.spend(ejections=len(todo))
 
         # Once bad cached nodes have been ejected, determine the proportion
         # of truly 'good' cached nodes.
-        nodes_by_flavor = segregate_nodes(self.current_nodes,
-                                          self.current_flavors)
-        for flavor_name, flavor_nodes in nodes_by_flavor.iteritems():
-            num_nodes_needed = how_many_nodes_should_cache(
-                flavor_nodes, self.percentage_to_cache)
-            LOG.debug("Need to cache %(needed)d node(s) for flavor "
-                      "'%(flavor)s'.",
-                      {'needed': num_nodes_needed, 'flavor': flavor_name})
-            nodes_to_cache = cache_nodes(flavor_nodes, num_nodes_needed,
-                                         self.current_images)
+        ejections, nodes_by_flavor, nodes_needed = self._rebalance_tables()
+        todo.extend(ejections)
+
+        # Flavors are independent of each other, so they can be handed out
+        # to a pool. Merging in flavor name order keeps the result the same
+        # as the serial path.
+        images = list(self.current_images)
+        seed = CONF.simple_proportional_strategy.random_seed
+        mode = CONF.simple_proportional_strategy.parallel_mode
+        in_flight = self._caching_in_flight()
+        if in_flight is not None:
+            # Flavors share the per-domain limit, so they take turns.
+            mode = 'serial'
+        work = []
+        for flavor_name in sorted(nodes_by_flavor):
+            flavor_seed = seed
+            if flavor_seed is None and mode == 'process':
+                # Forked workers all start from the same random state, so
+                # each flavor gets a generator of its own instead.
+                flavor_seed = int(binascii.hexlify(os.urandom(8)), 16)
+            work.append((flavor_name, nodes_by_flavor[flavor_name],
+                         nodes_needed[flavor_name], images, flavor_seed,
+                         in_flight))
+        workers = CONF.simple_proportional_strategy.parallel_workers
+        pool = None
+        if mode != 'serial' and len(work) > 1:
+            pool = self._flavor_pool(mode, workers)
+        for nodes_to_cache in map_flavor_directives(work, mode, workers,
+                                                    pool):
             todo.extend(nodes_to_cache)
 
-        LOG.debug("Issuing %(num)d directives(s).", {'num': len(todo)})
+        return todo
+
+    def _flavor_pool(self, mode, workers):
+        """Return the pool for parallel_mode, creating it on first use and
+        again only if the mode or number of workers changes.
+        """
+        if self.flavor_pool_config != (mode, workers):
+            self.close()
+            self.flavor_pool = make_flavor_pool(mode, workers)
+            self.flavor_pool_config = (mode, workers)
+        return self.flavor_pool
+
+    def close(self):
+        """Shut down the strategy's pool of workers, if it has one."""
+        if self.flavor_pool is not None:
+            self.flavor_pool.close()
+            self.flavor_pool.join()
+            self.flavor_pool = None
+            self.flavor_pool_config = None
+
+    def _eject_retired_images(self, state):
+        """Eject the nodes of a flavor cached with old or retired images,
+        counting them as provisioned from now on.
+
+        No more nodes are ejected than the directive budget allows. Returns
+        the ejections, and whether any such nodes were left for later.
+        """
+        allowed = self.rebalance_budget.ejections
+        ejections = []
+        for image_uuid in list(state.cached_by_image):
+            if image_uuid in self.current_image_uuids:
+                continue
+            for node_uuid in list(state.cached_by_image[image_uuid]):
+                if allowed is not None and len(ejections) >= allowed:
+                    self.rebalance_budget.spend(ejections=len(ejections))
+                    return ejections, True
+                ejections.append(sb.EjectNode(node_uuid))
+                self._replace_node_state(node_uuid, True, True, image_uuid)
+        self.rebalance_budget.spend(ejections=len(ejections))
+        return ejections, False
+
+    def _caching_in_flight(self):
+        """Count the nodes caching in each topology domain, across all
+        flavors, or return None if caching is not limited per domain.
+        """
+        if not CONF.strategy.max_caching_per_domain:
+            return None
+        if self.node_states is None:
+            return caching_by_domain(self.current_nodes)
+        return collections.Counter(
+            self.node_domains[node_uuid] for node_uuid in self.caching_nodes
+            if node_uuid in self.node_domains)
+
+    def _spread_flavor(self, state, chosen_images, rng, in_flight=None):
+        """Place chosen_images on a flavor's nodes across topology domains."""
+        return sb.spread_across_domain_pools(
+            state.available_by_domain, chosen_images, state.copies,
+            CONF.strategy.max_caching_per_domain, rng, in_flight)
+
+    def _rebalance_ejections_allowed(self, num_needed):
+        """How many nodes a flavor needing num_needed more cached nodes may
+        eject to rebalance this cycle.
+        """
+        return self.rebalance_budget.ejections_allowed(
+            CONF.strategy.rebalance_ejections_per_cycle, num_needed)
+
+    def _rebalance_tables(self):
+        """Eject over-cached images from each flavor of current_nodes,
+        marking the ejected nodes as provisioned in current_nodes itself.
 
+        Returns the ejections, a dictionary of flavor names to NodeTables of
+        their nodes, selected once the ejections are marked, and a
+        dictionary of flavor names to the number of nodes to cache,
+        including one refill per node ejected.
+        """
+        seed = CONF.simple_proportional_strategy.random_seed
+        current_nodes = sb.NodeTable.from_nodes(self.current_nodes)
+        indices_by_flavor = segregate_node_indices(current_nodes,
+                                                   self.current_flavors)
+        ejections = []
+        nodes_needed = {}
+        for flavor_name in sorted(indices_by_flavor):
+            flavor_indices = indices_by_flavor[flavor_name]
+            table = current_nodes.select(flavor_indices)
+            num_needed = self._flavor_nodes_needed(flavor_name, table)
+            max_ejections = self._rebalance_ejections_allowed(num_needed)
+            indices = []
+            if max_ejections > 0:
+                cached_indices = np.flatnonzero(table.cached_mask())
+                nodes_by_image = collections.defaultdict(list)
+                for index in cached_indices:
+                    image_code = table.images[index]
+                    if image_code != sb.NO_IMAGE:
+                        nodes_by_image[table.image_uuids[image_code]].append(
+                            index)
+                indices = rebalance_ejections(
+                    self.current_images, table.image_distribution(),
+                    len(cached_indices) + num_needed, nodes_by_image,
+                    max_ejections, flavor_random(seed, flavor_name))
+                current_nodes.mark_provisioned(
+                    flavor_indices[np.array(indices, dtype=np.intp)])
+                ejections.extend(sb.EjectNode(table.node_uuids[index])
+                                 for index in indices)
+            nodes_needed[flavor_name] = self.rebalance_budget.caches_allowed(
+                num_needed + len(indices))
+            self.rebalance_budget.spend(len(indices),
+                                        nodes_needed[flavor_name])
+        if ejections:
+            LOG.info("Ejecting %(num)d node(s) to rebalance cached images.",
+                     {'num': len(ejections)})
+        nodes_by_flavor = {flavor_name: current_nodes.select(indices)
+                           for flavor_name, indices
+                           in indices_by_flavor.iteritems()}
+        return ejections, nodes_by_flavor, nodes_needed
+
+    def _rebalance_state(self, flavor_name, state, rng):
+        """Eject over-cached images from a flavor's incremental state.
+
+        Returns the ejections, the number of nodes to cache, including one
+        refill per node ejected, and whether the directive budget cut that
+        number short.
+        """
+        num_needed = self._num_nodes_needed(flavor_name, state.unprovisioned,
+                                            state.cached)
+        max_ejections = self._rebalance_ejections_allowed(num_needed)
+        ejections = []
+        if max_ejections > 0:
+            nodes_by_image = {image_uuid: node_uuids
+                              for image_uuid, node_uuids
+                              in state.cached_by_image.iteritems()
+                              if image_uuid is not None}
+            for node_uuid in rebalance_ejections(
+                    self.current_images, state.image_distribution(),
+                    state.cached + num_needed, nodes_by_image,
+                    max_ejections, rng):
+                image_uuid = state.node_flags[node_uuid][2]
+                ejections.append(sb.EjectNode(node_uuid))
+                self._replace_node_state(node_uuid, True, True, image_uuid)
+        num_needed += len(ejections)
+        num_planned = self.rebalance_budget.caches_allowed(num_needed)
+        self.rebalance_budget.spend(len(ejections), num_planned)
+        return ejections, num_planned, num_planned < num_needed
+
+    def _incremental_directives(self):
+        """Compute directives for the flavors touched since the last call.
+
+        Issued directives are applied to the counters right away: ejected
+        nodes count as provisioned, and nodes told to cache an image count as
+        cached with it, until a later change reports otherwise. Planning stops
+        at the directive budget, so the counters never reflect directives the
+        scheduler would drop; flavors cut short are revisited next cycle.
+        """
+        todo = []
+        unmet = set()
+        flavor_names = sb.build_attribute_set(self.current_flavors, 'name')
+        seed = CONF.simple_proportional_strategy.random_seed
+        in_flight = self._caching_in_flight()
+
+        for flavor_name in sorted(self.dirty_flavors):
+            state = self.node_states.get(flavor_name)
+            if state is None:
+                continue
+
+            retired, deferred = self._eject_retired_images(state)
+            todo.extend(retired)
+            if deferred:
+                unmet.add(flavor_name)
+
+            if flavor_name not in flavor_names:
+                continue
+
+            rng = flavor_random(seed, flavor_name)
+            ejections, num_nodes_needed, deferred = self._rebalance_state(
+                flavor_name, state, rng)
+            todo.extend(ejections)
+            if deferred:
+                unmet.add(flavor_name)
+            LOG.debug("Need to cache %(needed)d node(s) for flavor "
+                      "'%(flavor)s'.",
+                      {'needed': num_nodes_needed, 'flavor': flavor_name})
+            if num_nodes_needed == 0:
+                continue
+
+            chosen_images = sb.choose_weighted_images_for_distribution(
+                num_nodes_needed, self.current_images,
+                state.image_distribution(), state.cached)
+            if self.node_domains:
+                placements = self._spread_flavor(state, chosen_images, rng,
+                                                 in_flight)
+            else:
+                placements = zip(sb.sample_nodes(state.available,
+                                                 num_nodes_needed, rng),
+                                 chosen_images)
+            for node_uuid, image in placements:
+                todo.append(sb.CacheNode(node_uuid, image.uuid,
+                                         image.checksum))
+                self._replace_node_state(node_uuid, False, True, image.uuid,
+                                         caching=True)
+
+        self.dirty_flavors = unmet
         return todo
@@ -100,6 +100,21 @@ class RateLimiterTestCase(test_base.TestCase):
         self.assertEqual(0, len(rl_obj))
         self.assertEqual(5, rl_obj.current_count)
 
+    @mock.patch('arsenal.common.rate_limiter.now')
+    def test_remaining(self, now_mock):
+        now_mock.return_value = START_DATETIME
+        rl_obj = rate_limiter.RateLimiter(3, 5)
+        self.assertEqual(3, rl_obj.remaining())
+        rl_obj.add_items(range(0, 2))
+        rl_obj.withdraw_items()
+        self.assertEqual(1, rl_obj.remaining())
+        rl_obj.add_items(range(0, 2))
+        rl_obj.withdraw_items()
+        self.assertEqual(0, rl_obj.remaining())
+
+        now_mock.return_value = START_DATETIME + FIVE_SECONDS
+        self.assertEqual(3, rl_obj.remaining())
+
     def test_init_arguments(self):
         # Test some cases that should raise
         self.assertRaises(TypeError, rate_limiter.RateLimiter, 10, "dog")
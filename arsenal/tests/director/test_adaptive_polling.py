@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from arsenal.director import adaptive_polling
+from arsenal.strategy import base as sb
+from arsenal.tests import base
+
+
+class TestAdaptiveInterval(base.TestCase):
+
+    def test_backs_off_and_speeds_up_within_bounds(self):
+        interval = adaptive_polling.AdaptiveInterval(30, 600)
+        self.assertEqual(30, interval.interval)
+        self.assertEqual([60, 120, 240, 480, 600, 600],
+                         [interval.update(0) for i in range(6)])
+        self.assertEqual(300, interval.update(1))
+        self.assertEqual(30, interval.update(50))
+
+    def test_due(self):
+        interval = adaptive_polling.AdaptiveInterval(30, 600)
+        self.assertTrue(interval.due('nodes', 100))
+        interval.polled('nodes', 100)
+        self.assertFalse(interval.due('nodes', 129))
+        self.assertTrue(interval.due('nodes', 130))
+        self.assertTrue(interval.due('images', 129))
+
+
+class TestNodeStates(base.TestCase):
+
+    def nodes(self, **overrides):
+        nodes = []
+        for node_uuid in ('node-a', 'node-b', 'node-c'):
+            state = overrides.get(node_uuid, (False, False, None))
+            if state is not None:
+                nodes.append(sb.NodeInput(node_uuid, 'flavor', *state))
+        return nodes
+
+    def count_changes(self, before, after):
+        return adaptive_polling.count_changes(
+            adaptive_polling.NodeStates(before),
+            adaptive_polling.NodeStates(after))
+
+    def test_same_nodes(self):
+        self.assertEqual(0, self.count_changes(self.nodes(), self.nodes()))
+        self.assertEqual(2, self.count_changes(
+            self.nodes(),
+            self.nodes(**{'node-a': (True, False, None),
+                          'node-c': (False, True, 'image')})))
+        self.assertEqual(1, self.count_changes(
+            self.nodes(**{'node-b': (False, True, 'image-1')}),
+            self.nodes(**{'node-b': (False, True, 'image-2')})))
+
+    def test_added_and_removed_nodes(self):
+        self.assertEqual(1, self.count_changes(
+            self.nodes(), self.nodes(**{'node-b': None})))
+        self.assertEqual(2, self.count_changes(
+            self.nodes(**{'node-b': None}),
+            list(reversed(self.nodes(**{'node-a': (True, False, None)})))))
+
+    def test_flavor_and_image_changes(self):
+        flavors = [sb.FlavorInput('flavor-1', None)]
+        self.assertEqual(2, adaptive_polling.count_changes(
+            adaptive_polling.flavor_states(flavors),
+            adaptive_polling.flavor_states(
+                [sb.FlavorInput('flavor-2', None)])))
+        images = [sb.ImageInput('image', 'uuid', 'checksum-1')]
+        self.assertEqual(2, adaptive_polling.count_changes(
+            adaptive_polling.image_states(images),
+            adaptive_polling.image_states(
+                [sb.ImageInput('image', 'uuid', 'checksum-2')])))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from arsenal.director import flavor_classifier
+import arsenal.director.onmetal_scout as onmetal
+from arsenal.tests import base
+from arsenal.tests.external import ironic_utils
+
+
+def node(memory_mb, cpus=None, local_gb=None):
+    return ironic_utils.get_test_node(properties={'memory_mb': memory_mb,
+                                                  'cpus': cpus,
+                                                  'local_gb': local_gb})
+
+
+class FakeFlavor(object):
+    def __init__(self, id, ram):
+        self.id = id
+        self.ram = ram
+
+
+class TestFlavorClassifier(base.TestCase):
+
+    def setUp(self):
+        super(TestFlavorClassifier, self).setUp()
+        self.classifier = flavor_classifier.FlavorClassifier()
+        self.classifier.add('small', 1024)
+        self.classifier.add('small-fast', 1024, 8, 32)
+        self.classifier.add('large', 4096, 16, 64)
+
+    def test_exact_match_wins_over_ram(self):
+        self.assertEqual('small-fast',
+                         self.classifier.classify_node(node(1024, 8, 32)))
+        self.assertEqual('small',
+                         self.classifier.classify_node(node(1024, 4, 32)))
+
+    def test_falls_back_to_ram(self):
+        self.assertEqual('large', self.classifier.classify_node(node(4096)))
+        self.assertIsNone(self.classifier.classify_node(node(2048)))
+        self.assertIsNone(self.classifier.classify_node(
+            ironic_utils.get_test_node()))
+
+    def test_classify_batch(self):
+        nodes = [node(4096), node(1024, 8, 32), node(2048), node(4096)]
+        self.assertEqual(['large', 'small-fast', None, 'large'],
+                         self.classifier.classify(nodes))
+
+    def test_first_flavor_keeps_conflicting_key(self):
+        self.classifier.add('other-large', 4096, 16, 64)
+        self.assertEqual('large', self.classifier.classify_node(node(4096)))
+        self.assertEqual(3, len(self.classifier))
+
+    def test_matcher(self):
+        is_large = self.classifier.matcher('large')
+        self.assertTrue(is_large(node(4096)))
+        self.assertFalse(is_large(node(1024)))
+
+    def test_unknown_flavors_are_told_apart(self):
+        # Every unknown flavor used to be matched against the RAM of the
+        # last one seen.
+        classifier = onmetal.build_flavor_classifier(
+            [FakeFlavor('onmetal-gpu1', 65536),
+             FakeFlavor('onmetal-gpu2', 262144)])
+        self.assertEqual('onmetal-gpu1',
+                         classifier.classify_node(node(65536)))
+        self.assertEqual('onmetal-gpu2',
+                         classifier.classify_node(node(262144)))
+        self.assertEqual('onmetal-io1',
+                         classifier.classify_node(node(131072)))
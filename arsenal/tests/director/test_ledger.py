@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from arsenal.director import ledger
+from arsenal.strategy import base as sb
+from arsenal.tests import base
+
+
+class TestDirectiveLedger(base.TestCase):
+
+    def setUp(self):
+        super(TestDirectiveLedger, self).setUp()
+        self.ledger = ledger.DirectiveLedger(ttl=60)
+        self.ledger.record(sb.CacheNode('node-a', 'image-a', 'sum-a'),
+                           timestamp=100)
+        self.ledger.record(sb.EjectNode('node-b'), timestamp=100)
+
+    def nodes(self, a=(False, False, None), b=(False, True, 'image-b')):
+        return [sb.NodeInput('node-a', 'flavor', *a),
+                sb.NodeInput('node-b', 'flavor', *b),
+                sb.NodeInput('node-c', 'flavor', False, False, None)]
+
+    def test_suppress_duplicates(self):
+        directives = [sb.CacheNode('node-a', 'image-a', 'sum-a'),
+                      sb.CacheNode('node-a', 'image-z', 'sum-z'),
+                      sb.EjectNode('node-a'),
+                      sb.EjectNode('node-b'),
+                      sb.CacheNode('node-c', 'image-a', 'sum-a')]
+        self.assertEqual(directives[1:3] + directives[4:],
+                         self.ledger.suppress_duplicates(directives))
+
+    def test_reconcile_keeps_unreflected_directives(self):
+        self.ledger.reconcile(self.nodes(), timestamp=120)
+        self.assertIn('node-a', self.ledger)
+        self.assertIn('node-b', self.ledger)
+
+    def test_reconcile_settles_reflected_directives(self):
+        self.ledger.reconcile(self.nodes(a=(False, True, 'image-a'),
+                                         b=(False, False, None)),
+                              timestamp=120)
+        self.assertEqual(0, len(self.ledger))
+
+    def test_reconcile_settles_provisioned_nodes(self):
+        self.ledger.reconcile(self.nodes(a=(True, False, None)),
+                              timestamp=120)
+        self.assertNotIn('node-a', self.ledger)
+        self.assertIn('node-b', self.ledger)
+
+    def test_reconcile_drops_expired_and_vanished_nodes(self):
+        self.ledger.reconcile(self.nodes()[1:], timestamp=120)
+        self.assertEqual(['node-b'], list(self.ledger.entries))
+        self.ledger.reconcile(self.nodes(), timestamp=160)
+        self.assertEqual(0, len(self.ledger))
+
+    def test_failed_cache_waits_for_ttl(self):
+        # A failed cache reports as not cached, just like one in progress.
+        self.ledger.reconcile(self.nodes(), timestamp=159)
+        self.assertIn('node-a', self.ledger)
+        self.ledger.reconcile(self.nodes(), timestamp=160)
+        self.assertNotIn('node-a', self.ledger)
+
+    def test_apply_marks_nodes_busy(self):
+        table = self.ledger.apply(self.nodes())
+        rows = dict((node.node_uuid, node) for node in table)
+        self.assertTrue(rows['node-a'].cached)
+        self.assertEqual('image-a', rows['node-a'].cached_image_uuid)
+        # Outstanding cache directives count as caching in flight.
+        self.assertTrue(rows['node-a'].caching)
+        self.assertEqual([True, False, False], list(table.caching))
+        self.assertFalse(rows['node-a'].provisioned)
+        self.assertTrue(rows['node-b'].provisioned)
+        self.assertFalse(rows['node-c'].cached)
+        self.assertEqual({'image-a': 1}, table.image_distribution())
+        self.assertEqual(['node-c'],
+                         [table.node_uuids[index] for index in
+                          table.available_mask().nonzero()[0]])
+
+    def test_apply_leaves_polled_nodes_alone(self):
+        nodes = self.nodes()
+        polled = sb.NodeTable.from_nodes(nodes)
+        table = self.ledger.apply(polled)
+        self.assertIsNot(polled, table)
+        self.assertEqual([False, False, False], list(polled.provisioned))
+        self.assertEqual([False, True, False], list(polled.cached))
+        self.assertEqual(['image-b'], polled.image_uuids)
+        self.assertFalse(nodes[0].cached)
+        self.assertFalse(nodes[1].provisioned)
+
+    def test_apply_without_entries_returns_nodes(self):
+        nodes = self.nodes()
+        self.assertIs(nodes, ledger.DirectiveLedger(60).apply(nodes))
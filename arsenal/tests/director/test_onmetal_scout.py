@@ -27,8 +27,10 @@ from oslo_config import cfg
 
 import arsenal.director.onmetal_scout as onmetal
 from arsenal.external import client_wrapper
+from arsenal.external import ironic_client_wrapper
 import arsenal.strategy.base as strat_base
 from arsenal.tests import base
+from arsenal.tests.external import ironic_utils
 
 CONF = cfg.CONF
 
@@ -117,6 +119,9 @@ class TestOnMetalScout(base.TestCase):
     @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
     def setUp(self, wrapper_call_mock):
         super(TestOnMetalScout, self).setUp()
+        # Listings of selected fields need a newer ironicclient than the
+        # one pinned in requirements.txt.
+        self.patch(ironic_client_wrapper, '_client_supports_fields', True)
         CONF.set_override('api_endpoint', 'http://glance_endpoint', 'glance')
         wrapper_call_mock.return_value = TEST_GLANCE_IMAGE_DATA
         self.scout = onmetal.OnMetalScout()
@@ -143,6 +148,30 @@ class TestOnMetalScout(base.TestCase):
         ironic_node.provision_state = None
         self.assertFalse(onmetal.is_node_provisioned(ironic_node))
 
+    def test_is_node_caching(self):
+        ironic_node = mock.NonCallableMock()
+        ironic_node.driver_info = {'cache_status': 'caching'}
+        self.assertTrue(onmetal.is_node_caching(ironic_node))
+        self.assertTrue(onmetal.is_node_cached(ironic_node))
+        for driver_info in ({'cache_status': 'cached'}, {}):
+            ironic_node.driver_info = driver_info
+            self.assertFalse(onmetal.is_node_caching(ironic_node))
+
+    def test_is_node_deployed(self):
+        ironic_node = mock.NonCallableMock()
+        ironic_node.maintenance = False
+        ironic_node.provision_state = "active"
+        self.assertTrue(onmetal.is_node_deployed(ironic_node))
+
+        # Ejected nodes are managed, then cleaned, but never deployed.
+        for state in ("manageable", "cleaning", "available", None):
+            ironic_node.provision_state = state
+            self.assertFalse(onmetal.is_node_deployed(ironic_node))
+
+        ironic_node.provision_state = "active"
+        ironic_node.maintenance = True
+        self.assertFalse(onmetal.is_node_deployed(ironic_node))
+
     @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
     def test_issue_cache_node_good_image(self, wrapper_call_mock):
         cache_node_action = strat_base.CacheNode('node_uuid',
@@ -162,6 +191,14 @@ class TestOnMetalScout(base.TestCase):
                                                   http_method='POST',
                                                   args=expected_args)
 
+    def test_glance_images_indexed_by_id(self):
+        self.assertItemsEqual(['aaaa', 'bbbb', 'cccc'],
+                              self.scout.glance_images)
+        record = self.scout.glance_images['cccc']
+        self.assertEqual(('coreos_image.pxe', 'coreos-checksum'),
+                         (record.file, record.checksum))
+        self.assertFalse(hasattr(record, 'name'))
+
     @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
     def test_issue_cache_node_bad_image(self, wrapper_call_mock):
         cache_node_action = strat_base.CacheNode('node_uuid',
@@ -180,8 +217,6 @@ class TestOnMetalScout(base.TestCase):
         expected_flavors = ('onmetal-compute1', 'onmetal-io1', 'onmetal-gpu1',
                             'onmetal-memory1')
 
-        # NOTE(ClifHouck): This also implicitly tests retrieve_flavor_data's
-        # behavior to add unknown flavors to onmetal_scout.KNOWN_FLAVORS.
         expected_result = [
             strat_base.FlavorInput(f, onmetal.KNOWN_FLAVORS.get(f))
             for f in expected_flavors
@@ -190,6 +225,11 @@ class TestOnMetalScout(base.TestCase):
                               [r.name for r in result],
                               "retrieve_flavor_data did not properly filter "
                               "for onmetal flavors!")
+        # Unknown flavors are identified by the memory Nova reports for them.
+        gpu_node = ironic_utils.get_test_node(properties={'memory_mb': 65536})
+        self.assertEqual('onmetal-gpu1',
+                         self.scout.flavor_classifier.classify_node(gpu_node))
+        self.assertNotIn('onmetal-gpu1', onmetal.KNOWN_FLAVORS)
 
     @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
     def test_retrieve_image_data_only_returns_onmetal(self,
@@ -208,6 +248,169 @@ class TestOnMetalScout(base.TestCase):
                               "retrieve_image_data did not properly filter "
                               "for onmetal images!")
 
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_retrieve_node_data_builds_node_table(self, wrapper_call_mock):
+        wrapper_call_mock.return_value = [
+            ironic_utils.get_test_node(
+                uuid='aaaa', provision_state='available',
+                properties={'memory_mb': 32768},
+                driver_info={'cache_status': 'cached',
+                             'cache_image_id': 'image-a'}),
+            ironic_utils.get_test_node(
+                uuid='bbbb', provision_state='active',
+                properties={'memory_mb': 131072}),
+            ironic_utils.get_test_node(
+                uuid='cccc', properties={'memory_mb': 1}),
+        ]
+        result = self.scout.retrieve_node_data()
+        self.assertIsInstance(result, strat_base.NodeTable)
+        self.assertEqual(['aaaa', 'bbbb'], result.node_uuids)
+        self.assertEqual('onmetal-compute1', result[0].flavor)
+        self.assertTrue(result[0].cached)
+        self.assertEqual('image-a', result[0].cached_image_uuid)
+        self.assertEqual('onmetal-io1', result[1].flavor)
+        self.assertTrue(result[1].provisioned)
+        self.assertFalse(result[1].cached)
+
+    @mock.patch.object(onmetal.time, 'time')
+    @mock.patch.object(strat_base, 'clear_interned_identifiers')
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_full_listings_clear_interned_identifiers(self, wrapper_call_mock,
+                                                      clear_mock, time_mock):
+        wrapper_call_mock.return_value = []
+        self.scout.retrieve_node_data()
+        self.assertEqual(1, clear_mock.call_count)
+
+        CONF.set_override('node_delta_polling', True, 'ironic')
+        self.addCleanup(CONF.clear_override, 'node_delta_polling', 'ironic')
+        time_mock.return_value = 1000
+        self.scout.retrieve_node_data()
+        self.assertEqual(2, clear_mock.call_count)
+        # Polling only the changed nodes keeps them.
+        time_mock.return_value = 1001
+        self.scout.retrieve_node_data()
+        self.assertEqual(2, clear_mock.call_count)
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_retrieve_node_data_pages_through_ironic(self,
+                                                     wrapper_call_mock):
+        CONF.set_override('node_page_size', 2, 'ironic')
+        self.addCleanup(CONF.clear_override, 'node_page_size', 'ironic')
+        nodes = [ironic_utils.get_test_node(uuid=uuid, properties={
+                 'memory_mb': 32768}) for uuid in ('aaaa', 'bbbb', 'cccc')]
+        wrapper_call_mock.side_effect = [nodes[:2], nodes[2:]]
+        result = self.scout.retrieve_node_data()
+        self.assertEqual(['aaaa', 'bbbb', 'cccc'], result.node_uuids)
+        wrapper_call_mock.assert_has_calls([
+            mock.call('node.list', marker=None, limit=2,
+                      fields=onmetal.NODE_FIELDS),
+            mock.call('node.list', marker='bbbb', limit=2,
+                      fields=onmetal.NODE_FIELDS)])
+
+        CONF.set_override('node_page_size', 0, 'ironic')
+        wrapper_call_mock.side_effect = None
+        wrapper_call_mock.return_value = nodes
+        self.assertEqual(3, len(self.scout.retrieve_node_data()))
+        wrapper_call_mock.assert_called_with('node.list', limit=0,
+                                             fields=onmetal.NODE_FIELDS)
+
+    @mock.patch.object(onmetal.time, 'time')
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_delta_polling(self, wrapper_call_mock, time_mock):
+        CONF.set_override('node_delta_polling', True, 'ironic')
+        CONF.set_override('node_page_size', 2, 'ironic')
+        CONF.set_override('node_full_resync_interval', 600, 'ironic')
+        for name in ('node_delta_polling', 'node_page_size',
+                     'node_full_resync_interval'):
+            self.addCleanup(CONF.clear_override, name, 'ironic')
+
+        def node(uuid, updated_at, **kwargs):
+            return ironic_utils.get_test_node(
+                uuid=uuid, updated_at=updated_at,
+                properties={'memory_mb': 32768}, **kwargs)
+
+        time_mock.return_value = 1000
+        wrapper_call_mock.side_effect = [
+            [node('aaaa', '2015-01-01T00:00:01'),
+             node('bbbb', '2015-01-01T00:00:02')],
+            [node('cccc', '2015-01-01T00:00:03')]]
+        result = self.scout.retrieve_node_data()
+        self.assertEqual(['aaaa', 'bbbb', 'cccc'], sorted(result.node_uuids))
+        self.assertEqual('2015-01-01T00:00:03',
+                         self.scout.node_cache.watermark)
+
+        # Reading stops at the first node older than the watermark. Nodes
+        # updated at the watermark itself are read again.
+        time_mock.return_value = 1300
+        wrapper_call_mock.reset_mock()
+        wrapper_call_mock.side_effect = [
+            [node('aaaa', '2015-01-01T00:00:04', provision_state='active'),
+             node('cccc', '2015-01-01T00:00:03')],
+            [node('bbbb', '2015-01-01T00:00:02')],
+            AssertionError("Read past the watermark.")]
+        result = self.scout.retrieve_node_data()
+        self.assertEqual(2, wrapper_call_mock.call_count)
+        wrapper_call_mock.assert_called_with(
+            'node.list', marker='cccc', limit=2, fields=onmetal.NODE_FIELDS,
+            sort_key='updated_at', sort_dir='desc')
+        provisioned = dict((n.node_uuid, n.provisioned) for n in result)
+        self.assertEqual({'aaaa': True, 'bbbb': False, 'cccc': False},
+                         provisioned)
+
+        # Tables built from the cache do not share rows.
+        result[0].provisioned = not result[0].provisioned
+        wrapper_call_mock.side_effect = [[]]
+        self.assertEqual(provisioned, dict(
+            (n.node_uuid, n.provisioned)
+            for n in self.scout.retrieve_node_data()))
+
+        # A full resync notices that bbbb is gone.
+        time_mock.return_value = 1600
+        wrapper_call_mock.reset_mock()
+        wrapper_call_mock.side_effect = [
+            [node('aaaa', '2015-01-01T00:00:04', provision_state='active')]]
+        result = self.scout.retrieve_node_data()
+        self.assertEqual(['aaaa'], result.node_uuids)
+        wrapper_call_mock.assert_called_once_with(
+            'node.list', marker=None, limit=2, fields=onmetal.NODE_FIELDS)
+
+    @mock.patch.object(onmetal.time, 'time')
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_delta_polling_nodes_never_updated(self, wrapper_call_mock,
+                                               time_mock):
+        CONF.set_override('node_delta_polling', True, 'ironic')
+        CONF.set_override('node_page_size', 0, 'ironic')
+        for name in ('node_delta_polling', 'node_page_size'):
+            self.addCleanup(CONF.clear_override, name, 'ironic')
+
+        def node(uuid, updated_at, **kwargs):
+            return ironic_utils.get_test_node(
+                uuid=uuid, updated_at=updated_at,
+                properties={'memory_mb': 32768}, **kwargs)
+
+        time_mock.return_value = 1000
+        wrapper_call_mock.return_value = [
+            node('aaaa', '2015-01-01T00:00:01'),
+            node('bbbb', None, created_at='2015-01-01T00:00:03')]
+        self.scout.retrieve_node_data()
+        self.assertEqual('2015-01-01T00:00:03',
+                         self.scout.node_cache.watermark)
+
+        # Nodes without updated_at in the middle of a page neither stop the
+        # read nor get skipped.
+        time_mock.return_value = 1100
+        wrapper_call_mock.return_value = [
+            node('cccc', '2015-01-01T00:00:05'),
+            node('dddd', None),
+            node('eeee', None, created_at='2015-01-01T00:00:04'),
+            node('bbbb', None, created_at='2015-01-01T00:00:03'),
+            node('ffff', '2015-01-01T00:00:02')]
+        result = self.scout.retrieve_node_data()
+        self.assertEqual(['aaaa', 'bbbb', 'cccc', 'dddd', 'eeee'],
+                         sorted(result.node_uuids))
+        self.assertEqual('2015-01-01T00:00:05',
+                         self.scout.node_cache.watermark)
+
     @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
     def test_issue_eject_node_calls_manage_and_provide(self,
                                                        wrapper_call_mock):
@@ -220,3 +423,76 @@ class TestOnMetalScout(base.TestCase):
                       state='provide')
         ]
         wrapper_call_mock.assert_has_calls(calls)
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_retrieve_image_data_filters_in_glance(self, wrapper_call_mock):
+        # The mock ignores the filters, as an older Glance might, so the
+        # images are still filtered as they arrive.
+        wrapper_call_mock.return_value = TEST_GLANCE_IMAGE_DATA
+        catalog = self.scout.retrieve_image_data()
+        wrapper_call_mock.assert_called_once_with(
+            'images.list', page_size=CONF.glance.image_page_size,
+            limit=CONF.glance.image_page_size,
+            filters={'flavor_classes': 'onmetal', 'vm_mode': 'metal',
+                     'visibility': 'public'})
+        self.assertItemsEqual(['ubuntu-14.04', 'ubuntu-14.10', 'coreos'],
+                              catalog.by_name)
+
+        CONF.set_override('server_side_image_filters', False, 'glance')
+        self.addCleanup(CONF.clear_override, 'server_side_image_filters',
+                        'glance')
+        wrapper_call_mock.reset_mock()
+        self.scout.retrieve_image_data()
+        wrapper_call_mock.assert_called_once_with(
+            'images.list', page_size=CONF.glance.image_page_size,
+            limit=CONF.glance.image_page_size, filters={})
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_list_glance_images_pages_on_demand(self, wrapper_call_mock):
+        CONF.set_override('image_page_size', 2, 'glance')
+        self.addCleanup(CONF.clear_override, 'image_page_size', 'glance')
+        wrapper_call_mock.side_effect = [TEST_GLANCE_IMAGE_DATA[:2],
+                                         TEST_GLANCE_IMAGE_DATA[2:4],
+                                         TEST_GLANCE_IMAGE_DATA[4:], []]
+        images = self.scout.list_glance_images(onmetal.is_onmetal_image)
+        next(images)
+        self.assertEqual(1, wrapper_call_mock.call_count)
+        remaining = list(images)
+        self.assertEqual(4, wrapper_call_mock.call_count)
+        # The next page starts after the last image of the one before.
+        self.assertEqual(
+            TEST_GLANCE_IMAGE_DATA[3]['id'],
+            wrapper_call_mock.call_args_list[2][1]['filters']['marker'])
+        self.assertEqual(
+            len([image for image in TEST_GLANCE_IMAGE_DATA
+                 if onmetal.is_onmetal_image(image)]) - 1,
+            len(remaining))
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_retrieve_image_data_skips_identical_listing(self,
+                                                         wrapper_call_mock):
+        wrapper_call_mock.return_value = TEST_GLANCE_IMAGE_DATA
+        catalog = self.scout.retrieve_image_data()
+        version = catalog.version
+        with mock.patch.object(onmetal, 'convert_glance_image') as convert:
+            self.assertIs(catalog, self.scout.retrieve_image_data())
+            self.assertFalse(convert.called)
+        self.assertEqual(version, catalog.version)
+
+        wrapper_call_mock.return_value = TEST_GLANCE_IMAGE_DATA[1:]
+        self.scout.retrieve_image_data()
+        self.assertEqual(version + 1, catalog.version)
+        self.assertNotIn('ubuntu-14.04', catalog.by_name)
+
+    def test_get_node_domain(self):
+        node = ironic_utils.get_test_node(properties={'rack': 'r1'},
+                                          extra={'switch': 's1'})
+        self.assertIsNone(onmetal.get_node_domain(node))
+
+        CONF.set_override('topology_key', 'rack', 'strategy')
+        self.addCleanup(CONF.clear_override, 'topology_key', 'strategy')
+        self.assertEqual('r1', onmetal.get_node_domain(node))
+        CONF.set_override('topology_key', 'switch', 'strategy')
+        self.assertEqual('s1', onmetal.get_node_domain(node))
+        CONF.set_override('topology_key', 'row', 'strategy')
+        self.assertIsNone(onmetal.get_node_domain(node))
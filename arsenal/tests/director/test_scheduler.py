@@ -15,10 +15,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import shutil
+import tempfile
+
 import mock
 from oslo_config import cfg
 
 from arsenal.director import scheduler
+from arsenal.director import snapshot
 from arsenal.strategy import base as sb
 from arsenal.tests import base
 
@@ -51,6 +56,7 @@ class TestScheduler(base.TestCase):
         # Make sure both rate limiters are off at the beginning of the test.
         CONF.set_override('cache_directive_rate_limit', 0, 'director')
         CONF.set_override('eject_directive_rate_limit', 0, 'director')
+        CONF.set_override('directive_ttl', 900, 'director')
 
         self.scheduler = scheduler.DirectorScheduler()
         self.scheduler.strat.directives = strat_directive_mock
@@ -108,6 +114,16 @@ class TestScheduler(base.TestCase):
         # 3 eject node directives, plus 3 cache node directives
         self.assertEqual(6, self.issue_action_mock.call_count)
 
+    def test_strategy_is_told_remaining_budget(self):
+        CONF.set_override('cache_directive_rate_limit', 3, 'director')
+        self.scheduler.cache_rate_limiter = (
+            scheduler.get_configured_cache_rate_limiter())
+        self.scheduler.cache_rate_limiter.current_count = 1
+        with mock.patch.object(self.scheduler.strat,
+                               'set_directive_budget') as budget_mock:
+            self.scheduler.issue_directives(None)
+        budget_mock.assert_called_once_with(cache=2, eject=None)
+
     def test_dry_run_on(self):
         # Dry-run enabled, so issue_action should not be called on the scout.
         CONF.set_override('dry_run', True, 'director')
@@ -131,3 +147,201 @@ class TestScheduler(base.TestCase):
         CONF.set_override('log_statistics', False, 'director')
         self.scheduler.issue_directives(None)
         self.assertFalse(log_mock.called)
+
+    def _scout_nodes(self, **overrides):
+        # Nodes as Ironic reports them before any directive took effect:
+        # the nodes to cache hold nothing, the nodes to eject hold an image.
+        nodes = []
+        for directive in strat_directive_mock():
+            cached = isinstance(directive, sb.EjectNode)
+            state = overrides.get(directive.node_uuid,
+                                  (cached, 'image-old' if cached else None))
+            nodes.append(sb.NodeInput(directive.node_uuid, 'flavor', False,
+                                      state[0], state[1]))
+        return nodes
+
+    def test_ledger_suppresses_outstanding_directives(self):
+        self.scheduler.scout.retrieve_node_data.return_value = (
+            self._scout_nodes())
+        self.scheduler.issue_directives(None)
+        self.assertEqual(10, self.issue_action_mock.call_count)
+        self.assertEqual(10, len(self.scheduler.ledger))
+
+        # Ironic has not caught up, so nothing is issued again.
+        self.issue_action_mock.reset_mock()
+        self.scheduler.scout.retrieve_node_data.return_value = (
+            self._scout_nodes())
+        self.scheduler.issue_directives(None)
+        self.assertFalse(self.issue_action_mock.called)
+
+        # node-a finished caching and node-f was ejected, so their entries
+        # settle and the mocked strategy's directives go out again.
+        self.issue_action_mock.reset_mock()
+        self.scheduler.scout.retrieve_node_data.return_value = (
+            self._scout_nodes(**{'node-a': (True, 'image-a'),
+                                 'node-f': (False, None)}))
+        self.scheduler.issue_directives(None)
+        self.assertEqual(['node-a', 'node-f'],
+                         sorted(call[0][0].node_uuid for call in
+                                self.issue_action_mock.call_args_list))
+
+    def test_ledger_off(self):
+        CONF.set_override('directive_ttl', 0, 'director')
+        self.assertIsNone(scheduler.get_configured_ledger())
+
+    def test_concurrent_polling(self):
+        CONF.set_override('concurrent_polling', True, 'director')
+        self.addCleanup(CONF.clear_override, 'concurrent_polling',
+                        'director')
+        CONF.set_override('log_statistics', False, 'director')
+        scout = self.scheduler.scout
+        scout.retrieve_node_data.return_value = ['node']
+        scout.retrieve_flavor_data.return_value = ['flavor']
+        scout.retrieve_image_data.return_value = ['image']
+
+        # Flavors and images are no longer polled on their own.
+        self.scheduler.poll_for_flavor_data(None)
+        self.scheduler.poll_for_image_data(None)
+        self.assertFalse(scout.retrieve_flavor_data.called)
+        self.assertFalse(scout.retrieve_image_data.called)
+
+        with mock.patch.object(self.scheduler.strat,
+                               'update_current_state') as update_mock:
+            self.scheduler.issue_directives(None)
+        update_mock.assert_called_once_with(['node'], ['image'], ['flavor'])
+        self.assertEqual(set(['nodes', 'flavors', 'images']),
+                         set(self.scheduler.poll_timings))
+
+    def test_concurrent_polling_classifies_with_same_cycle_flavors(self):
+        scout = self.scheduler.scout
+        scout.retrieve_flavor_data.return_value = ['flavor']
+        scout.retrieve_image_data.return_value = ['image']
+
+        def retrieve_node_data():
+            # Nodes are classified by the flavors the Scout polled last,
+            # which must be this cycle's.
+            self.assertTrue(scout.retrieve_flavor_data.called)
+            return ['node']
+
+        scout.retrieve_node_data.side_effect = retrieve_node_data
+        self.scheduler.poll_all_data()
+        self.assertEqual(['node'], self.scheduler.node_data)
+
+    def test_concurrent_polling_failure_keeps_snapshot(self):
+        scout = self.scheduler.scout
+        scout.retrieve_node_data.return_value = ['node']
+        scout.retrieve_flavor_data.side_effect = ValueError('Nova is down')
+        scout.retrieve_image_data.return_value = ['image']
+        self.scheduler.flavor_data = ['old flavor']
+        self.scheduler.image_data = ['old image']
+        self.assertRaises(ValueError, self.scheduler.poll_all_data)
+        self.assertEqual([], self.scheduler.node_data)
+        self.assertEqual(['old flavor'], self.scheduler.flavor_data)
+        self.assertEqual(['old image'], self.scheduler.image_data)
+
+    @mock.patch('arsenal.director.onmetal_scout.OnMetalScout')
+    def test_warm_restart_from_snapshot(self, onmetal_scout_mock):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        CONF.set_override('snapshot_path',
+                          os.path.join(temp_dir, 'snapshot'), 'director')
+        self.addCleanup(CONF.clear_override, 'snapshot_path', 'director')
+        CONF.set_override('log_statistics', False, 'director')
+        self.scheduler.scout.retrieve_node_data.return_value = (
+            self._scout_nodes())
+        self.scheduler.image_data = [sb.ImageInput('image', 'image-a', 'a')]
+        self.scheduler.flavor_data = [sb.FlavorInput('flavor', None)]
+        self.scheduler.issue_directives(None)
+
+        restarted = scheduler.DirectorScheduler()
+        self.assertEqual(10, len(restarted.node_data))
+        self.assertEqual(['image'], [i.name for i in restarted.image_data])
+        self.assertEqual(['flavor'], [f.name for f in restarted.flavor_data])
+        self.assertEqual(10, len(restarted.ledger))
+        self.assertEqual(set(['nodes', 'flavors', 'images']),
+                         restarted.stale_sources)
+
+        # Nodes are polled with the directives, but flavors and images are
+        # still stale, so nothing is issued.
+        restarted.strat.directives = mock.Mock(
+            side_effect=strat_directive_mock)
+        restarted.scout.retrieve_node_data.return_value = self._scout_nodes()
+        restarted.issue_directives(None)
+        self.assertFalse(restarted.strat.directives.called)
+        self.assertFalse(restarted.scout.issue_action.called)
+
+        restarted.scout.retrieve_flavor_data.return_value = (
+            restarted.flavor_data)
+        restarted.scout.retrieve_image_data.return_value = (
+            restarted.image_data)
+        restarted.poll_for_flavor_data(None)
+        restarted.poll_for_image_data(None)
+        restarted.issue_directives(None)
+        self.assertTrue(restarted.strat.directives.called)
+
+    def test_snapshot_holds_nodes_as_polled(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        snapshot_path = os.path.join(temp_dir, 'snapshot')
+        CONF.set_override('snapshot_path', snapshot_path, 'director')
+        self.addCleanup(CONF.clear_override, 'snapshot_path', 'director')
+        CONF.set_override('log_statistics', False, 'director')
+        self.scheduler.image_data = [sb.ImageInput('image', 'image-a', 'a')]
+        self.scheduler.flavor_data = [sb.FlavorInput('flavor', None)]
+        self.scheduler.scout.retrieve_node_data.return_value = (
+            self._scout_nodes())
+        self.scheduler.issue_directives(None)
+
+        # Ironic has not caught up, so the ledger marks every node, but the
+        # snapshot must hold them as the Scout reported them.
+        polled = self._scout_nodes()
+        self.scheduler.scout.retrieve_node_data.return_value = polled
+        self.scheduler.issue_directives(None)
+        self.assertEqual(10, len(self.scheduler.ledger))
+        saved = snapshot.load(snapshot_path)
+        self.assertEqual(
+            [(n.node_uuid, n.provisioned, n.cached, n.cached_image_uuid)
+             for n in self._scout_nodes()],
+            [(n.node_uuid, n.provisioned, n.cached, n.cached_image_uuid)
+             for n in saved.nodes])
+        self.assertFalse(any(node.provisioned for node in polled))
+
+    @mock.patch.object(scheduler.time, 'time')
+    def test_adaptive_polling(self, time_mock):
+        CONF.set_override('adaptive_polling', True, 'director')
+        self.addCleanup(CONF.clear_override, 'adaptive_polling', 'director')
+        CONF.set_override('log_statistics', False, 'director')
+        self.scheduler.poll_interval = scheduler.get_configured_poll_interval()
+        scout = self.scheduler.scout
+        scout.retrieve_node_data.return_value = self._scout_nodes()
+        time_mock.return_value = 1000
+
+        self.scheduler.issue_directives(None)
+        self.assertEqual(1, scout.retrieve_node_data.call_count)
+        self.assertEqual(60, self.scheduler.poll_interval.interval)
+
+        # Not due yet, so nothing is polled.
+        time_mock.return_value = 1059
+        self.scheduler.issue_directives(None)
+        self.assertEqual(1, scout.retrieve_node_data.call_count)
+
+        # Nothing changed, so the interval keeps growing.
+        time_mock.return_value = 1060
+        self.scheduler.issue_directives(None)
+        self.assertEqual(2, scout.retrieve_node_data.call_count)
+        self.assertEqual(120, self.scheduler.poll_interval.interval)
+
+        # Provisioning activity brings it back down.
+        scout.retrieve_node_data.return_value = self._scout_nodes(
+            **{'node-a': (True, 'image-a'), 'node-b': (True, 'image-b')})
+        time_mock.return_value = 1180
+        self.scheduler.issue_directives(None)
+        self.assertEqual(3, scout.retrieve_node_data.call_count)
+        self.assertEqual(40, self.scheduler.poll_interval.interval)
+
+    def test_task_spacing(self):
+        self.assertEqual(120, scheduler.task_spacing(120))
+        CONF.set_override('adaptive_polling', True, 'director')
+        self.addCleanup(CONF.clear_override, 'adaptive_polling', 'director')
+        self.assertEqual(CONF.director.min_poll_spacing,
+                         scheduler.task_spacing(120))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+from arsenal.director import snapshot
+from arsenal.strategy import base as sb
+from arsenal.tests import base
+
+
+class TestSnapshot(base.TestCase):
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.path = os.path.join(temp_dir, 'snapshot')
+        self.nodes = [
+            sb.NodeInput('node-a', 'flavor-1', False, True, 'image-a', 'r1'),
+            sb.NodeInput('node-b', 'flavor-2', True, False, None),
+            sb.NodeInput('node-c', 'flavor-1', False, False, '', 'r2'),
+        ]
+        self.snapshot = snapshot.Snapshot(
+            self.nodes,
+            [sb.ImageInput('image', 'image-a', 'checksum-a', 1024)],
+            [sb.FlavorInput('flavor-1', None),
+             sb.FlavorInput('flavor-2', None)],
+            [(sb.CacheNode('node-c', 'image-a', 'checksum-a'), 100.0),
+             (sb.EjectNode('node-a'), 200.0)],
+            50.0)
+
+    def test_round_trip(self):
+        snapshot.save(self.path, self.snapshot)
+        loaded = snapshot.load(self.path)
+
+        self.assertIsInstance(loaded.nodes, sb.NodeTable)
+        self.assertEqual([str(node) for node in self.nodes],
+                         [str(node) for node in loaded.nodes])
+        self.assertEqual(['r1', None, 'r2'],
+                         [node.domain for node in loaded.nodes])
+        image = loaded.images[0]
+        self.assertEqual(('image', 'image-a', 'checksum-a', 1024),
+                         (image.name, image.uuid, image.checksum, image.size))
+        self.assertEqual(['flavor-1', 'flavor-2'],
+                         [flavor.name for flavor in loaded.flavors])
+        self.assertTrue(loaded.flavors[1].is_flavor_node(self.nodes[1]))
+        self.assertFalse(loaded.flavors[1].is_flavor_node(self.nodes[0]))
+        self.assertEqual([str(directive) for directive, expires_at in
+                          self.snapshot.ledger_entries],
+                         [str(directive) for directive, expires_at in
+                          loaded.ledger_entries])
+        self.assertEqual([100.0, 200.0],
+                         [expires_at for directive, expires_at in
+                          loaded.ledger_entries])
+        self.assertEqual(50.0, loaded.timestamp)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_load_missing_or_unreadable(self):
+        self.assertIsNone(snapshot.load(self.path))
+        with open(self.path, 'wb') as snapshot_file:
+            snapshot_file.write(b'not a snapshot')
+        self.assertIsNone(snapshot.load(self.path))
+
+    def test_load_other_version(self):
+        self.patch(snapshot, 'SNAPSHOT_VERSION', 0)
+        snapshot.save(self.path, self.snapshot)
+        self.patch(snapshot, 'SNAPSHOT_VERSION', 1)
+        self.assertIsNone(snapshot.load(self.path))
@@ -166,3 +166,43 @@ class OpenstackClientWrapperTestCase(test_base.TestCase):
         for n in range(0, 4):
             openstackclient.call("flavor.list")
         self.assertEqual(1, mock_get_new_client.call_count)
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_iter_pages_follows_markers(self, mock_call):
+        mock_call.side_effect = [[{'id': 'a'}, {'id': 'b'}],
+                                 [{'id': 'c'}, {'id': 'd'}],
+                                 [{'id': 'e'}]]
+        pages = list(self.openstackclient.iter_pages(
+            "image.list", 2, marker_attr='id', detail=True))
+        self.assertEqual([['a', 'b'], ['c', 'd'], ['e']],
+                         [[item['id'] for item in page] for page in pages])
+        mock_call.assert_has_calls([
+            mock.call("image.list", marker=None, limit=2, detail=True),
+            mock.call("image.list", marker='b', limit=2, detail=True),
+            mock.call("image.list", marker='d', limit=2, detail=True)])
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_iter_pages_stops_on_empty_page(self, mock_call):
+        mock_call.side_effect = [[mock.Mock(uuid='a')], []]
+        pages = list(self.openstackclient.iter_pages("node.list", 1))
+        self.assertEqual(1, len(pages))
+        self.assertEqual(2, mock_call.call_count)
+        mock_call.assert_called_with("node.list", marker='a', limit=1)
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, '_multi_getattr')
+    @mock.patch.object(FakeClientWrapper, '_get_new_client')
+    def test_iter_pages_retries_each_page(self, mock_get_new_client,
+                                          mock_multi_getattr):
+        list_method = mock.Mock()
+        list_method.side_effect = [[{'uuid': 'a'}, {'uuid': 'b'}],
+                                   FakeRetryOnThisException('Conflict'),
+                                   [{'uuid': 'c'}]]
+        mock_multi_getattr.return_value = list_method
+        mock_get_new_client.return_value = FAKE_CLIENT
+        pages = list(self.openstackclient.iter_pages("flavor.list", 2))
+        self.assertEqual(2, len(pages))
+        # Only the failed page was requested again.
+        self.assertEqual([mock.call(marker=None, limit=2),
+                          mock.call(marker='b', limit=2),
+                          mock.call(marker='b', limit=2)],
+                         list_method.call_args_list)
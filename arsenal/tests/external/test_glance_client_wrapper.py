@@ -52,6 +52,22 @@ class GlanceClientWrapperTestCase(test_base.TestCase):
         # Make sure we're getting a token from keystone.
         mock_ks_cli.assert_called_once_with(**expected)
 
+    @mock.patch.object(client_wrapper.GlanceClientWrapper, 'call')
+    def test_iter_pages_passes_marker_as_filter(self, mock_call):
+        mock_call.side_effect = [[{'id': 'a'}, {'id': 'b'}], [{'id': 'c'}]]
+        filters = {'visibility': 'public'}
+        pages = list(self.glanceclient.iter_pages(
+            "images.list", 2, marker_attr='id', filters=filters))
+        self.assertEqual(2, len(pages))
+        self.assertEqual([
+            mock.call("images.list", page_size=2, limit=2,
+                      filters={'visibility': 'public'}),
+            mock.call("images.list", page_size=2, limit=2,
+                      filters={'visibility': 'public', 'marker': 'b'})],
+            mock_call.call_args_list)
+        # The caller's filters are left alone.
+        self.assertEqual({'visibility': 'public'}, filters)
+
     @mock.patch.object(glance_client, 'Client')
     def test__get_client_with_auth_token(self, mock_glance_cli):
         self.flags(api_endpoint='glance-endpoint', group='glance')
@@ -50,7 +50,8 @@ class IronicClientWrapperTestCase(test_base.TestCase):
                     'os_tenant_name': CONF.ironic.admin_tenant_name,
                     'os_service_type': 'baremetal',
                     'os_endpoint_type': 'public',
-                    'ironic_url': CONF.ironic.api_endpoint}
+                    'ironic_url': CONF.ironic.api_endpoint,
+                    'os_ironic_api_version': '1.8'}
         mock_ir_cli.assert_called_once_with(CONF.ironic.api_version,
                                             **expected)
 
@@ -61,6 +62,115 @@ class IronicClientWrapperTestCase(test_base.TestCase):
         # dummy call to have _get_client() called
         ironicclient.call("node.list")
         expected = {'os_auth_token': 'fake-token',
-                    'ironic_url': CONF.ironic.api_endpoint}
+                    'ironic_url': CONF.ironic.api_endpoint,
+                    'os_ironic_api_version': '1.8'}
         mock_ir_cli.assert_called_once_with(CONF.ironic.api_version,
                                             **expected)
+
+    @mock.patch.object(ironic_client, 'get_client')
+    def test__get_client_without_microversion(self, mock_ir_cli):
+        self.flags(admin_auth_token='fake-token', group='ironic')
+        CONF.set_override('api_microversion', '', 'ironic')
+        self.addCleanup(CONF.clear_override, 'api_microversion', 'ironic')
+        ironicclient = client_wrapper.IronicClientWrapper()
+        self.assertFalse(ironicclient.supports_fields)
+        ironicclient.call("node.list")
+        mock_ir_cli.assert_called_once_with(
+            CONF.ironic.api_version, os_auth_token='fake-token',
+            ironic_url=CONF.ironic.api_endpoint)
+
+    @mock.patch.object(client_wrapper, 'client_supports_fields',
+                       return_value=False)
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_call_old_client_lists_detail(self, mock_ir_cli, supports_mock):
+        self.assertFalse(self.ironicclient.supports_fields)
+        self.ironicclient.call("node.list", limit=0, fields=['uuid'])
+        mock_ir_cli.return_value.node.list.assert_called_once_with(
+            limit=0, detail=True)
+        # The microversion is still requested, for a newer client later.
+        self.assertEqual('1.8', self.ironicclient.api_microversion)
+
+    def test_client_supports_fields(self):
+        self.patch(client_wrapper, '_client_supports_fields', None)
+        self.patch(client_wrapper.ironic_node.NodeManager, 'list',
+                   lambda self, marker=None: None)
+        self.assertFalse(client_wrapper.client_supports_fields())
+
+        self.patch(client_wrapper, '_client_supports_fields', None)
+        self.patch(client_wrapper.ironic_node.NodeManager, 'list',
+                   lambda self, marker=None, fields=None: None)
+        self.assertTrue(client_wrapper.client_supports_fields())
+
+    @mock.patch.object(client_wrapper.LOG, 'warning')
+    @mock.patch.object(client_wrapper, 'client_supports_fields',
+                       return_value=False)
+    def test_fields_disabled_logged_once(self, supports_mock, warning_mock):
+        self.patch(client_wrapper, '_logged_fields_disabled', False)
+        client_wrapper.IronicClientWrapper()
+        client_wrapper.IronicClientWrapper()
+        self.assertEqual(1, warning_mock.call_count)
+
+    @mock.patch.object(client_wrapper.LOG, 'warning')
+    def test_fields_disabled_by_old_microversion(self, warning_mock):
+        self.patch(client_wrapper, '_logged_fields_disabled', False)
+        client_wrapper.log_fields_disabled('1.6')
+        self.assertEqual(1, warning_mock.call_count)
+
+    @mock.patch.object(client_wrapper.LOG, 'warning')
+    @mock.patch.object(client_wrapper, 'client_supports_fields',
+                       return_value=True)
+    def test_fields_enabled_not_logged(self, supports_mock, warning_mock):
+        self.patch(client_wrapper, '_logged_fields_disabled', False)
+        client_wrapper.log_fields_disabled('1.8')
+        client_wrapper.log_fields_disabled(None)
+        self.assertFalse(warning_mock.called)
+
+    @mock.patch.object(client_wrapper, 'client_supports_fields',
+                       return_value=True)
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_call_requests_fields(self, mock_ir_cli, supports_mock):
+        self.ironicclient.call("node.list", limit=0, fields=['uuid'])
+        mock_ir_cli.return_value.node.list.assert_called_once_with(
+            limit=0, fields=['uuid'])
+
+    @mock.patch.object(client_wrapper, 'client_supports_fields',
+                       return_value=True)
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_call_falls_back_to_detail(self, mock_ir_cli, supports_mock):
+        node_list = mock_ir_cli.return_value.node.list
+        node_list.side_effect = [ironic_client.exc.NotAcceptable(), []]
+        self.ironicclient.call("node.list", limit=0, fields=['uuid'])
+        self.assertEqual([mock.call(limit=0, fields=['uuid']),
+                          mock.call(limit=0, detail=True)],
+                         node_list.call_args_list)
+        self.assertFalse(self.ironicclient.supports_fields)
+        # The fallback client no longer asks for the microversion.
+        self.assertNotIn('os_ironic_api_version',
+                         mock_ir_cli.call_args_list[-1][1])
+
+        node_list.reset_mock()
+        node_list.side_effect = None
+        self.ironicclient.call("node.list", limit=0, fields=['uuid'])
+        node_list.assert_called_once_with(limit=0, detail=True)
+
+    @mock.patch.object(client_wrapper, 'client_supports_fields',
+                       return_value=True)
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_call_without_fields_does_not_fall_back(self, mock_ir_cli,
+                                                    supports_mock):
+        node_list = mock_ir_cli.return_value.node.list
+        node_list.side_effect = ironic_client.exc.BadRequest()
+        self.assertRaises(ironic_client.exc.BadRequest,
+                          self.ironicclient.call, "node.list")
+        self.assertTrue(self.ironicclient.supports_fields)
+
+    @mock.patch.object(client_wrapper, 'client_supports_fields',
+                       return_value=True)
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_call_does_not_hide_type_errors(self, mock_ir_cli,
+                                            supports_mock):
+        node_list = mock_ir_cli.return_value.node.list
+        node_list.side_effect = TypeError()
+        self.assertRaises(TypeError, self.ironicclient.call, "node.list",
+                          fields=['uuid'])
+        self.assertTrue(self.ironicclient.supports_fields)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_bandwidth_aware_strategy
+----------------------------------
+
+Tests for the bandwidth aware caching strategy.
+"""
+
+import collections
+
+from oslo_config import cfg
+
+from arsenal.strategy import bandwidth_aware_strategy as bas
+from arsenal.strategy import base as sb
+from arsenal.tests import base as test_base
+from arsenal.tests.strategy import test_strategy_base as sb_test
+
+CONF = cfg.CONF
+
+GIGABYTE = 1024 ** 3
+
+SIZED_IMAGES = [
+    sb.ImageInput('Big', 'aaaa', 'big-checksum', 20 * GIGABYTE),
+    sb.ImageInput('Small', 'bbbb', 'small-checksum', GIGABYTE // 2),
+]
+
+
+class TestBandwidthAwareStrategy(test_base.TestCase):
+
+    def setUp(self):
+        super(TestBandwidthAwareStrategy, self).setUp()
+        self.flags(percentage_to_cache=0.5,
+                   group='simple_proportional_strategy')
+        self.flags(image_weights={'Big': 1, 'Small': 1}, group='strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        self.nodes = [sb.NodeInput('C-%d' % n, 'Compute', False, False, None)
+                      for n in range(20)]
+
+    def _directives(self, byte_budget):
+        self.flags(byte_budget=byte_budget, group='bandwidth_aware_strategy')
+        self.addCleanup(CONF.clear_override, 'byte_budget',
+                        'bandwidth_aware_strategy')
+        strategy = bas.BandwidthAwareStrategy()
+        strategy.update_current_state(self.nodes, SIZED_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        return strategy, strategy.directives()
+
+    def test_unlimited_budget_caches_like_simple_proportional(self):
+        strategy, directives = self._directives(0)
+        self.assertEqual(10, len(directives))
+        self.assertEqual({'aaaa': 5, 'bbbb': 5},
+                         collections.Counter(d.image_uuid
+                                             for d in directives))
+        self.assertEqual(10, len(set(d.node_uuid for d in directives)))
+
+    def test_budget_limits_bytes_and_prefers_small_images(self):
+        strategy, directives = self._directives(23 * GIGABYTE)
+        sizes = {image.uuid: image.size for image in SIZED_IMAGES}
+        self.assertLessEqual(sum(sizes[d.image_uuid] for d in directives),
+                             23 * GIGABYTE)
+        self.assertEqual({'aaaa': 1, 'bbbb': 5},
+                         collections.Counter(d.image_uuid
+                                             for d in directives))
+
+    def test_unmet_demand_is_retried(self):
+        strategy, directives = self._directives(GIGABYTE)
+        strategy.apply_node_changes()
+        first = strategy.directives()
+        self.assertEqual(['bbbb', 'bbbb'], [d.image_uuid for d in first])
+        self.assertEqual(set(['Compute']), strategy.dirty_flavors)
+        self.assertEqual(2, len(strategy.directives()))
+
+    def test_unknown_size_uses_default(self):
+        images = [sb.ImageInput('Big', 'aaaa', 'big-checksum'),
+                  sb.ImageInput('Small', 'bbbb', 'small-checksum')]
+        demand = bas.FlavorDemand('Compute', 4, {}, 0,
+                                  ['C-1', 'C-2', 'C-3', 'C-4'])
+        directives, unmet = bas.plan_cache_directives(
+            [demand], images, 2 * GIGABYTE, GIGABYTE)
+        self.assertEqual(2, len(directives))
+        self.assertEqual(set(['Compute']), unmet)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_forecasting_strategy
+----------------------------------
+
+Tests for the demand forecasting caching strategy.
+"""
+
+import mock
+from oslo_config import cfg
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import forecasting_strategy as fs
+from arsenal.tests import base as test_base
+from arsenal.tests.strategy import test_strategy_base as sb_test
+
+CONF = cfg.CONF
+
+HOUR = 60 * 60
+
+
+def compute_nodes(num_nodes, num_provisioned=0):
+    return [sb.NodeInput('C-%d' % n, 'Compute', n < num_provisioned, False,
+                         None)
+            for n in range(num_nodes)]
+
+
+class TestProvisioningRates(test_base.TestCase):
+
+    def test_decayed_rates_per_bucket(self):
+        rates = fs.ProvisioningRates(num_buckets=24, decay=0.5)
+        self.assertIsNone(rates.rate('Compute', 0))
+        rates.observe('Compute', 10, 0, HOUR)
+        self.assertAlmostEqual(10.0 / HOUR, rates.rate('Compute', 0))
+        rates.observe('Compute', 20, 0, HOUR)
+        self.assertAlmostEqual(15.0 / HOUR, rates.rate('Compute', 0))
+
+        # Unobserved buckets use the average of the observed ones.
+        rates.observe('Compute', 5, 5 * HOUR, 6 * HOUR)
+        self.assertAlmostEqual(10.0 / HOUR, rates.rate('Compute', 12 * HOUR))
+
+    def test_expected_provisions_spans_buckets(self):
+        rates = fs.ProvisioningRates(num_buckets=24, decay=0.5)
+        rates.observe('Compute', 4, 0, HOUR)
+        rates.observe('Compute', 8, HOUR, 2 * HOUR)
+        self.assertAlmostEqual(
+            6.0, rates.expected_provisions('Compute', HOUR / 2, HOUR))
+        self.assertIsNone(rates.expected_provisions('IO', 0, HOUR))
+
+    def test_invalid_settings(self):
+        self.assertRaises(ValueError, fs.ProvisioningRates, 0, 0.5)
+        self.assertRaises(ValueError, fs.ProvisioningRates, 24, -0.1)
+        self.assertRaises(ValueError, fs.ProvisioningRates, 24, 1.5)
+
+
+class TestForecastingStrategy(test_base.TestCase):
+
+    def setUp(self):
+        super(TestForecastingStrategy, self).setUp()
+        self.flags(percentage_to_cache=0.5,
+                   group='simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+        time_patcher = mock.patch.object(fs.time, 'time')
+        self.time_mock = time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+        self.time_mock.return_value = 0
+
+    def _cache_directives(self, directives):
+        return [d for d in directives if isinstance(d, sb.CacheNode)]
+
+    def test_rejects_out_of_range_options(self):
+        for name, value in (('time_buckets', 0), ('rate_decay', 1.5)):
+            self.flags(group='forecasting_strategy', **{name: value})
+            self.addCleanup(CONF.clear_override, name, 'forecasting_strategy')
+            self.assertRaises(ValueError, fs.ForecastingStrategy)
+            CONF.clear_override(name, 'forecasting_strategy')
+
+    def test_falls_back_to_percentage_without_observations(self):
+        strategy = fs.ForecastingStrategy()
+        strategy.update_current_state(compute_nodes(20), sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        self.assertEqual(10,
+                         len(self._cache_directives(strategy.directives())))
+
+    def test_sizes_cache_from_provisioning_rate(self):
+        strategy = fs.ForecastingStrategy()
+        strategy.update_current_state(compute_nodes(100),
+                                      sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.directives()
+
+        # Three compute nodes provisioned in half an hour: 6 an hour.
+        self.time_mock.return_value = HOUR / 2
+        strategy.update_current_state(compute_nodes(100, 3),
+                                      sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        directives = self._cache_directives(strategy.directives())
+        self.assertEqual(6, len(directives))
+        self.assertTrue(all(d.node_uuid.startswith('C') for d in directives))
+
+    def test_incremental_changes_are_counted(self):
+        strategy = fs.ForecastingStrategy()
+        strategy.update_current_state(compute_nodes(100),
+                                      sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.apply_node_changes()
+        strategy.directives()
+
+        self.time_mock.return_value = HOUR
+        strategy.apply_node_changes(changed=[
+            sb.NodeInput('C-%d' % n, 'Compute', True, False, None)
+            for n in range(60, 64)])
+        strategy.directives()
+        self.assertAlmostEqual(4.0 / HOUR, strategy.rates.rate('Compute', 0))
+        self.assertAlmostEqual(0, strategy.rates.rate('IO', 0))
+
+    def test_ejections_are_not_provisions(self):
+        # Four nodes hold an image which is no longer wanted.
+        nodes = compute_nodes(100)
+        for node in nodes[:4]:
+            node.cached = True
+            node.cached_image_uuid = 'retired'
+        strategy = fs.ForecastingStrategy()
+        strategy.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        ejected = [d.node_uuid for d in strategy.directives()
+                   if isinstance(d, sb.EjectNode)]
+        self.assertEqual(['C-0', 'C-1', 'C-2', 'C-3'], sorted(ejected))
+
+        # Ironic reports two ejected nodes as cleaning, the ledger marks the
+        # other two as provisioned until they are, another node went into
+        # maintenance, and only one node was deployed.
+        self.time_mock.return_value = HOUR
+        nodes = compute_nodes(100)
+        for n in (0, 1, 10):
+            nodes[n] = sb.NodeInput('C-%d' % n, 'Compute', True, False, None,
+                                    is_deployed=False)
+        nodes[20] = sb.NodeInput('C-20', 'Compute', True, False, None)
+        table = sb.NodeTable.from_nodes(nodes)
+        table.mark_provisioned([2, 3])
+        strategy.update_current_state(table, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.directives()
+        self.assertAlmostEqual(1.0 / HOUR, strategy.rates.rate('Compute', 0))
+
+    def test_incremental_ejections_are_not_provisions(self):
+        strategy = fs.ForecastingStrategy()
+        strategy.update_current_state(compute_nodes(100),
+                                      sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.apply_node_changes()
+        strategy.directives()
+
+        self.time_mock.return_value = HOUR
+        strategy.apply_node_changes(changed=[
+            sb.NodeInput('C-0', 'Compute', True, False, None,
+                         is_deployed=False),
+            sb.NodeInput('C-1', 'Compute', True, False, None)])
+        strategy.directives()
+        self.assertAlmostEqual(1.0 / HOUR, strategy.rates.rate('Compute', 0))
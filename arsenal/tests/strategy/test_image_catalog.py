@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_image_catalog
+----------------------------------
+
+Tests for the `image_catalog` module.
+"""
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import image_catalog
+from arsenal.tests import base as test_base
+
+TEST_IMAGES = [
+    sb.ImageInput('Ubuntu', 'aaaa', 'ubuntu-checksum'),
+    sb.ImageInput('CoreOS', 'bbbb', 'coreos-checksum'),
+    sb.ImageInput('Redhat', 'cccc', 'redhat-checksum'),
+]
+
+
+class TestImageCatalog(test_base.TestCase):
+
+    def setUp(self):
+        super(TestImageCatalog, self).setUp()
+        self.catalog = image_catalog.ImageCatalog(TEST_IMAGES)
+
+    def test_indexes(self):
+        self.assertEqual(1, self.catalog.version)
+        self.assertEqual(3, len(self.catalog))
+        self.assertEqual(TEST_IMAGES, list(self.catalog))
+        self.assertIs(TEST_IMAGES[1], self.catalog.by_name['CoreOS'])
+        self.assertIs(TEST_IMAGES[2], self.catalog.by_uuid['cccc'])
+        self.assertEqual([TEST_IMAGES[0]],
+                         self.catalog.by_checksum['ubuntu-checksum'])
+        self.assertIn('aaaa', self.catalog)
+        self.assertEqual(set(['aaaa', 'bbbb', 'cccc']),
+                         set(self.catalog.uuids))
+
+    def test_update_matches_find_image_differences(self):
+        new_images = [
+            sb.ImageInput('Ubuntu', 'aaaa', 'ubuntu-checksum'),
+            sb.ImageInput('CoreOS', 'dddd', 'coreos-checksum'),
+            sb.ImageInput('Windows', 'eeee', 'windows-checksum'),
+        ]
+        differences = self.catalog.update(new_images)
+        self.assertEqual(sb.find_image_differences(TEST_IMAGES, new_images),
+                         differences)
+        self.assertEqual(2, self.catalog.version)
+        self.assertNotIn('bbbb', self.catalog)
+        self.assertIs(new_images[1], self.catalog.by_name['CoreOS'])
+
+    def test_unchanged_listing_keeps_version(self):
+        differences = self.catalog.update(list(TEST_IMAGES))
+        self.assertFalse(any(differences.values()))
+        self.assertEqual(1, self.catalog.version)
+
+    def test_identical_fingerprint_skips_update(self):
+        self.catalog.update(TEST_IMAGES, fingerprint='abc')
+        differences = self.catalog.update([], fingerprint='abc')
+        self.assertFalse(any(differences.values()))
+        self.assertEqual(3, len(self.catalog))
+
+    def test_checksum_change_is_a_change(self):
+        differences = self.catalog.update([
+            sb.ImageInput('Ubuntu', 'aaaa', 'new-checksum'),
+            TEST_IMAGES[1], TEST_IMAGES[2]])
+        self.assertEqual(set(['Ubuntu']), differences['changed'])
+
+    def test_change_with_colliding_hash_is_a_change(self):
+        # hash(-1) == hash(-2), so these keys would collide if hashed.
+        catalog = image_catalog.ImageCatalog([sb.ImageInput('Ubuntu', 'aaaa',
+                                                            -1)])
+        differences = catalog.update([sb.ImageInput('Ubuntu', 'aaaa', -2)])
+        self.assertEqual(set(['Ubuntu']), differences['changed'])
+
+    def test_changes_since(self):
+        self.catalog.update(TEST_IMAGES[:2])
+        self.catalog.update([
+            sb.ImageInput('Ubuntu', 'zzzz', 'ubuntu-checksum'),
+            TEST_IMAGES[1],
+            sb.ImageInput('Windows', 'eeee', 'windows-checksum')])
+        self.assertEqual({'new': set(['Windows']),
+                          'changed': set(['Ubuntu']),
+                          'retired': set(['Redhat'])},
+                         self.catalog.changes_since(1))
+        self.assertEqual({'new': set(['Windows']),
+                          'changed': set(['Ubuntu']),
+                          'retired': set()},
+                         self.catalog.changes_since(2))
+        self.assertFalse(any(self.catalog.changes_since(3).values()))
+        self.assertEqual(set(['Ubuntu', 'CoreOS', 'Windows']),
+                         self.catalog.changes_since(None)['new'])
+
+    def test_listing_fingerprint(self):
+        listing = [{'id': 'aaaa', 'name': 'Ubuntu'},
+                   {'id': 'bbbb', 'name': 'CoreOS'}]
+        self.assertEqual(
+            image_catalog.listing_fingerprint(listing),
+            image_catalog.listing_fingerprint([dict(i) for i in listing]))
+        self.assertNotEqual(
+            image_catalog.listing_fingerprint(listing),
+            image_catalog.listing_fingerprint(listing[:1]))
@@ -21,11 +21,14 @@ behavior appears to be correct.
 """
 
 from __future__ import division
+import collections
+import copy
 import random
 
 from oslo_config import cfg
 
 from arsenal.strategy import base as sb
+from arsenal.strategy import image_catalog
 from arsenal.strategy import simple_proportional_strategy as sps
 from arsenal.tests import base as test_base
 from arsenal.tests.strategy import test_strategy_base as sb_test
@@ -238,3 +241,442 @@ class TestSimpleProportionalStrategy(test_base.TestCase):
                               group='simple_proportional_strategy')
             self.assertRaises(sps.InvalidPercentageError,
                               sps.SimpleProportionalStrategy)
+
+    def _directive_summary(self, directives):
+        ejected = set(d.node_uuid for d in directives
+                      if isinstance(d, sb.EjectNode))
+        cached = collections.Counter(d.node_uuid[0] for d in directives
+                                     if isinstance(d, sb.CacheNode))
+        return ejected, cached
+
+    def test_incremental_matches_full_recompute(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        for env_name, env in self.environments.iteritems():
+            print("Comparing incremental directives for %s." % env_name)
+            full = sps.SimpleProportionalStrategy()
+            full.update_current_state(copy.deepcopy(env['nodes']),
+                                      env['images'], env['flavors'])
+            incremental = sps.SimpleProportionalStrategy()
+            incremental.update_current_state([], env['images'],
+                                             env['flavors'])
+            incremental.apply_node_changes(
+                added=copy.deepcopy(env['nodes']))
+            self.assertEqual(self._directive_summary(full.directives()),
+                             self._directive_summary(
+                                 incremental.directives()))
+
+    def test_incremental_only_recomputes_touched_flavors(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        nodes = [sb.NodeInput('C-%d' % n, 'Compute', False, False, None)
+                 for n in range(10)]
+        nodes.extend(sb.NodeInput('I-%d' % n, 'IO', False, False, None)
+                     for n in range(10))
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.apply_node_changes()
+        first = strategy.directives()
+        self.assertEqual(10, len(first))
+
+        # Nothing changed, so nothing needs to be recomputed.
+        self.assertEqual([], strategy.directives())
+        self.assertEqual(set(), strategy.dirty_flavors)
+
+        # Provision two of the compute nodes which were cached.
+        cached_compute = sorted(d.node_uuid for d in first
+                                if d.node_uuid.startswith('C'))
+        strategy.apply_node_changes(changed=[
+            sb.NodeInput(node_uuid, 'Compute', True, False, None)
+            for node_uuid in cached_compute[:2]])
+        self.assertEqual(set(['Compute']), strategy.dirty_flavors)
+
+        # Eight unprovisioned compute nodes, three still cached.
+        second = strategy.directives()
+        self.assertEqual(1, len(second))
+        self.assertTrue(second[0].node_uuid.startswith('C'))
+        self.assertNotIn(second[0].node_uuid, cached_compute)
+
+        strategy.apply_node_changes(removed=['I-0', 'I-1', 'I-2'])
+        self.assertEqual(set(['IO']), strategy.dirty_flavors)
+
+    def test_incremental_ejects_retired_images(self):
+        nodes = [sb.NodeInput('C-1', 'Compute', False, True, 'aaaa'),
+                 sb.NodeInput('C-2', 'Compute', False, True, 'bbbb')]
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.apply_node_changes()
+        strategy.directives()
+
+        strategy.update_image_and_flavor_state(sb_test.TEST_IMAGES[1:],
+                                               sb_test.TEST_FLAVORS)
+        directives = strategy.directives()
+        self.assertEqual(['C-1'], [d.node_uuid for d in directives
+                                   if isinstance(d, sb.EjectNode)])
+        self.assertFalse(any(isinstance(d, sb.CacheNode) and
+                             d.node_uuid == 'C-1' for d in directives))
+
+    def test_incremental_planning_stops_at_directive_budget(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        nodes = [sb.NodeInput('C-%d' % n, 'Compute', False, False, None)
+                 for n in range(10)]
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.apply_node_changes()
+        strategy.set_directive_budget(cache=2)
+        self.assertEqual(2, len(strategy.directives()))
+        # Only the issued directives are counted, and the flavor is revisited
+        # next cycle for the rest.
+        self.assertEqual(2, strategy.node_states['Compute'].cached)
+        self.assertEqual(set(['Compute']), strategy.dirty_flavors)
+
+        strategy.set_directive_budget()
+        self.assertEqual(3, len(strategy.directives()))
+        self.assertEqual(5, strategy.node_states['Compute'].cached)
+        self.assertEqual(set(), strategy.dirty_flavors)
+
+    def test_incremental_retired_ejections_stop_at_directive_budget(self):
+        nodes = [sb.NodeInput('C-1', 'Compute', False, True, 'aaaa'),
+                 sb.NodeInput('C-2', 'Compute', False, True, 'aaaa')]
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.apply_node_changes()
+        strategy.directives()
+
+        strategy.update_image_and_flavor_state(sb_test.TEST_IMAGES[1:],
+                                               sb_test.TEST_FLAVORS)
+        strategy.set_directive_budget(eject=1)
+        ejected = [d for d in strategy.directives()
+                   if isinstance(d, sb.EjectNode)]
+        self.assertEqual(1, len(ejected))
+        self.assertEqual(1, strategy.node_states['Compute'].cached)
+        self.assertIn('Compute', strategy.dirty_flavors)
+
+        strategy.set_directive_budget()
+        ejected.extend(d for d in strategy.directives()
+                       if isinstance(d, sb.EjectNode))
+        self.assertEqual(['C-1', 'C-2'],
+                         sorted(d.node_uuid for d in ejected))
+
+    def test_indexed_node_set(self):
+        nodes = sps.IndexedNodeSet()
+        for node_uuid in ('a', 'b', 'c', 'd', 'b'):
+            nodes.add(node_uuid)
+        self.assertEqual(['a', 'b', 'c', 'd'], list(nodes))
+        # The last node takes the removed node's place.
+        nodes.discard('b')
+        nodes.discard('x')
+        self.assertEqual(['a', 'd', 'c'], list(nodes))
+        self.assertEqual('d', nodes[1])
+        self.assertNotIn('b', nodes)
+        nodes.discard('c')
+        nodes.add('b')
+        self.assertEqual(['a', 'd', 'b'], list(nodes))
+        self.assertEqual({'a': 0, 'd': 1, 'b': 2}, nodes.positions)
+
+    def test_shared_image_catalog(self):
+        nodes = [sb.NodeInput('C-1', 'Compute', False, True, 'aaaa'),
+                 sb.NodeInput('C-2', 'Compute', False, True, 'bbbb')]
+        catalog = image_catalog.ImageCatalog(sb_test.TEST_IMAGES)
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(nodes, catalog, sb_test.TEST_FLAVORS)
+        self.assertEqual(sb.find_image_differences([], sb_test.TEST_IMAGES),
+                         strategy.image_diff)
+        strategy.directives()
+
+        # The catalog is updated in place, as the scout does.
+        catalog.update(sb_test.TEST_IMAGES[1:])
+        strategy.update_image_and_flavor_state(catalog, sb_test.TEST_FLAVORS)
+        self.assertEqual(
+            sb.find_image_differences(sb_test.TEST_IMAGES,
+                                      sb_test.TEST_IMAGES[1:]),
+            strategy.image_diff)
+        self.assertNotIn('aaaa', strategy.current_image_uuids)
+        directives = strategy.directives()
+        self.assertEqual(['C-1'], [d.node_uuid for d in directives
+                                   if isinstance(d, sb.EjectNode)])
+
+        strategy.update_image_and_flavor_state(catalog, sb_test.TEST_FLAVORS)
+        self.assertFalse(any(strategy.image_diff.values()))
+
+    def test_parallel_modes_match_serial(self):
+        CONF.set_override('random_seed', 42,
+                          group='simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'random_seed',
+                        'simple_proportional_strategy')
+        nodes = self.environments['random-nodes(1000)']['nodes']
+        results = {}
+        for mode in ('serial', 'thread', 'process'):
+            CONF.set_override('parallel_mode', mode,
+                              group='simple_proportional_strategy')
+            strategy = sps.SimpleProportionalStrategy()
+            strategy.update_current_state(copy.deepcopy(nodes),
+                                          sb_test.TEST_IMAGES,
+                                          sb_test.TEST_FLAVORS)
+            results[mode] = [str(d) for d in strategy.directives()]
+            strategy.close()
+        CONF.clear_override('parallel_mode', 'simple_proportional_strategy')
+        self.assertNotEqual([], results['serial'])
+        self.assertEqual(results['serial'], results['thread'])
+        self.assertEqual(results['serial'], results['process'])
+
+    def test_parallel_pool_is_reused(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        CONF.set_override('parallel_mode', 'thread',
+                          group='simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'parallel_mode',
+                        'simple_proportional_strategy')
+        nodes = self.environments['random-nodes(144)']['nodes']
+        strategy = sps.SimpleProportionalStrategy()
+        self.addCleanup(strategy.close)
+        strategy.update_current_state(copy.deepcopy(nodes),
+                                      sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.directives()
+        pool = strategy.flavor_pool
+        self.assertIsNotNone(pool)
+        strategy.directives()
+        self.assertIs(pool, strategy.flavor_pool)
+        strategy.close()
+        self.assertIsNone(strategy.flavor_pool)
+
+    def test_process_mode_seeds_each_flavor(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        CONF.set_override('parallel_mode', 'process',
+                          group='simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'parallel_mode',
+                        'simple_proportional_strategy')
+        work = []
+
+        def map_flavor_directives(flavor_work, *args):
+            work.extend(flavor_work)
+            return []
+
+        self.patch(sps, 'map_flavor_directives', map_flavor_directives)
+        nodes = self.environments['random-nodes(144)']['nodes']
+        strategy = sps.SimpleProportionalStrategy()
+        self.addCleanup(strategy.close)
+        strategy.update_current_state(copy.deepcopy(nodes),
+                                      sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        strategy.directives()
+        seeds = [flavor_work[4] for flavor_work in work]
+        self.assertEqual(len(sb_test.TEST_FLAVORS), len(seeds))
+        self.assertNotIn(None, seeds)
+        self.assertEqual(len(seeds), len(set(seeds)))
+
+    def test_cached_copies_spread_across_domains(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        CONF.set_override('image_weights', {'Ubuntu': 1}, 'strategy')
+        CONF.set_override('default_image_weight', 0, 'strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        self.addCleanup(CONF.clear_override, 'default_image_weight',
+                        'strategy')
+        nodes = [sb.NodeInput('C-%s-%d' % (rack, n), 'Compute', False,
+                              False, None, rack)
+                 for rack in ('r1', 'r2', 'r3', 'r4') for n in range(10)]
+
+        def racks(directives):
+            return collections.Counter(d.node_uuid.split('-')[1]
+                                       for d in directives)
+
+        full = sps.SimpleProportionalStrategy()
+        full.update_current_state(copy.deepcopy(nodes), sb_test.TEST_IMAGES,
+                                  sb_test.TEST_FLAVORS)
+        self.assertEqual({'r1': 5, 'r2': 5, 'r3': 5, 'r4': 5},
+                         racks(full.directives()))
+
+        incremental = sps.SimpleProportionalStrategy()
+        incremental.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                         sb_test.TEST_FLAVORS)
+        incremental.apply_node_changes()
+        self.assertEqual({'r1': 5, 'r2': 5, 'r3': 5, 'r4': 5},
+                         racks(incremental.directives()))
+
+    def test_per_domain_limit(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        CONF.set_override('max_caching_per_domain', 2, 'strategy')
+        self.addCleanup(CONF.clear_override, 'max_caching_per_domain',
+                        'strategy')
+        nodes = [sb.NodeInput('C-%s-%d' % (rack, n), 'Compute', False,
+                              False, None, rack)
+                 for rack in ('r1', 'r2') for n in range(10)]
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        self.assertEqual(4, len(strategy.directives()))
+
+    def test_per_domain_limit_counts_caching_in_flight(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        CONF.set_override('max_caching_per_domain', 2, 'strategy')
+        self.addCleanup(CONF.clear_override, 'max_caching_per_domain',
+                        'strategy')
+        nodes = [sb.NodeInput('%s-%s-%d' % (flavor, rack, n),
+                              'Compute' if flavor == 'C' else 'IO', False,
+                              False, None, rack)
+                 for flavor in ('C', 'I') for rack in ('r1', 'r2')
+                 for n in range(10)]
+        # An earlier cycle's directive is still being carried out in r1.
+        nodes[0] = sb.NodeInput('C-r1-0', 'Compute', False, True, 'aaaa',
+                                'r1', is_caching=True)
+
+        full = sps.SimpleProportionalStrategy()
+        full.update_current_state(copy.deepcopy(nodes), sb_test.TEST_IMAGES,
+                                  sb_test.TEST_FLAVORS)
+        incremental = sps.SimpleProportionalStrategy()
+        incremental.update_current_state(copy.deepcopy(nodes),
+                                         sb_test.TEST_IMAGES,
+                                         sb_test.TEST_FLAVORS)
+        incremental.apply_node_changes()
+        for strategy in (full, incremental):
+            racks = collections.Counter(
+                d.node_uuid.split('-')[1] for d in strategy.directives())
+            # Both flavors share each rack's limit of two.
+            self.assertEqual({'r1': 1, 'r2': 2}, racks)
+
+    def _rebalance_nodes(self):
+        CONF.set_override('percentage_to_cache', 0.5,
+                          group='simple_proportional_strategy')
+        CONF.set_override('image_weights', {'Ubuntu': 1, 'CentOS': 1},
+                          'strategy')
+        CONF.set_override('default_image_weight', 0, 'strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        self.addCleanup(CONF.clear_override, 'default_image_weight',
+                        'strategy')
+        # Everything cached holds Ubuntu, though CentOS should get half.
+        nodes = [sb.NodeInput('C-%d' % n, 'Compute', False, True, 'aaaa')
+                 for n in range(10)]
+        nodes.extend(sb.NodeInput('C-%d' % n, 'Compute', False, False, None)
+                     for n in range(10, 20))
+        return nodes
+
+    def test_rebalance_ejections_are_capped(self):
+        nodes = self._rebalance_nodes()
+        CONF.set_override('rebalance_ejections_per_cycle', 2, 'strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_ejections_per_cycle',
+                        'strategy')
+
+        full = sps.SimpleProportionalStrategy()
+        full.update_current_state(copy.deepcopy(nodes), sb_test.TEST_IMAGES,
+                                  sb_test.TEST_FLAVORS)
+        incremental = sps.SimpleProportionalStrategy()
+        incremental.update_current_state(copy.deepcopy(nodes),
+                                         sb_test.TEST_IMAGES,
+                                         sb_test.TEST_FLAVORS)
+        incremental.apply_node_changes()
+
+        for strategy in (full, incremental):
+            directives = strategy.directives()
+            ejected = [d.node_uuid for d in directives
+                       if isinstance(d, sb.EjectNode)]
+            self.assertEqual(2, len(ejected))
+            self.assertTrue(all(int(node_uuid.split('-')[1]) < 10
+                                for node_uuid in ejected))
+            # Ejected nodes are not cached again in the same cycle, and each
+            # ejection is refilled with the under-cached image.
+            cached = [d for d in directives if isinstance(d, sb.CacheNode)]
+            self.assertEqual(['bbbb', 'bbbb'],
+                             [d.image_uuid for d in cached])
+            self.assertFalse(set(d.node_uuid for d in cached) &
+                             set(ejected))
+
+    def test_rebalance_marks_current_nodes(self):
+        nodes = self._rebalance_nodes()
+        CONF.set_override('rebalance_ejections_per_cycle', 2, 'strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_ejections_per_cycle',
+                        'strategy')
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(sb.NodeTable.from_nodes(nodes),
+                                      sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        ejected = [d.node_uuid for d in strategy.directives()
+                   if isinstance(d, sb.EjectNode)]
+        self.assertEqual(2, len(ejected))
+        table = strategy.current_nodes
+        self.assertEqual(sorted(ejected),
+                         sorted(table.node_uuids[index] for index
+                                in table.provisioned.nonzero()[0]))
+        self.assertEqual(2, sum(node.provisioned for node in nodes))
+
+    def test_rebalance_disabled_by_default(self):
+        nodes = self._rebalance_nodes()
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                      sb_test.TEST_FLAVORS)
+        self.assertEqual([], strategy.directives())
+
+    def test_rebalance_ejections_picks_over_cached_images(self):
+        images = sb_test.TEST_IMAGES[:2]
+        CONF.set_override('image_weights', {'Ubuntu': 1, 'CentOS': 1},
+                          'strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        nodes_by_image = {'aaaa': ['C-1', 'C-2', 'C-3'], 'bbbb': ['C-4']}
+        ejected = sps.rebalance_ejections(images, {'aaaa': 3, 'bbbb': 1}, 4,
+                                          nodes_by_image, 5,
+                                          random.Random(0))
+        self.assertEqual(1, len(ejected))
+        self.assertIn(ejected[0], nodes_by_image['aaaa'])
+        self.assertEqual([], sps.rebalance_ejections(
+            images, {'aaaa': 3, 'bbbb': 1}, 4, nodes_by_image, 0))
+
+    def test_excess_cached_images(self):
+        images = sb_test.TEST_IMAGES[:3]
+        CONF.set_override('image_weights',
+                          {'Ubuntu': 2, 'CentOS': 1, 'CoreOS': 1},
+                          'strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        # Shares of 8 cached nodes are 4, 2 and 2.
+        self.assertEqual({'aaaa': 2, 'cccc': 1}, sb.excess_cached_images(
+            images, {'aaaa': 6, 'bbbb': 0, 'cccc': 3}, 8))
+        self.assertEqual({}, sb.excess_cached_images(
+            images, {'aaaa': 4, 'bbbb': 2, 'cccc': 2}, 8))
+        # Shares of 5 are rounded up, so nothing is ejected only to be
+        # cached again.
+        self.assertEqual({}, sb.excess_cached_images(
+            images, {'aaaa': 3, 'bbbb': 1, 'cccc': 1}, 5))
+
+    def test_rebalance_ejections_are_minimal(self):
+        images = sb_test.TEST_IMAGES[:2]
+        CONF.set_override('image_weights', {'Ubuntu': 1, 'CentOS': 1},
+                          'strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        nodes_by_image = {'aaaa': ['C-%d' % n for n in range(6)]}
+        # Six Ubuntu nodes, with room for eight: two Ubuntu nodes ejected
+        # and four CentOS cached reach the distribution, and no plan with
+        # fewer operations does.
+        ejected = sps.rebalance_ejections(images, {'aaaa': 6}, 8,
+                                          nodes_by_image, 10,
+                                          random.Random(0))
+        self.assertEqual(2, len(ejected))
+        self.assertEqual(2, len(set(ejected) & set(nodes_by_image['aaaa'])))
+
+    def test_rebalance_respects_directive_budget(self):
+        nodes = self._rebalance_nodes()
+        CONF.set_override('rebalance_ejections_per_cycle', 5, 'strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_ejections_per_cycle',
+                        'strategy')
+        for budget, num_ejected in (({'eject': 1}, 1),
+                                    ({'cache': 3}, 3),
+                                    ({'cache': 0}, 0),
+                                    ({}, 5)):
+            strategy = sps.SimpleProportionalStrategy()
+            strategy.update_current_state(copy.deepcopy(nodes),
+                                          sb_test.TEST_IMAGES,
+                                          sb_test.TEST_FLAVORS)
+            strategy.set_directive_budget(**budget)
+            directives = strategy.directives()
+            ejected = [d for d in directives if isinstance(d, sb.EjectNode)]
+            cached = [d for d in directives if isinstance(d, sb.CacheNode)]
+            self.assertEqual(num_ejected, len(ejected))
+            # Every ejection is refilled in the same cycle.
+            self.assertEqual(num_ejected, len(cached))
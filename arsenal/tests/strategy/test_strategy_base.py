@@ -29,6 +29,7 @@ import mock
 from oslo_config import cfg
 
 from arsenal.strategy import base as sb
+from arsenal.strategy import image_catalog
 from arsenal.tests import base as test_base
 
 CONF = cfg.CONF
@@ -221,6 +222,46 @@ class TestNodeStatistics(test_base.TestCase):
         EXPECTED_IMAGE_NAMES = ['Ubuntu', 'CentOS', 'CoreOS', 'wasd']
         self.assertItemsEqual(EXPECTED_IMAGE_NAMES, stats['images'].keys())
 
+    def test_build_fleet_statistics(self):
+        nodes = list(self.test_nodes)
+        nodes.extend([
+            sb.NodeInput('i-1', 'IO', False, True, 'aaaa'),
+            sb.NodeInput('i-2', 'IO', False, False, None),
+            sb.NodeInput('i-3', 'IO', True, True, 'dddd'),
+            sb.NodeInput('x-1', 'Unknown', False, True, 'bbbb'),
+        ])
+        stats = sb.build_fleet_statistics(nodes, TEST_FLAVORS, TEST_IMAGES)
+
+        self.assertEqual(sb.build_node_statistics(nodes, TEST_IMAGES),
+                         stats.overall.as_dict())
+        self.assertItemsEqual([f.name for f in TEST_FLAVORS],
+                              stats.by_flavor.keys())
+        for flavor in TEST_FLAVORS:
+            flavor_nodes = [n for n in nodes if n.flavor == flavor.name]
+            self.assertEqual(
+                sb.build_node_statistics(flavor_nodes, TEST_IMAGES),
+                stats.by_flavor[flavor.name].as_dict())
+
+        self.assertEqual(3, stats.by_flavor['IO'].total)
+        self.assertEqual(2, stats.by_flavor['IO'].not_provisioned)
+        self.assertEqual({'Ubuntu': 1}, stats.by_flavor['IO'].images)
+        self.assertEqual(0, stats.by_flavor['Memory'].total)
+        self.assertEqual(4, stats.overall.images['Ubuntu'])
+
+    def test_build_fleet_statistics_no_nodes(self):
+        stats = sb.build_fleet_statistics([], TEST_FLAVORS, TEST_IMAGES)
+        self.assertEqual(0, stats.overall.total)
+        self.assertEqual({}, stats.overall.images)
+
+    @mock.patch.object(sb.LOG, 'info')
+    def test_log_overall_node_statistics_returns_statistics(self,
+                                                            info_log_mock):
+        stats = sb.log_overall_node_statistics(self.test_nodes, TEST_FLAVORS,
+                                               TEST_IMAGES)
+        self.assertTrue(info_log_mock.called)
+        self.assertEqual(13, stats.overall.total)
+        self.assertEqual(13, stats.by_flavor['Compute'].total)
+
         @mock.patch.object(sb.LOG, 'info')
         def test_log_node_statistics(self, info_log_mock):
             stats = sb.build_node_statistics(self.test_nodes, TEST_IMAGES)
@@ -228,6 +269,165 @@ class TestNodeStatistics(test_base.TestCase):
             self.assertTrue(info_log_mock.called)
 
 
+class TestStrategyInputsAndActions(test_base.TestCase):
+
+    def test_inputs_and_actions_have_no_instance_dict(self):
+        objects = [
+            sb.NodeInput('c-1', 'Compute', False, True, 'aaaa'),
+            sb.ImageInput('Ubuntu', 'aaaa', 'abcd'),
+            sb.FlavorInput('Compute', lambda node: True),
+            sb.CacheNode('c-1', 'aaaa', 'abcd'),
+            sb.EjectNode('c-1'),
+        ]
+        for obj in objects:
+            self.assertFalse(hasattr(obj, '__dict__'),
+                             "%s should not have an instance __dict__." %
+                             type(obj).__name__)
+
+    def test_identifiers_are_interned(self):
+        flavor = ''.join(['Com', 'pute'])
+        image_uuid = ''.join(['aa', 'aa'])
+        first = sb.NodeInput('c-1', 'Compute', False, True, 'aaaa')
+        second = sb.NodeInput('c-2', flavor, False, True, image_uuid)
+        self.assertIs(first.flavor, second.flavor)
+        self.assertIs(first.cached_image_uuid, second.cached_image_uuid)
+        self.assertIs(sb.ImageInput('Ubuntu', image_uuid, 'abcd').uuid,
+                      first.cached_image_uuid)
+
+    def test_interned_identifiers_are_cleared(self):
+        sb.NodeInput('c-1', 'Retired', False, True, 'zzzz')
+        self.assertIn('Retired', sb._interned_identifiers)
+        sb.clear_interned_identifiers()
+        self.assertNotIn('Retired', sb._interned_identifiers)
+        flavor = ''.join(['Reti', 'red'])
+        self.assertIs(flavor, sb.NodeInput('c-2', flavor).flavor)
+
+    def test_action_formatting(self):
+        self.assertEqual("CacheNode: Cache image 'aaaa' on node 'c-1'.",
+                         str(sb.CacheNode('c-1', 'aaaa', 'abcd')))
+        self.assertEqual("EjectNode: Eject node 'c-1' from cache.",
+                         str(sb.EjectNode('c-1')))
+        self.assertEqual('EjectNode', sb.EjectNode('c-1').name)
+
+
+class ListStrategy(sb.CachingStrategy):
+    """A CachingStrategy relying on the default apply_node_changes."""
+
+    def update_current_state(self, nodes, images, flavors):
+        self.current_nodes = nodes
+        self.current_images = images
+        self.current_flavors = flavors
+
+    def directives(self):
+        return []
+
+
+class TestCachingStrategy(test_base.TestCase):
+
+    def test_default_apply_node_changes(self):
+        strategy = ListStrategy()
+        strategy.update_current_state(
+            [sb.NodeInput('node-a', 'flavor'),
+             sb.NodeInput('node-b', 'flavor'),
+             sb.NodeInput('node-c', 'flavor')], ['image'], ['flavor'])
+        strategy.apply_node_changes(
+            added=[sb.NodeInput('node-d', 'flavor')],
+            changed=[sb.NodeInput('node-a', 'flavor', True)],
+            removed=['node-b'])
+        self.assertEqual(['node-a', 'node-c', 'node-d'],
+                         [node.node_uuid for node in strategy.current_nodes])
+        self.assertTrue(strategy.current_nodes[0].provisioned)
+        self.assertEqual(['image'], strategy.current_images)
+        self.assertEqual(['flavor'], strategy.current_flavors)
+
+
+class TestNodeTable(test_base.TestCase):
+
+    def setUp(self):
+        super(TestNodeTable, self).setUp()
+        self.test_nodes = [
+            sb.NodeInput('c-1', 'Compute', False, True, 'aaaa'),
+            sb.NodeInput('c-2', 'Compute', True, True, 'aaaa'),
+            sb.NodeInput('i-1', 'IO', False, False, None),
+            sb.NodeInput('i-2', 'IO', False, True, 'bbbb'),
+            sb.NodeInput('m-1', 'Memory', True, False, ''),
+            sb.NodeInput('c-3', 'Compute', False, True, 'bbbb'),
+        ]
+        self.table = sb.NodeTable.from_nodes(self.test_nodes)
+
+    def test_from_nodes_returns_existing_table(self):
+        self.assertIs(self.table, sb.NodeTable.from_nodes(self.table))
+
+    def test_rows_are_original_nodes(self):
+        self.assertEqual(len(self.test_nodes), len(self.table))
+        for node, row in zip(self.test_nodes, self.table):
+            self.assertIs(node, row)
+
+    def test_domains(self):
+        table = sb.NodeTable()
+        table.append('n-1', 'Compute', domain='rack-1')
+        table.append('n-2', 'Compute')
+        table.append('n-3', 'Compute', domain='rack-1')
+        self.assertEqual(['rack-1'], table.domain_names)
+        self.assertEqual('rack-1', table.domain_name(0))
+        self.assertIsNone(table.domain_name(1))
+        self.assertEqual('rack-1', table[2].domain)
+        subset = table.select([1, 2])
+        self.assertEqual([sb.NO_DOMAIN, 0], subset.domains.tolist())
+
+    def test_append_grows_and_builds_rows(self):
+        table = sb.NodeTable()
+        for n in range(200):
+            table.append('n-%d' % n, 'Compute', n % 2 == 0, n % 3 == 0,
+                         'aaaa' if n % 3 == 0 else None)
+        self.assertEqual(200, len(table))
+        self.assertEqual(['Compute'], table.flavor_names)
+        self.assertEqual(['aaaa'], table.image_uuids)
+        row = table[3]
+        self.assertEqual('n-3', row.node_uuid)
+        self.assertFalse(row.provisioned)
+        self.assertTrue(row.cached)
+        self.assertEqual('aaaa', row.cached_image_uuid)
+        self.assertIsNone(table[-1].cached_image_uuid)
+        self.assertIs(row, table[3])
+        self.assertRaises(IndexError, lambda: table[200])
+
+    def test_masks(self):
+        self.assertEqual([False, False, True, False, False, False],
+                         self.table.available_mask().tolist())
+        self.assertEqual([True, False, True, True, False, True],
+                         self.table.unprovisioned_mask().tolist())
+        self.assertEqual([True, False, False, True, False, True],
+                         self.table.cached_mask().tolist())
+
+    def test_image_distribution(self):
+        self.assertEqual({'aaaa': 1, 'bbbb': 2},
+                         self.table.image_distribution())
+
+    def test_group_by_flavor(self):
+        groups = self.table.group_by_flavor()
+        self.assertItemsEqual(['Compute', 'IO', 'Memory'], groups.keys())
+        self.assertEqual([0, 1, 5], groups['Compute'].tolist())
+        self.assertEqual([2, 3], groups['IO'].tolist())
+        self.assertEqual([4], groups['Memory'].tolist())
+
+    def test_select_and_mark_provisioned(self):
+        subset = self.table.select(self.table.group_by_flavor()['IO'])
+        self.assertEqual(['i-1', 'i-2'], subset.node_uuids)
+        self.assertEqual({'bbbb': 1}, subset.image_distribution())
+        self.assertEqual(0, len(self.table.select([])))
+
+        subset.mark_provisioned(subset.cached_mask())
+        self.assertTrue(self.test_nodes[3].provisioned)
+        self.assertEqual([False, True], subset.provisioned.tolist())
+
+    def test_mark_cached(self):
+        self.table.mark_cached([0], 'eeee')
+        self.assertTrue(self.test_nodes[0].cached)
+        self.assertEqual('eeee', self.test_nodes[0].cached_image_uuid)
+        self.assertEqual('eeee', self.table.image_uuids[self.table.images[0]])
+
+
 class TestImageWeights(test_base.TestCase):
 
     def setUp(self):
@@ -277,6 +477,40 @@ class TestImageWeights(test_base.TestCase):
         for key, value in weights_by_name.iteritems():
             self.assertEqual(CONF.strategy.default_image_weight, value)
 
+    def test_image_weight_table(self):
+        table = sb.get_image_weight_table(TEST_IMAGES)
+        self.assertEqual(
+            [sb.get_image_weights([image.name])[image.name]
+             for image in TEST_IMAGES],
+            table.weights.tolist())
+        self.assertAlmostEqual(1.0, table.normalized.sum())
+        self.assertEqual(table.weights_by_name['Ubuntu'] * 2,
+                         table.scaled_weights(table.weight_sum * 2)[0])
+
+        # Reused until the images or the weight options change.
+        self.assertIs(table, sb.get_image_weight_table(list(TEST_IMAGES)))
+        self.assertIsNot(table, sb.get_image_weight_table(TEST_IMAGES[1:]))
+        table = sb.get_image_weight_table(TEST_IMAGES)
+        CONF.set_override('default_image_weight', 7, 'strategy')
+        self.addCleanup(CONF.clear_override, 'default_image_weight',
+                        'strategy')
+        self.assertIsNot(table, sb.get_image_weight_table(TEST_IMAGES))
+
+    def test_image_weight_table_with_catalog(self):
+        catalog = image_catalog.ImageCatalog(TEST_IMAGES)
+        table = sb.get_image_weight_table(catalog)
+        self.assertIs(table, sb.get_image_weight_table(catalog))
+        catalog.update(TEST_IMAGES[1:])
+        table = sb.get_image_weight_table(catalog)
+        self.assertEqual([image.name for image in TEST_IMAGES[1:]],
+                         [image.name for image in table.images])
+
+    def test_image_weight_table_all_zero(self):
+        table = sb.ImageWeightTable(TEST_IMAGES, {}, 0)
+        self.assertEqual(0, table.weight_sum)
+        self.assertEqual(1, table.scale_factor(10))
+        self.assertEqual([0] * len(TEST_IMAGES), table.normalized.tolist())
+
     def test_determine_image_distribution(self):
         TEST_NODE_SET = [
             sb.NodeInput('c-1', 'compute', False, True, 'aaaa'),
@@ -486,3 +720,283 @@ class TestImageWeights(test_base.TestCase):
             # our general expectation.
             self.assertEqual(expected_sorted_ejection_list,
                              sorted_ejection_list)
+
+
+def legacy_pick_images(distribution_difference, num_images, picker_func,
+                       distribution_mutator_func):
+    """The deepcopy and max()/min() based picker _pick_images replaced."""
+    difference_dict = copy.deepcopy(distribution_difference)
+    picked_images = []
+    for n in range(0, num_images):
+        most_needed_image_pair = picker_func(difference_dict)
+        picked_images.append(most_needed_image_pair[0])
+        distribution_mutator_func(most_needed_image_pair, difference_dict)
+    return picked_images
+
+
+def legacy_pick_largest(distribution_difference, num_images):
+    def decrement_distribution(distribution_pair, diff_dict):
+        distribution_pair[1] -= 1
+
+    return legacy_pick_images(
+        distribution_difference, num_images,
+        picker_func=lambda diff: max(diff, key=lambda pair: pair[1]),
+        distribution_mutator_func=decrement_distribution)
+
+
+def legacy_pick_smallest(distribution_difference, num_images):
+    def increment_distribution(distribution_pair, diff_dict):
+        distribution_pair[1] += 1
+
+    return legacy_pick_images(
+        distribution_difference, num_images,
+        picker_func=lambda diff: min(diff, key=lambda pair: pair[1]),
+        distribution_mutator_func=increment_distribution)
+
+
+class TestPickImagesCompatibility(test_base.TestCase):
+    """_pick_images must return the same sequence as the legacy picker."""
+
+    def setUp(self):
+        super(TestPickImagesCompatibility, self).setUp()
+        self.rng = random.Random(1234)
+
+    def _random_difference(self, num_images, integral):
+        difference = []
+        for n in range(num_images):
+            if integral:
+                # Small integral ranges produce plenty of ties.
+                value = self.rng.randint(-5, 5)
+            else:
+                value = self.rng.uniform(-50, 50)
+            difference.append([sb.ImageInput('image-%d' % n,
+                                             'uuid-%d' % n,
+                                             'checksum-%d' % n),
+                               value])
+        return difference
+
+    def _assert_same_names(self, expected, actual):
+        self.assertEqual([image.name for image in expected],
+                         [image.name for image in actual])
+
+    def test_randomized_matches_legacy(self):
+        for trial in range(200):
+            difference = self._random_difference(
+                self.rng.randint(1, 12), integral=trial % 2 == 0)
+            num_images = self.rng.randint(0, 60)
+            self._assert_same_names(
+                legacy_pick_largest(difference, num_images),
+                sb._pick_images(difference, num_images, pick_largest=True))
+            self._assert_same_names(
+                legacy_pick_smallest(difference, num_images),
+                sb._pick_images(difference, num_images, pick_largest=False))
+
+    def test_inputs_are_not_copied_or_modified(self):
+        difference = self._random_difference(5, integral=True)
+        values = [pair[1] for pair in difference]
+        picked = sb._pick_images(difference, 20)
+        self.assertEqual(values, [pair[1] for pair in difference])
+        input_images = [pair[0] for pair in difference]
+        for image in picked:
+            self.assertTrue(any(image is i for i in input_images))
+
+    def test_weighted_selection_matches_legacy(self):
+        CONF.set_override('image_weights',
+                          {'Ubuntu': 5, 'CoreOS': 10, 'Windows': 3},
+                          'strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        for trial in range(20):
+            nodes = []
+            for n in range(self.rng.randint(0, 300)):
+                image = self.rng.choice(TEST_IMAGES)
+                nodes.append(sb.NodeInput('c-%d' % n, 'compute',
+                                          self.rng.random() < 0.3,
+                                          self.rng.random() < 0.5,
+                                          image.uuid))
+            num_images = self.rng.randint(0, 100)
+
+            named_distribution = sb._get_named_image_distribution(
+                TEST_IMAGES, nodes)
+            scaled_weights = sb._get_scaled_weights(
+                TEST_IMAGES, sb._get_scale_factor_for_caching_nodes(
+                    num_images, TEST_IMAGES, nodes))
+            difference = [[image, (scaled_weights[image.name] -
+                                   named_distribution[image.name])]
+                          for image in TEST_IMAGES]
+            self._assert_same_names(
+                legacy_pick_largest(difference, num_images),
+                sb.choose_weighted_images_forced_distribution(
+                    num_images, TEST_IMAGES, nodes))
+
+
+class TestApportionment(test_base.TestCase):
+
+    def setUp(self):
+        super(TestApportionment, self).setUp()
+        # A textbook example where D'Hondt favours the largest image.
+        self.difference = [[sb.ImageInput('image-%d' % n, 'uuid-%d' % n,
+                                          'checksum-%d' % n), votes]
+                           for n, votes in enumerate([100000, 80000,
+                                                      30000, 20000])]
+
+    def _counts(self, method, seats):
+        return [count for image, count in
+                sb._apportion(self.difference, seats, method)]
+
+    def test_hamilton(self):
+        self.assertEqual([3, 3, 1, 1], self._counts('hamilton', 8))
+
+    def test_dhondt(self):
+        self.assertEqual([4, 3, 1, 0], self._counts('dhondt', 8))
+        self.assertEqual([5, 4, 1, 1], self._counts('dhondt', 11))
+
+    def test_sainte_lague(self):
+        self.assertEqual([3, 3, 1, 1], self._counts('sainte-lague', 8))
+
+    def test_divisor_methods_are_house_monotone(self):
+        for method in ('dhondt', 'sainte-lague'):
+            previous = [0] * len(self.difference)
+            for seats in range(0, 200):
+                counts = self._counts(method, seats)
+                self.assertEqual(seats, sum(counts))
+                self.assertTrue(all(c >= p for c, p in zip(counts,
+                                                           previous)))
+                previous = counts
+
+    def test_only_underweighted_images_get_nodes(self):
+        self.difference[1][1] = -10
+        for method in ('hamilton', 'dhondt', 'sainte-lague'):
+            counts = self._counts(method, 50)
+            self.assertEqual(50, sum(counts))
+            self.assertEqual(0, counts[1])
+
+    def test_no_underweighted_images_splits_evenly(self):
+        for pair in self.difference:
+            pair[1] = -1
+        self.assertEqual([2, 2, 2, 2], self._counts('hamilton', 8))
+
+    def test_unknown_method(self):
+        self.assertRaises(ValueError, sb._apportion, self.difference, 5,
+                          'coin-toss')
+
+    def test_expand_apportionment_interleaves(self):
+        images = [pair[0] for pair in self.difference]
+        expanded = sb.expand_apportionment([(images[0], 3), (images[1], 0),
+                                            (images[2], 1), (images[3], 2)])
+        self.assertEqual([images[0], images[2], images[3], images[0],
+                          images[3], images[0]],
+                         list(expanded))
+
+    def test_apportion_images_matches_target(self):
+        CONF.set_override('image_weights', {'Ubuntu': 5, 'CoreOS': 10},
+                          'strategy')
+        self.addCleanup(CONF.clear_override, 'image_weights', 'strategy')
+        nodes = [sb.NodeInput('c-%d' % n, 'compute', False, False, None)
+                 for n in range(100)]
+        for method in ('hamilton', 'dhondt', 'sainte-lague'):
+            counts = dict((image.name, count) for image, count in
+                          sb.apportion_images(19, TEST_IMAGES, nodes,
+                                              method=method))
+            # Weights are 5, 1, 10, 1, 1 for a total of 18.
+            self.assertEqual(19, sum(counts.values()))
+            self.assertAlmostEqual(19 * 5 / 18, counts['Ubuntu'], delta=1)
+            self.assertAlmostEqual(19 * 10 / 18, counts['CoreOS'], delta=1)
+
+    def test_choose_weighted_images_uses_configured_method(self):
+        nodes = [sb.NodeInput('c-%d' % n, 'compute', False, False, None)
+                 for n in range(10)]
+        for method in ('hamilton', 'dhondt', 'sainte-lague'):
+            CONF.set_override('apportionment_method', method, 'strategy')
+            self.addCleanup(CONF.clear_override, 'apportionment_method',
+                            'strategy')
+            picked = sb.choose_weighted_images_forced_distribution(
+                10, TEST_IMAGES, nodes)
+            self.assertEqual(10, len(picked))
+            counts = collections.Counter(image.name for image in picked)
+            self.assertEqual(set([2]), set(counts.values()))
+
+
+class TestSpreadAcrossDomains(test_base.TestCase):
+
+    def _domains(self, placements, candidates):
+        domain_by_node = dict(candidates)
+        return collections.Counter((image.name, domain_by_node[node_uuid])
+                                   for node_uuid, image in placements)
+
+    def test_spreads_each_image(self):
+        candidates = [('%s-%d' % (rack, n), rack)
+                      for rack in ('r1', 'r2', 'r3') for n in range(5)]
+        images = [TEST_IMAGES[0]] * 6 + [TEST_IMAGES[1]] * 3
+        placements = sb.spread_across_domains(candidates, images,
+                                              rng=random.Random(0))
+        self.assertEqual(9, len(placements))
+        self.assertEqual(9, len(set(node for node, image in placements)))
+        self.assertEqual({('Ubuntu', 'r1'): 2, ('Ubuntu', 'r2'): 2,
+                          ('Ubuntu', 'r3'): 2, ('CentOS', 'r1'): 1,
+                          ('CentOS', 'r2'): 1, ('CentOS', 'r3'): 1},
+                         self._domains(placements, candidates))
+
+    def test_existing_copies_are_avoided(self):
+        candidates = [('a-1', 'r1'), ('a-2', 'r1'), ('b-1', 'r2')]
+        placements = sb.spread_across_domains(
+            candidates, [TEST_IMAGES[0]], {('aaaa', 'r2'): 1},
+            rng=random.Random(0))
+        self.assertEqual({('Ubuntu', 'r1'): 1},
+                         self._domains(placements, candidates))
+
+    def test_per_domain_limit(self):
+        candidates = ([('a-%d' % n, 'r1') for n in range(5)] +
+                      [('b-%d' % n, 'r2') for n in range(5)] +
+                      [('c-%d' % n, None) for n in range(3)])
+        placements = sb.spread_across_domains(
+            candidates, [TEST_IMAGES[0]] * 10, max_per_domain=2,
+            rng=random.Random(0))
+        counts = collections.Counter(
+            dict(candidates)[node_uuid] for node_uuid, image in placements)
+        self.assertEqual({'r1': 2, 'r2': 2, None: 3}, counts)
+
+    def test_per_domain_limit_counts_caching_in_flight(self):
+        candidates = ([('a-%d' % n, 'r1') for n in range(5)] +
+                      [('b-%d' % n, 'r2') for n in range(5)])
+        in_flight = collections.Counter({'r1': 1, 'r2': 2})
+        placements = sb.spread_across_domains(
+            candidates, [TEST_IMAGES[0]] * 10, max_per_domain=2,
+            rng=random.Random(0), in_flight=in_flight)
+        self.assertEqual(['r1'], [dict(candidates)[node_uuid]
+                                  for node_uuid, image in placements])
+        self.assertEqual({'r1': 2, 'r2': 2}, in_flight)
+
+
+class TestSampleNodes(test_base.TestCase):
+
+    def test_sample_sizes(self):
+        for candidates in (range(10), iter(range(10))):
+            sample = sb.sample_nodes(candidates, 4, random.Random(0))
+            self.assertEqual(4, len(sample))
+            self.assertEqual(4, len(set(sample)))
+            self.assertTrue(set(sample) <= set(range(10)))
+        self.assertItemsEqual(range(3), sb.sample_nodes(range(3), 5))
+        self.assertItemsEqual(range(3), sb.sample_nodes(iter(range(3)), 5))
+        self.assertEqual([], sb.sample_nodes(range(3), 0))
+
+    def test_seed_is_reproducible(self):
+        for make_candidates in (lambda: range(1000),
+                                lambda: iter(range(1000))):
+            self.assertEqual(sb.sample_nodes(make_candidates(), 10, seed=7),
+                             sb.sample_nodes(make_candidates(), 10, seed=7))
+
+    def test_sequence_is_not_modified(self):
+        candidates = list(range(20))
+        sb.sample_nodes(candidates, 20)
+        self.assertEqual(list(range(20)), candidates)
+
+    def test_samples_are_uniform(self):
+        rng = random.Random(0)
+        for make_candidates in (lambda: range(20), lambda: iter(range(20))):
+            counts = collections.Counter()
+            for n in range(2000):
+                counts.update(sb.sample_nodes(make_candidates(), 5, rng))
+            # Each candidate is expected 500 times.
+            self.assertEqual(20, len(counts))
+            self.assertTrue(all(400 < count < 600
+                                for count in counts.values()), counts)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the memory used by strategy inputs and directives.
+
+Compares the dict-backed representations Arsenal used to have against the
+current __slots__ based classes in arsenal.strategy.base, reporting bytes
+per object for a synthetic fleet. Run from the root of the repository:
+
+    python tools/benchmarks/memory_benchmark.py --nodes 100000
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import sys
+import uuid
+
+from arsenal.strategy import base as sb
+
+FLAVORS = ['onmetal-compute1', 'onmetal-io1', 'onmetal-memory1']
+IMAGES = ['ubuntu-14.04', 'ubuntu-14.10', 'coreos', 'centos-7', 'debian-8']
+
+
+class LegacyNodeInput(object):
+    def __init__(self, node_uuid, flavor, is_provisioned=False,
+                 is_cached=False, image_uuid=''):
+        self.node_uuid = node_uuid
+        self.flavor = flavor
+        self.provisioned = is_provisioned
+        self.cached = is_cached
+        self.cached_image_uuid = image_uuid
+
+
+class LegacyImageInput(object):
+    def __init__(self, name, uuid, checksum):
+        self.name = name
+        self.uuid = uuid
+        self.checksum = checksum
+
+
+class LegacyCacheNode(object):
+    def __init__(self, node_uuid, image_uuid, image_checksum):
+        self.name = self.__class__.__name__
+        self.format_string = "{0}: Cache image '{1}' on node '{2}'."
+        self.format_attrs = ['name', 'image_uuid', 'node_uuid']
+        self.node_uuid = node_uuid
+        self.image_uuid = image_uuid
+        self.image_checksum = image_checksum
+
+
+class LegacyEjectNode(object):
+    def __init__(self, node_uuid):
+        self.name = self.__class__.__name__
+        self.format_string = "{0}: Eject node '{1}' from cache."
+        self.format_attrs = ['name', 'node_uuid']
+        self.node_uuid = node_uuid
+
+
+def copy_string(value):
+    """Return an equal string that is a distinct object.
+
+    Decoded API responses hand out a new string for every occurrence of a
+    flavor name or image UUID, which is what this simulates.
+    """
+    return (value + '.')[:-1]
+
+
+def deep_sizeof(objects):
+    """Total size in bytes of objects and everything they reference.
+
+    Each distinct object is counted once, so shared (interned) strings only
+    contribute their size a single time. Class-level attributes are not
+    counted.
+    """
+    seen = set()
+    total = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or obj is None or isinstance(obj, (bool, type)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for klass in type(obj).__mro__:
+                for slot in getattr(klass, '__slots__', ()):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+    return total
+
+
+def build_fleet(num_nodes, node_class, rng):
+    image_uuids = [str(uuid.UUID(int=rng.getrandbits(128)))
+                   for image in IMAGES]
+    nodes = []
+    for n in range(num_nodes):
+        cached = rng.random() < 0.2
+        nodes.append(node_class(
+            str(uuid.UUID(int=rng.getrandbits(128))),
+            copy_string(rng.choice(FLAVORS)),
+            rng.random() < 0.5,
+            cached,
+            copy_string(rng.choice(image_uuids)) if cached else ''))
+    return nodes
+
+
+def build_images(image_class):
+    return [image_class(copy_string(name), str(uuid.uuid4()),
+                        str(uuid.uuid4()).replace('-', ''))
+            for name in IMAGES]
+
+
+def build_directives(nodes, cache_class, eject_class):
+    directives = []
+    for node in nodes:
+        if node.cached:
+            directives.append(eject_class(node.node_uuid))
+        else:
+            directives.append(cache_class(node.node_uuid,
+                                          copy_string(node.cached_image_uuid),
+                                          'checksum'))
+    return directives
+
+
+def measure(label, objects):
+    total = deep_sizeof(objects) - sys.getsizeof(objects)
+    return label, len(objects), total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=100000,
+                        help='Number of nodes in the synthetic fleet.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the synthetic fleet generator.')
+    args = parser.parse_args()
+
+    results = []
+    for prefix, node_cls, image_cls, cache_cls, eject_cls in (
+            ('before', LegacyNodeInput, LegacyImageInput, LegacyCacheNode,
+             LegacyEjectNode),
+            ('after', sb.NodeInput, sb.ImageInput, sb.CacheNode,
+             sb.EjectNode)):
+        nodes = build_fleet(args.nodes, node_cls, random.Random(args.seed))
+        results.append(measure('%s NodeInput' % prefix, nodes))
+        results.append(measure('%s ImageInput' % prefix,
+                               build_images(image_cls)))
+        results.append(measure('%s directives' % prefix,
+                               build_directives(nodes, cache_cls, eject_cls)))
+
+    print("%-22s %10s %14s %12s" % ('representation', 'objects',
+                                    'total bytes', 'bytes/obj'))
+    for label, count, total in results:
+        print("%-22s %10d %14d %12.1f" % (label, count, total,
+                                          total / float(count or 1)))
+
+
+if __name__ == '__main__':
+    main()
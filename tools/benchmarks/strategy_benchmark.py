@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2015 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the hot paths of the caching strategies on synthetic fleets.
+
+For each requested fleet size, builds a synthetic fleet and measures wall
+time, peak memory and allocations of:
+
+    SimpleProportionalStrategy.directives
+    build_node_statistics
+    choose_weighted_images_forced_distribution
+    image_weight_guided_ejection
+
+Results can be written out as JSON and compared against a saved baseline.
+Run from the root of the repository, for example:
+
+    python tools/benchmarks/strategy_benchmark.py --nodes 1000 100000 \\
+        --output results.json
+    python tools/benchmarks/strategy_benchmark.py --nodes 1000 100000 \\
+        --baseline results.json
+
+The exit status is 1 if any function got slower than the baseline by more
+than --tolerance.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import uuid
+
+from oslo_config import cfg
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import simple_proportional_strategy as sps
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CONF = cfg.CONF
+
+
+class Fleet(object):
+    """A synthetic fleet: nodes, flavors, images and image weights."""
+
+    def __init__(self, nodes, flavors, images, image_weights, params):
+        self.nodes = nodes
+        self.flavors = flavors
+        self.images = images
+        self.image_weights = image_weights
+        self.params = params
+
+
+def _flavor_matcher(flavor_name):
+    return lambda node: node.flavor == flavor_name
+
+
+def generate_fleet(num_nodes, num_flavors=3, num_images=5, skew=1.0,
+                   cached_ratio=0.1, provisioned_ratio=0.5, seed=0):
+    """Build a synthetic fleet.
+
+    Image weights follow a Zipf-like curve, weight = 100 / rank ** skew, so a
+    skew of 0 weights every image the same and larger values concentrate the
+    weight on the first few images. Of the unprovisioned nodes, cached_ratio
+    hold a cached image, chosen according to the same weights.
+    """
+    rng = random.Random(seed)
+    flavors = [sb.FlavorInput('flavor-%d' % n,
+                              _flavor_matcher('flavor-%d' % n))
+               for n in range(num_flavors)]
+    images = [sb.ImageInput('image-%d' % n,
+                            str(uuid.UUID(int=rng.getrandbits(128))),
+                            '%032x' % rng.getrandbits(128))
+              for n in range(num_images)]
+    image_weights = {
+        image.name: max(1, int(round(100 / (rank + 1) ** skew)))
+        for rank, image in enumerate(images)}
+
+    cumulative = []
+    total = 0
+    for image in images:
+        total += image_weights[image.name]
+        cumulative.append(total)
+
+    def weighted_image():
+        pick = rng.random() * total
+        for image, bound in zip(images, cumulative):
+            if pick < bound:
+                return image
+        return images[-1]
+
+    nodes = sb.NodeTable(capacity=num_nodes)
+    for n in range(num_nodes):
+        provisioned = rng.random() < provisioned_ratio
+        cached = not provisioned and rng.random() < cached_ratio
+        nodes.append(str(uuid.UUID(int=rng.getrandbits(128))),
+                     flavors[n % num_flavors].name, provisioned, cached,
+                     weighted_image().uuid if cached else None)
+
+    params = {'nodes': num_nodes, 'flavors': num_flavors,
+              'images': num_images, 'skew': skew,
+              'cached_ratio': cached_ratio,
+              'provisioned_ratio': provisioned_ratio, 'seed': seed}
+    return Fleet(nodes, flavors, images, image_weights, params)
+
+
+def measure(func, repeat):
+    """Call func repeat times, returning its wall time, peak memory and
+    allocations.
+
+    Wall time is the best of all runs. With tracemalloc (Python 3.4+) peak
+    memory is the peak traced during the first run and allocations count the
+    blocks still allocated after it. Without it, peak memory is the growth of
+    the process' maximum resident set size and allocations count new
+    garbage-collected objects, both much coarser.
+    """
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        result = func()
+        after = tracemalloc.take_snapshot()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        allocations = sum(stat.count_diff for stat in
+                          after.compare_to(before, 'filename'))
+    else:
+        objects_before = len(gc.get_objects())
+        rss_before = _max_rss_bytes()
+        result = func()
+        peak_bytes = _max_rss_bytes() - rss_before
+        allocations = len(gc.get_objects()) - objects_before
+    del result
+
+    timings = []
+    for n in range(repeat):
+        gc.collect()
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+
+    return {'wall_seconds': min(timings),
+            'peak_bytes': peak_bytes,
+            'allocations': allocations}
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS.
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def benchmark_fleet(fleet, repeat):
+    """Measure each strategy function against fleet."""
+    CONF.set_override('image_weights', fleet.image_weights, 'strategy')
+    cached = fleet.nodes.select(fleet.nodes.cached_mask())
+    num_to_cache = max(1, int(len(fleet.nodes) * 0.01))
+
+    def directives():
+        strategy = sps.SimpleProportionalStrategy()
+        strategy.update_current_state(fleet.nodes, fleet.images,
+                                      fleet.flavors)
+        return strategy.directives()
+
+    def node_statistics():
+        return sb.build_node_statistics(fleet.nodes, fleet.images)
+
+    def forced_distribution():
+        return sb.choose_weighted_images_forced_distribution(
+            num_to_cache, fleet.images, fleet.nodes)
+
+    def guided_ejection():
+        return sb.image_weight_guided_ejection(fleet.images, cached)
+
+    results = []
+    try:
+        for name, func in (('directives', directives),
+                           ('build_node_statistics', node_statistics),
+                           ('choose_weighted_images_forced_distribution',
+                            forced_distribution),
+                           ('image_weight_guided_ejection',
+                            guided_ejection)):
+            result = {'function': name, 'params': fleet.params}
+            result.update(measure(func, repeat))
+            results.append(result)
+    finally:
+        CONF.clear_override('image_weights', 'strategy')
+    return results
+
+
+def result_key(result):
+    return '%s %s' % (result['function'],
+                      json.dumps(result['params'], sort_keys=True))
+
+
+def compare(results, baseline, tolerance):
+    """Return (key, baseline seconds, current seconds) for each result
+    slower than its baseline by more than tolerance.
+    """
+    baseline_by_key = {result_key(result): result
+                       for result in baseline['results']}
+    regressions = []
+    for result in results:
+        previous = baseline_by_key.get(result_key(result))
+        if previous is None:
+            continue
+        if result['wall_seconds'] > previous['wall_seconds'] * (1 +
+                                                               tolerance):
+            regressions.append((result_key(result),
+                                previous['wall_seconds'],
+                                result['wall_seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='Fleet sizes to benchmark.')
+    parser.add_argument('--flavors', type=int, default=3,
+                        help='Number of flavors in the fleet.')
+    parser.add_argument('--images', type=int, default=5,
+                        help='Number of images in the fleet.')
+    parser.add_argument('--skew', type=float, default=1.0,
+                        help='Skew of the image weights. 0 weights every '
+                        'image the same.')
+    parser.add_argument('--cached-ratio', type=float, default=0.1,
+                        help='Fraction of unprovisioned nodes that are '
+                        'cached.')
+    parser.add_argument('--provisioned-ratio', type=float, default=0.5,
+                        help='Fraction of nodes that are provisioned.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the synthetic fleet generator.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timed runs per function; the best is kept.')
+    parser.add_argument('--output',
+                        help='Write the results to this JSON file.')
+    parser.add_argument('--baseline',
+                        help='Compare wall times against this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline, as a '
+                        'fraction.')
+    args = parser.parse_args()
+
+    results = []
+    for num_nodes in args.nodes:
+        fleet = generate_fleet(num_nodes, args.flavors, args.images,
+                               args.skew, args.cached_ratio,
+                               args.provisioned_ratio, args.seed)
+        results.extend(benchmark_fleet(fleet, args.repeat))
+
+    print("%-44s %9s %12s %14s %12s" % ('function', 'nodes', 'seconds',
+                                        'peak bytes', 'allocations'))
+    for result in results:
+        print("%-44s %9d %12.6f %14d %12d" % (
+            result['function'], result['params']['nodes'],
+            result['wall_seconds'], result['peak_bytes'],
+            result['allocations']))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'python': platform.python_version(),
+                       'results': results}, output, indent=2,
+                      sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.tolerance)
+        for key, before, after in regressions:
+            print("REGRESSION %s: %.6fs -> %.6fs" % (key, before, after))
+        if regressions:
+            return 1
+        print("No regressions against %s." % args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())